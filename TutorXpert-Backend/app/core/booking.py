@@ -0,0 +1,69 @@
+# app/core/booking.py
+# 原子预约：用条件 UPDATE 抢占 slot（is_booked false -> true），
+# 只有影响 1 行的请求才能继续插入 Appointment，其余直接返回冲突。
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def claim_slot(db, slot_id: int) -> bool:
+    result = db.execute(
+        update(models.AvailableSlot)
+        .where(
+            models.AvailableSlot.id == slot_id,
+            or_(models.AvailableSlot.is_booked.is_(False), models.AvailableSlot.is_booked.is_(None)),
+        )
+        .values(is_booked=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slot(db, slot_id: int):
+    db.execute(
+        update(models.AvailableSlot)
+        .where(models.AvailableSlot.id == slot_id)
+        .values(is_booked=False)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def book_slot(db, slot_id: int, student_id: int, tutor_id: int, message=None):
+    """抢占 slot 并创建预约，失败抛 SlotUnavailable；调用方负责 commit。"""
+    if not claim_slot(db, slot_id):
+        raise SlotUnavailable()
+    appointment = models.Appointment(
+        student_id=student_id,
+        tutor_id=tutor_id,
+        slot_id=slot_id,
+        message=message,
+        status="pending",
+    )
+    try:
+        with db.begin_nested():
+            db.add(appointment)
+    except IntegrityError:
+        # 绕过 is_booked 写入的有效预约，由部分唯一索引兜底
+        raise SlotUnavailable()
+    return appointment
+
+
+def backfill_booked_flags(db):
+    # 旧数据里 is_booked 只在 accept 时才置位，这里按未被拒绝的预约补齐
+    active = select(models.Appointment.slot_id).where(models.Appointment.status != "rejected")
+    result = db.execute(
+        update(models.AvailableSlot)
+        .where(
+            models.AvailableSlot.id.in_(active),
+            or_(models.AvailableSlot.is_booked.is_(False), models.AvailableSlot.is_booked.is_(None)),
+        )
+        .values(is_booked=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
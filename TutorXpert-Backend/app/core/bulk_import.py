@@ -0,0 +1,423 @@
+# app/core/bulk_import.py
+# 批量导入 users（含 profile 字段）/ profiles / tasks，支持 CSV 和 NDJSON，流式分批写入：
+# Postgres 用 COPY，SQLite 用 executemany。每批一次提交，users 按邮箱去重，中断后可直接重跑。
+#
+#   python -m app.core.bulk_import users students.csv --role student
+#   python -m app.core.bulk_import profiles profile.csv
+#   python -m app.core.bulk_import tasks tasks.ndjson --geocode cache
+#
+# users 文件：email, hashed_password（已是 bcrypt 哈希时直接使用）或 password（明文，多进程哈希），
+# role，可选 id（保留原来的用户 id），以及任意 profile 列（first_name, last_name, address, subjects, lat, lng ...）。
+# profiles / tasks 文件用 user_id 或 user_email 关联用户；先导入带 id 的 users，user_id 才能对上。
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, bindparam, insert, text, update
+
+from app import models
+from app.core.geocoding import create_provider, geocode_many, normalize_address
+from app.core.security import hash_password
+from app.core.subjects import get_or_create_subjects, normalize_subject, split_subjects
+
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 5000))
+# IN (...) 查询每次最多带的参数个数
+LOOKUP_CHUNK_SIZE = 500
+
+USER_COLUMNS = ("id", "email", "hashed_password", "role", "created_at")
+PROFILE_COLUMNS = tuple(c.name for c in models.Profile.__table__.columns if c.name != "id")
+TASK_COLUMNS = tuple(c.name for c in models.Task.__table__.columns if c.name != "id")
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+        self.addresses = {}  # 规范化地址 -> [("profile" / "task", id)]，导入结束后统一地理编码
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def read_records(path, fmt=None):
+    """逐行产出 (行号, dict)，不把整个文件读进内存。"""
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for line, record in enumerate(csv.DictReader(f), start=2):
+                yield line, record
+        else:
+            for line, raw in enumerate(f, start=1):
+                if raw.strip():
+                    yield line, json.loads(raw)
+
+
+def batches(records, size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def coerce(table, record, columns):
+    """把 CSV 里的字符串按列类型转换；空字符串视为 NULL，不认识的列忽略。"""
+    row = {}
+    for name in columns:
+        value = record.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        column_type = table.columns[name].type
+        if isinstance(value, str):
+            if isinstance(column_type, Boolean):
+                value = value.lower() in ("1", "true", "yes", "y", "t")
+            elif isinstance(column_type, Integer):
+                value = int(float(value))
+            elif isinstance(column_type, Float):
+                value = float(value)
+            elif isinstance(column_type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column_type, Date):
+                value = date.fromisoformat(value)
+        row[name] = value
+    return row
+
+
+def write_rows(db, table, rows):
+    """整批写入：Postgres 走 COPY，其他数据库走 executemany。
+
+    按出现的列分组写，没给的列交给数据库默认值，而不是写成 NULL。
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for columns, group in groups.items():
+        if db.bind.dialect.name != "postgresql":
+            db.execute(insert(table), group)
+            continue
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in group:
+            writer.writerow([_copy_value(row[name]) for name in columns])
+        buffer.seek(0)
+        raw = db.connection().connection
+        with raw.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def reserve_ids(db, table, count):
+    """Postgres：预先从序列里取 count 个 id，COPY 时直接带上，省去写完再查回。"""
+    return list(db.execute(
+        text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+        {"table": table.name, "count": count},
+    ).scalars())
+
+
+def sync_id_sequence(db, table):
+    """Postgres：写入了显式 id 之后把序列推到 MAX(id)，之后自增的 id 不会撞上。SQLite 自动处理。"""
+    if db.bind.dialect.name == "postgresql":
+        db.execute(
+            text(f"SELECT setval(pg_get_serial_sequence(:table, 'id'), (SELECT MAX(id) FROM {table.name}))"),
+            {"table": table.name},
+        )
+
+
+def lookup_ids(db, column, key_column, values):
+    """values 中每个值 -> id，分块查询。"""
+    values = list(set(values))
+    found = {}
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[i:i + LOOKUP_CHUNK_SIZE]
+        found.update(db.query(key_column, column).filter(key_column.in_(chunk)).all())
+    return found
+
+
+def resolve_user_ids(db, records, stats):
+    """profiles / tasks 文件里的 user_id 或 user_email -> user_id，找不到的记为错误。"""
+    emails = [r["user_email"].strip().lower() for _, r in records if not r.get("user_id") and r.get("user_email")]
+    by_email = lookup_ids(db, models.User.id, models.User.email, emails) if emails else {}
+    given = [int(float(r["user_id"])) for _, r in records if r.get("user_id")]
+    known = set(lookup_ids(db, models.User.id, models.User.id, given)) if given else set()
+    resolved = []
+    for line, record in records:
+        if record.get("user_id"):
+            user_id = int(float(record["user_id"]))
+            user_id = user_id if user_id in known else None
+        else:
+            user_id = by_email.get((record.get("user_email") or "").strip().lower())
+        if user_id is None:
+            stats.error(line, "unknown user")
+            continue
+        resolved.append((line, dict(record, user_id=user_id)))
+    return resolved
+
+
+def link_subjects(db, link_table, owner_column, owners):
+    """owners: [(owner_id, 科目文本)]，写入 tutor_subjects / task_subjects 关联行。"""
+    names = {}
+    for _, value in owners:
+        for name in split_subjects(value):
+            names.setdefault(name.lower(), name)
+    if not names:
+        return
+    subjects = get_or_create_subjects(db, list(names.values()))
+    ids = {s.slug: s.id for s in subjects}
+    rows = []
+    for owner_id, value in owners:
+        for position, name in enumerate(split_subjects(value)):
+            row = {owner_column: owner_id, "subject_id": ids[normalize_subject(name)]}
+            if "position" in link_table.columns:
+                row["position"] = position
+            rows.append(row)
+    write_rows(db, link_table, rows)
+
+
+def import_profiles(db, records, stats):
+    """records: [(行号, dict 含 user_id)]，写入 profile 和 tutor_subjects。"""
+    table = models.Profile.__table__
+    rows, subjects = [], []
+    # 每个用户只有一个 profile：已经有的跳过，保证重跑安全
+    existing = set(lookup_ids(db, models.Profile.id, models.Profile.user_id, [r["user_id"] for _, r in records]))
+    for line, record in records:
+        if record["user_id"] in existing:
+            stats.skipped += 1
+            continue
+        existing.add(record["user_id"])
+        try:
+            row = coerce(table, record, PROFILE_COLUMNS)
+        except ValueError as e:
+            stats.error(line, str(e))
+            continue
+        if not row.get("first_name") or not row.get("last_name"):
+            stats.error(line, "first_name and last_name are required")
+            continue
+        row.setdefault("lat", 0.0)
+        row.setdefault("lng", 0.0)
+        rows.append(row)
+    write_rows(db, table, rows)
+
+    profile_ids = lookup_ids(db, models.Profile.id, models.Profile.user_id, [r["user_id"] for r in rows])
+    for row in rows:
+        profile_id = profile_ids[row["user_id"]]
+        if row.get("subjects"):
+            subjects.append((profile_id, row["subjects"]))
+        if row.get("address") and not (row["lat"] or row["lng"]):
+            stats.addresses.setdefault(normalize_address(row["address"]), []).append(("profile", profile_id))
+    link_subjects(db, models.TutorSubject.__table__, "profile_id", subjects)
+    return len(rows)
+
+
+def import_users(db, batch, stats, pool, default_role=None):
+    table = models.User.__table__
+    users, seen = [], set()
+    for line, record in batch:
+        email = (record.get("email") or "").strip().lower()
+        role = (record.get("role") or default_role or "").strip()
+        if not email or not role:
+            stats.error(line, "email and role are required")
+            continue
+        if email in seen:
+            stats.skipped += 1
+            continue
+        seen.add(email)
+        users.append((line, dict(record, email=email, role=role)))
+
+    existing = lookup_ids(db, models.User.id, models.User.email, [r["email"] for _, r in users])
+    stats.skipped += sum(1 for _, r in users if r["email"] in existing)
+    users = [(line, r) for line, r in users if r["email"] not in existing]
+
+    # ✅ 已经是 bcrypt 哈希的直接用；明文密码在进程池里并行哈希
+    plain = [(i, r.get("password")) for i, (_, r) in enumerate(users) if not (r.get("hashed_password") or "").startswith("$2")]
+    missing = [users[i][0] for i, password in plain if not password]
+    for line in missing:
+        stats.error(line, "password or bcrypt hashed_password is required")
+    plain = [(i, password) for i, password in plain if password]
+    for (i, _), hashed in zip(plain, pool.map(hash_password, [p for _, p in plain], chunksize=32)):
+        users[i][1]["hashed_password"] = hashed
+    users = [(line, r) for line, r in users if line not in missing]
+
+    rows = []
+    for line, record in users:
+        try:
+            rows.append((line, coerce(table, record, USER_COLUMNS)))
+        except ValueError as e:
+            stats.error(line, str(e))
+
+    # 文件里带了 id 的保留原 id（profiles / tasks 按它关联）；已被占用的 id 记为错误，不改成新 id
+    given = [row["id"] for _, row in rows if "id" in row]
+    taken = set(lookup_ids(db, models.User.id, models.User.id, given)) if given else set()
+    with_id, without_id = [], []
+    for line, row in rows:
+        if "id" not in row:
+            without_id.append(row)
+        elif row["id"] in taken:
+            stats.error(line, f"user id {row['id']} already exists")
+        else:
+            taken.add(row["id"])
+            with_id.append(row)
+    # 先写显式 id 并推进序列，再写自增的，同一批里也不会冲突
+    write_rows(db, table, with_id)
+    if with_id:
+        sync_id_sequence(db, table)
+    write_rows(db, table, without_id)
+    rows = with_id + without_id
+
+    user_ids = lookup_ids(db, models.User.id, models.User.email, [r["email"] for r in rows])
+    with_profile = [
+        (line, dict(record, user_id=user_ids[record["email"]]))
+        for line, record in users
+        if record["email"] in user_ids and record.get("first_name")
+    ]
+    import_profiles(db, with_profile, stats)
+    return len(rows)
+
+
+def import_tasks(db, batch, stats):
+    table = models.Task.__table__
+    records = resolve_user_ids(db, batch, stats)
+
+    # posted_by 缺省时用发布者的姓名
+    names = {
+        row.user_id: f"{row.first_name} {row.last_name}"
+        for i in range(0, len(records), LOOKUP_CHUNK_SIZE)
+        for row in db.query(models.Profile.user_id, models.Profile.first_name, models.Profile.last_name).filter(
+            models.Profile.user_id.in_({r["user_id"] for _, r in records[i:i + LOOKUP_CHUNK_SIZE]})
+        )
+    }
+    rows = []
+    for line, record in records:
+        try:
+            row = coerce(table, record, TASK_COLUMNS)
+        except ValueError as e:
+            stats.error(line, str(e))
+            continue
+        row.setdefault("status", "Open")
+        row.setdefault("posted_by", names.get(row["user_id"]))
+        row.setdefault("posted_date", datetime.utcnow())
+        rows.append(row)
+
+    if not rows:
+        return 0
+    if db.bind.dialect.name == "postgresql":
+        # COPY 不能 RETURNING，先从序列里取好 id
+        for row, task_id in zip(rows, reserve_ids(db, table, len(rows))):
+            row["id"] = task_id
+        write_rows(db, table, rows)
+    else:
+        result = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+        for row, task_id in zip(rows, result.scalars()):
+            row["id"] = task_id
+
+    link_subjects(db, models.TaskSubject.__table__, "task_id", [(r["id"], r["subject"]) for r in rows if r.get("subject")])
+    for row in rows:
+        if row.get("address") and row.get("lat") is None and row.get("lng") is None:
+            stats.addresses.setdefault(normalize_address(row["address"]), []).append(("task", row["id"]))
+    return len(rows)
+
+
+def apply_geocoding(db, stats, mode):
+    """按去重后的地址统一解析一次，再批量回写坐标。"""
+    if mode == "none" or not stats.addresses:
+        return 0
+    provider = create_provider() if mode == "all" else None
+    coords = geocode_many(db, stats.addresses.keys(), provider)
+
+    profile_rows, task_rows = [], []
+    for key, owners in stats.addresses.items():
+        if not coords.get(key):
+            continue
+        lat, lng = coords[key]
+        for owner_kind, owner_id in owners:
+            target = task_rows if owner_kind == "task" else profile_rows
+            target.append({"b_id": owner_id, "lat": lat, "lng": lng})
+    for model, rows in ((models.Profile, profile_rows), (models.Task, task_rows)):
+        if rows:
+            db.execute(
+                update(model.__table__).where(model.__table__.c.id == bindparam("b_id")),
+                rows,
+            )
+    db.commit()
+    return len(profile_rows) + len(task_rows)
+
+
+def run_import(db, kind, path, fmt=None, batch_size=BULK_IMPORT_BATCH_SIZE, default_role=None, geocode="cache"):
+    stats = ImportStats()
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor() if kind == "users" else None
+    try:
+        for batch in batches(read_records(path, fmt), batch_size):
+            stats.read += len(batch)
+            if kind == "users":
+                stats.inserted += import_users(db, batch, stats, pool, default_role)
+            elif kind == "profiles":
+                stats.inserted += import_profiles(db, resolve_user_ids(db, batch, stats), stats)
+            elif kind == "tasks":
+                stats.inserted += import_tasks(db, batch, stats)
+            else:
+                raise ValueError(f"Unknown import kind: {kind}")
+            db.commit()
+            elapsed = time.perf_counter() - started
+            print(f"  {stats.read} read, {stats.inserted} inserted ({stats.inserted / elapsed:.0f} rows/s)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    geocoded = apply_geocoding(db, stats, geocode)
+    print(
+        f"Imported {stats.inserted} {kind}, skipped {stats.skipped} existing, {len(stats.errors)} errors, "
+        f"{len(stats.addresses)} unique addresses ({geocoded} rows geocoded) in {time.perf_counter() - started:.1f}s"
+    )
+    for line, message in stats.errors[:20]:
+        print(f"  line {line}: {message}")
+    return stats
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import users / profiles / tasks from CSV or NDJSON")
+    parser.add_argument("kind", choices=["users", "profiles", "tasks"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--role", help="users 文件没有 role 列时使用的默认角色")
+    parser.add_argument(
+        "--geocode",
+        choices=["none", "cache", "all"],
+        default="cache",
+        help="没有坐标的地址：none 不处理，cache 只用地理编码缓存，all 未命中的再调用 GEOCODER（按限速逐个请求）",
+    )
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        result = run_import(session, args.kind, args.path, args.format, args.batch_size, args.role, args.geocode)
+    finally:
+        session.close()
+    sys.exit(1 if result.errors else 0)
@@ -0,0 +1,51 @@
+# app/core/clustering.py
+# 地图缩小时在服务端按瓦片网格聚合 marker，返回每个格子的数量、质心和少量代表 id，
+# 避免一次返回上千个完整对象。
+import heapq
+import math
+import os
+
+# 每个 web 瓦片在经纬方向上切成几格
+CLUSTER_CELLS_PER_TILE = int(os.getenv("CLUSTER_CELLS_PER_TILE", 4))
+# 每个格子附带的代表 id 数量
+CLUSTER_SAMPLE_SIZE = int(os.getenv("CLUSTER_SAMPLE_SIZE", 3))
+MAX_ZOOM = 20
+
+
+def zoom_for_bounds(east: float, west: float) -> int:
+    # 没传 zoom 时按视野宽度估算，和 Leaflet/Mapbox 的瓦片层级对齐
+    width = max(east - west, 1e-9)
+    return max(0, min(MAX_ZOOM, int(math.floor(math.log2(360.0 / width)))))
+
+
+def cell_deg_for_zoom(zoom: int) -> float:
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+def cluster_points(points, zoom: int):
+    """points 为 (id, lat, lng) 可迭代对象，返回按格子聚合后的 dict 列表。"""
+    cell_deg = cell_deg_for_zoom(zoom)
+    cells = {}
+    for point_id, lat, lng in points:
+        if lat is None or lng is None:
+            continue
+        key = (math.floor(lat / cell_deg), math.floor(lng / cell_deg))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0.0, 0.0, []]
+        cell[0] += 1
+        cell[1] += lat
+        cell[2] += lng
+        cell[3].append(point_id)
+
+    clusters = []
+    for (row, col), (count, sum_lat, sum_lng, ids) in cells.items():
+        clusters.append({
+            "cell": f"{zoom}/{row}/{col}",
+            "count": count,
+            "lat": sum_lat / count,
+            "lng": sum_lng / count,
+            "ids": heapq.nsmallest(CLUSTER_SAMPLE_SIZE, ids),
+        })
+    clusters.sort(key=lambda c: c["cell"])
+    return clusters
@@ -0,0 +1,116 @@
+# app/core/compression.py
+# 响应压缩：按 Accept-Encoding 协商 brotli / gzip，只压缩超过阈值的 JSON / 文本响应。
+# 地图搜索一次返回几百 KB 的 JSON，压缩后通常只剩 10%–20%。
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # 没装 brotli 时只用 gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+# 动态内容用较低的 quality：压缩率接近 gzip -9，CPU 开销和 gzip -5 差不多
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def choose_encoding(accept_encoding: str):
+    """按 Accept-Encoding（含 q 值）选出 "br" / "gzip"，都不接受时返回 None。"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """纯 ASGI 中间件：只处理一次性发完的响应体（JSONResponse / Response），流式响应原样透传。"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = dict(start.get("headers", []))
+            content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+            if (
+                message.get("more_body", False)
+                or b"content-encoding" in response_headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            new_headers = [
+                (name, value) for name, value in start.get("headers", [])
+                if name not in (b"content-length", b"etag", b"vary")
+            ]
+            new_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", _vary(response_headers.get(b"vary"))),
+            ]
+            etag = response_headers.get(b"etag")
+            if etag is not None:
+                # 压缩后的字节和原文不同，强 ETag 降为弱 ETag（If-None-Match 用弱比较，照样能 304）
+                new_headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            await send({**start, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _vary(existing):
+    if not existing:
+        return b"Accept-Encoding"
+    if b"accept-encoding" in existing.lower():
+        return existing
+    return existing + b", Accept-Encoding"
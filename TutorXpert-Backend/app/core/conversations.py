@@ -0,0 +1,221 @@
+# app/core/conversations.py
+# 会话摘要表的维护：发消息时增量更新，已读时清零，旧数据可以整体重建。
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+
+
+def pair(user1_id: int, user2_id: int):
+    return (user1_id, user2_id) if user1_id <= user2_id else (user2_id, user1_id)
+
+
+def get_or_create_conversation(db, user1_id: int, user2_id: int):
+    low, high = pair(user1_id, user2_id)
+
+    def locked():
+        return (
+            db.query(models.Conversation)
+            .filter_by(user_low_id=low, user_high_id=high)
+            .with_for_update()
+            .first()
+        )
+
+    conv = locked()
+    if conv is None:
+        try:
+            # 两条消息同时开启同一个会话时，唯一约束保证只插入一行
+            with db.begin_nested():
+                conv = models.Conversation(
+                    user_low_id=low, user_high_id=high, unread_low=0, unread_high=0
+                )
+                db.add(conv)
+        except IntegrityError:
+            conv = locked()
+    return conv
+
+
+def record_message(db, msg: models.Message):
+    """在 send_message 的同一事务里更新会话摘要（msg 需要已经 flush 拿到 id）。"""
+    conv = get_or_create_conversation(db, msg.sender_id, msg.receiver_id)
+    msg.conversation_id = conv.id
+    if conv.last_message_id is None or msg.id > conv.last_message_id:
+        conv.last_message_id = msg.id
+        conv.last_message_text = msg.text
+        conv.last_message_at = msg.timestamp
+
+    # 发送方自然已读到这条消息，接收方未读 +1
+    if msg.sender_id == conv.user_low_id:
+        conv.last_read_low_id = msg.id
+        if msg.receiver_id != msg.sender_id:
+            conv.unread_high = conv.unread_high + 1
+    else:
+        conv.last_read_high_id = msg.id
+        conv.unread_low = conv.unread_low + 1
+    return conv
+
+
+def mark_read(db, user_id: int, other_id: int):
+    low, high = pair(user_id, other_id)
+    conv = (
+        db.query(models.Conversation)
+        .filter_by(user_low_id=low, user_high_id=high)
+        .with_for_update()
+        .first()
+    )
+    if conv is None:
+        return None
+    if user_id == low:
+        conv.unread_low = 0
+        conv.last_read_low_id = conv.last_message_id
+    if user_id == high:
+        conv.unread_high = 0
+        conv.last_read_high_id = conv.last_message_id
+    return conv
+
+
+def inbox_query(db, user_id: int):
+    """一次 join 取出收件箱：会话摘要 + 对方 email / 姓名 + 自己这一侧的未读数。"""
+    is_low = models.Conversation.user_low_id == user_id
+    other_id = case((is_low, models.Conversation.user_high_id), else_=models.Conversation.user_low_id)
+    unread = case((is_low, models.Conversation.unread_low), else_=models.Conversation.unread_high)
+    return (
+        db.query(
+            other_id.label("other_id"),
+            models.User.email,
+            models.Profile.first_name,
+            models.Profile.last_name,
+            models.Conversation.last_message_text,
+            models.Conversation.last_message_at,
+            unread.label("unread"),
+        )
+        .join(models.User, models.User.id == other_id)
+        .outerjoin(models.Profile, models.Profile.user_id == other_id)
+        .filter(
+            or_(
+                models.Conversation.user_low_id == user_id,
+                models.Conversation.user_high_id == user_id,
+            ),
+            models.Conversation.last_message_id.isnot(None),
+        )
+        .order_by(models.Conversation.last_message_at.desc(), models.Conversation.id.desc())
+    )
+
+
+def _pair_columns(db):
+    low = func.min(models.Message.sender_id, models.Message.receiver_id)
+    high = func.max(models.Message.sender_id, models.Message.receiver_id)
+    if db.bind.dialect.name == "postgresql":
+        low = func.least(models.Message.sender_id, models.Message.receiver_id)
+        high = func.greatest(models.Message.sender_id, models.Message.receiver_id)
+    return low, high
+
+
+def _latest_per_pair(db, low, high, *filters):
+    latest = (
+        db.query(
+            low.label("low"),
+            high.label("high"),
+            func.max(models.Message.id).label("last_id"),
+        )
+        .filter(*filters)
+        .group_by(low, high)
+        .subquery()
+    )
+    return (
+        db.query(latest.c.low, latest.c.high, models.Message)
+        .join(models.Message, models.Message.id == latest.c.last_id)
+        .all()
+    )
+
+
+def _assign_conversation_ids(db, low, high, *filters):
+    conv_id = (
+        db.query(models.Conversation.id)
+        .filter(
+            models.Conversation.user_low_id == low,
+            models.Conversation.user_high_id == high,
+        )
+        .scalar_subquery()
+    )
+    db.query(models.Message).filter(*filters).update(
+        {"conversation_id": conv_id}, synchronize_session=False
+    )
+
+
+def rebuild_conversations(db):
+    """根据 messages 全量重建会话摘要（历史数据没有已读记录，未读数按 0 处理）。"""
+    low, high = _pair_columns(db)
+    rows = _latest_per_pair(db, low, high)
+
+    db.query(models.Message).update({"conversation_id": None}, synchronize_session=False)
+    db.query(models.Conversation).delete(synchronize_session=False)
+    for user_low_id, user_high_id, msg in rows:
+        db.add(models.Conversation(
+            user_low_id=user_low_id,
+            user_high_id=user_high_id,
+            last_message_id=msg.id,
+            last_message_text=msg.text,
+            last_message_at=msg.timestamp,
+            unread_low=0,
+            unread_high=0,
+            last_read_low_id=msg.id,
+            last_read_high_id=msg.id,
+        ))
+    db.flush()
+
+    # 回填 messages.conversation_id
+    _assign_conversation_ids(db, low, high)
+    db.commit()
+    return len(rows)
+
+
+def backfill_conversations(db):
+    """只处理 conversation_id 为空的消息：补建缺少的会话，已有会话的未读数和已读位置保持不变。"""
+    low, high = _pair_columns(db)
+    orphan = models.Message.conversation_id.is_(None)
+    rows = _latest_per_pair(db, low, high, orphan)
+
+    for user_low_id, user_high_id, msg in rows:
+        conv = (
+            db.query(models.Conversation)
+            .filter_by(user_low_id=user_low_id, user_high_id=user_high_id)
+            .first()
+        )
+        if conv is None:
+            # 新建的会话和全量重建一样：历史消息没有已读记录，按已读处理
+            conv = models.Conversation(
+                user_low_id=user_low_id,
+                user_high_id=user_high_id,
+                unread_low=0,
+                unread_high=0,
+                last_read_low_id=msg.id,
+                last_read_high_id=msg.id,
+            )
+            db.add(conv)
+        if conv.last_message_id is None or msg.id > conv.last_message_id:
+            conv.last_message_id = msg.id
+            conv.last_message_text = msg.text
+            conv.last_message_at = msg.timestamp
+    db.flush()
+
+    _assign_conversation_ids(db, low, high, orphan)
+    db.commit()
+    return len(rows)
+
+
+def ensure_conversations(db):
+    # ✅ 启动时只补没归属会话的消息，不动已有会话的未读计数
+    if db.query(models.Message.id).filter(models.Message.conversation_id.is_(None)).first() is not None:
+        return backfill_conversations(db)
+    return 0
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print("Rebuilt", rebuild_conversations(session), "conversations")
+    finally:
+        session.close()
@@ -0,0 +1,162 @@
+# app/core/fulltext.py
+# 任务 / tutor 资料的关键词搜索：SQLite 用 FTS5，PostgreSQL 用 tsvector + GIN 表达式索引。
+# search 函数返回 (id, rank) 子查询，rank 越大越相关，可以直接 join 到地图搜索上。
+import re
+
+from sqlalchemy import Float, Integer, false, inspect, or_, select, literal, text
+
+from app import models
+
+# PostgreSQL：查询里的表达式必须和索引表达式完全一致，GIN 索引才会被用上
+PG_TASK_VECTOR = (
+    "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+PG_PROFILE_VECTOR = (
+    "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(bio, '') || ' ' "
+    "|| coalesce(experience_details, ''))"
+)
+
+SQLITE_DDL = {
+    "tasks_fts": [
+        "CREATE VIRTUAL TABLE tasks_fts USING fts5("
+        "title, description, content='tasks', content_rowid='id')",
+        "CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER tasks_fts_au AFTER UPDATE OF title, description ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+    ],
+    "profile_fts": [
+        "CREATE VIRTUAL TABLE profile_fts USING fts5("
+        "title, bio, experience_details, content='profile', content_rowid='id')",
+        "CREATE TRIGGER profile_fts_ai AFTER INSERT ON profile BEGIN "
+        "INSERT INTO profile_fts(rowid, title, bio, experience_details) "
+        "VALUES (new.id, new.title, new.bio, new.experience_details); END",
+        "CREATE TRIGGER profile_fts_ad AFTER DELETE ON profile BEGIN "
+        "INSERT INTO profile_fts(profile_fts, rowid, title, bio, experience_details) "
+        "VALUES ('delete', old.id, old.title, old.bio, old.experience_details); END",
+        "CREATE TRIGGER profile_fts_au AFTER UPDATE OF title, bio, experience_details ON profile BEGIN "
+        "INSERT INTO profile_fts(profile_fts, rowid, title, bio, experience_details) "
+        "VALUES ('delete', old.id, old.title, old.bio, old.experience_details); "
+        "INSERT INTO profile_fts(rowid, title, bio, experience_details) "
+        "VALUES (new.id, new.title, new.bio, new.experience_details); END",
+        "INSERT INTO profile_fts(profile_fts) VALUES ('rebuild')",
+    ],
+}
+
+PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_tasks_fulltext ON tasks USING GIN ({PG_TASK_VECTOR})",
+    f"CREATE INDEX IF NOT EXISTS ix_profile_fulltext ON profile USING GIN ({PG_PROFILE_VECTOR})",
+]
+
+# 实际使用的后端："fts5" / "postgres" / "like"（没有全文索引时退化为 LIKE，不排序）
+_backend = "like"
+
+
+def create_fulltext_indexes(conn):
+    """建全文索引（迁移里调用，已存在的跳过），返回可用的后端。"""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        try:
+            existing = set(inspect(conn).get_table_names())
+            for table, statements in SQLITE_DDL.items():
+                if table in existing:
+                    continue
+                for statement in statements:
+                    conn.exec_driver_sql(statement)
+            return "fts5"
+        except Exception as e:
+            # SQLite 编译时没带 FTS5
+            print("🔥 FTS5 unavailable, falling back to LIKE:", repr(e))
+            return "like"
+    if dialect == "postgresql":
+        for statement in PG_DDL:
+            conn.exec_driver_sql(statement)
+        return "postgres"
+    return "like"
+
+
+def ensure_fulltext_indexes(engine):
+    """命令行脚本直接建库时用；应用本身走迁移，启动时只调用 detect_fulltext_backend。"""
+    global _backend
+    with engine.begin() as conn:
+        _backend = create_fulltext_indexes(conn)
+    return _backend
+
+
+def detect_fulltext_backend(engine):
+    """启动时按库里已有的结构选择后端，不做任何 DDL。"""
+    global _backend
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        existing = set(inspect(engine).get_table_names())
+        _backend = "fts5" if set(SQLITE_DDL) <= existing else "like"
+    elif dialect == "postgresql":
+        # 表达式在查询时计算，GIN 索引缺失只影响速度
+        _backend = "postgres"
+    else:
+        _backend = "like"
+    return _backend
+
+
+def _fts5_query(q: str):
+    # 每个词做前缀匹配，词之间是 AND；引号包裹避免用户输入被当成 FTS5 语法
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _search(q, fts_table, pg_table, pg_vector, model, like_columns, name):
+    if _backend == "fts5":
+        match = _fts5_query(q)
+        if not match:
+            # q 全是标点之类没有可搜索的词：结果为空，而不是忽略 q 返回全部
+            return (
+                select(model.id.label("id"), literal(0.0, Float).label("rank"))
+                .where(false())
+                .subquery(name)
+            )
+        return (
+            text(
+                f"SELECT rowid AS id, -bm25({fts_table}) AS rank "
+                f"FROM {fts_table} WHERE {fts_table} MATCH :match"
+            )
+            .bindparams(match=match)
+            .columns(id=Integer, rank=Float)
+            .subquery(name)
+        )
+    if _backend == "postgres":
+        return (
+            text(
+                f"SELECT id, ts_rank({pg_vector}, plainto_tsquery('english', :q)) AS rank "
+                f"FROM {pg_table} WHERE {pg_vector} @@ plainto_tsquery('english', :q)"
+            )
+            .bindparams(q=q)
+            .columns(id=Integer, rank=Float)
+            .subquery(name)
+        )
+    pattern = f"%{q}%"
+    return (
+        select(model.id.label("id"), literal(0.0, Float).label("rank"))
+        .where(or_(*[column.ilike(pattern) for column in like_columns]))
+        .subquery(name)
+    )
+
+
+def task_text_search(q: str):
+    """返回 (id, rank) 子查询；q 里没有可搜索的词时子查询为空。"""
+    return _search(
+        q, "tasks_fts", "tasks", PG_TASK_VECTOR, models.Task,
+        [models.Task.title, models.Task.description], "task_fts",
+    )
+
+
+def profile_text_search(q: str):
+    return _search(
+        q, "profile_fts", "profile", PG_PROFILE_VECTOR, models.Profile,
+        [models.Profile.title, models.Profile.bio, models.Profile.experience_details], "profile_fts",
+    )
@@ -0,0 +1,231 @@
+# app/core/geocoding.py
+# 地址 -> 经纬度。请求里只查缓存表，未命中的地址交给后台线程排队解析，
+# 解析完成后回写 profile 坐标并同步 tutor 空间索引。
+#
+#   GEOCODER=nominatim（默认） / static
+#   GEOCODER_STATIC_FILE=addresses.json   # static 模式：{"地址": [lat, lng], ...}
+import json
+import os
+import queue
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+from app.core.spatial_index import sync_tutor_location
+from app.database import SessionLocal
+
+GEOCODER = os.getenv("GEOCODER", "nominatim")
+GEOCODER_STATIC_FILE = os.getenv("GEOCODER_STATIC_FILE", "")
+GEOCODER_URL = os.getenv("GEOCODER_URL", "https://nominatim.openstreetmap.org/search")
+GEOCODER_USER_AGENT = os.getenv("GEOCODER_USER_AGENT", "TutorPlatform/1.0")  # Nominatim 必须带 UA
+GEOCODER_TIMEOUT_SECONDS = float(os.getenv("GEOCODER_TIMEOUT_SECONDS", 5))
+# Nominatim 使用政策要求每秒最多 1 次请求
+GEOCODER_MIN_INTERVAL_SECONDS = float(os.getenv("GEOCODER_MIN_INTERVAL_SECONDS", 1))
+# 查无结果的地址缓存多久后允许重试
+GEOCODE_NEGATIVE_TTL_HOURS = float(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", 24))
+
+
+def normalize_address(address: str) -> str:
+    return re.sub(r"\s+", " ", (address or "").strip()).lower()
+
+
+class GeocodingProvider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def geocode(self, address: str):
+        """返回 (lat, lng)，查无结果返回 None；网络等错误直接抛异常（不写缓存）。"""
+
+
+class NominatimProvider(GeocodingProvider):
+    name = "nominatim"
+
+    def __init__(self, url=GEOCODER_URL, timeout=GEOCODER_TIMEOUT_SECONDS, user_agent=GEOCODER_USER_AGENT):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+
+    def geocode(self, address: str):
+        res = self.session.get(self.url, params={"q": address, "format": "json", "limit": 1}, timeout=self.timeout)
+        res.raise_for_status()
+        data = res.json()
+        if not data:
+            return None
+        return float(data[0]["lat"]), float(data[0]["lon"])
+
+
+class StaticProvider(GeocodingProvider):
+    """本地 / 测试用：从固定映射里查，不发网络请求。"""
+
+    name = "static"
+
+    def __init__(self, mapping=None):
+        self.mapping = {normalize_address(k): tuple(v) for k, v in (mapping or {}).items()}
+
+    def geocode(self, address: str):
+        return self.mapping.get(normalize_address(address))
+
+
+def create_provider(kind: str = GEOCODER) -> GeocodingProvider:
+    if kind == "static":
+        mapping = {}
+        if GEOCODER_STATIC_FILE:
+            with open(GEOCODER_STATIC_FILE) as f:
+                mapping = json.load(f)
+        return StaticProvider(mapping)
+    if kind == "nominatim":
+        return NominatimProvider()
+    raise ValueError(f"Unknown GEOCODER: {kind}")
+
+
+def _cache_entry(row):
+    if row is None:
+        return False, None
+    if row.lat is None or row.lng is None:
+        if row.updated_at < datetime.utcnow() - timedelta(hours=GEOCODE_NEGATIVE_TTL_HOURS):
+            return False, None
+        return True, None
+    return True, (row.lat, row.lng)
+
+
+def cached_coordinates(db, address: str):
+    """查缓存表，返回 (命中与否, (lat, lng) 或 None)。过期的负缓存视为未命中。"""
+    return _cache_entry(db.get(models.GeocodeCache, normalize_address(address)))
+
+
+def store_coordinates(db, address: str, coords, provider: str):
+    key = normalize_address(address)
+    lat, lng = coords if coords else (None, None)
+    values = {"lat": lat, "lng": lng, "provider": provider, "updated_at": datetime.utcnow()}
+    row = db.get(models.GeocodeCache, key)
+    if row is None:
+        try:
+            # 多个进程可能同时解析同一个地址
+            with db.begin_nested():
+                db.add(models.GeocodeCache(address_key=key, **values))
+            return
+        except IntegrityError:
+            row = db.get(models.GeocodeCache, key)
+    for field, value in values.items():
+        setattr(row, field, value)
+
+
+def geocode_many(db, addresses, provider: GeocodingProvider = None, chunk_size: int = 500):
+    """批量解析：按规范化地址去重，一次查缓存表，未命中的再逐个调用 provider（限速）。
+
+    provider 为 None 时只查缓存。返回 {规范化地址: (lat, lng)，查不到为 None}，未能解析（缓存未命中且没有 provider 或请求失败）的地址不在返回值里。
+    """
+    pending = {normalize_address(a): a for a in addresses if a and a.strip()}
+    results = {}
+    keys = list(pending)
+    for i in range(0, len(keys), chunk_size):
+        rows = db.query(models.GeocodeCache).filter(models.GeocodeCache.address_key.in_(keys[i:i + chunk_size]))
+        for row in rows:
+            hit, coords = _cache_entry(row)
+            if hit:
+                results[row.address_key] = coords
+                del pending[row.address_key]
+
+    if provider is not None:
+        for n, (key, address) in enumerate(pending.items()):
+            if n:
+                time.sleep(GEOCODER_MIN_INTERVAL_SECONDS)
+            try:
+                coords = provider.geocode(address)
+            except Exception as e:
+                print("🔥 Geocoding failed:", address, repr(e))
+                continue
+            store_coordinates(db, address, coords, provider.name)
+            results[key] = coords
+        db.commit()
+    return results
+
+
+def apply_coordinates(db, profile_id: int, address: str, coords):
+    """只有 profile 当前地址仍是这个地址时才回写坐标，避免旧任务覆盖新地址。"""
+    profile = db.get(models.Profile, profile_id)
+    if profile is None or normalize_address(profile.address) != normalize_address(address):
+        return None
+    profile.lat, profile.lng = coords
+    return profile
+
+
+class GeocodeWorker:
+    def __init__(self, provider: GeocodingProvider = None):
+        self._provider = provider
+        self._queue = queue.Queue()
+        self._thread = None
+        self._last_request = 0.0
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            self._provider = create_provider()
+        return self._provider
+
+    @provider.setter
+    def provider(self, value):
+        self._provider = value
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="geocode-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def enqueue(self, profile_id: int, address: str):
+        self._queue.put((profile_id, address))
+
+    def join(self):
+        # 测试 / 脚本里等待队列清空
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._process(*job)
+            except Exception as e:
+                print("🔥 Geocoding failed:", repr(e))
+            finally:
+                self._queue.task_done()
+
+    def _throttle(self):
+        wait = self._last_request + GEOCODER_MIN_INTERVAL_SECONDS - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_request = time.monotonic()
+
+    def _process(self, profile_id: int, address: str):
+        db = SessionLocal()
+        try:
+            hit, coords = cached_coordinates(db, address)
+            if not hit:
+                self._throttle()
+                coords = self.provider.geocode(address)
+                store_coordinates(db, address, coords, self.provider.name)
+            profile = apply_coordinates(db, profile_id, address, coords) if coords else None
+            db.commit()
+            if profile is not None:
+                sync_tutor_location(profile, profile.user.role)
+        finally:
+            db.close()
+
+
+geocode_worker = GeocodeWorker()
@@ -0,0 +1,85 @@
+# app/core/http_cache.py
+# 详情接口的条件 GET：每行有 version（写入时 +1）和 updated_at，
+# 据此生成强 ETag / Last-Modified。If-None-Match 命中时直接返回 304，不加载也不序列化响应体。
+import os
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Response
+
+from app.database import run_db
+
+# 公开的详情（tutor / task）允许浏览器和 CDN 缓存的秒数，过期后带 ETag 回源验证
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 60))
+
+PUBLIC_CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate={HTTP_CACHE_MAX_AGE}"
+# 含电话 / 地址的个人资料：只允许浏览器缓存，每次都要验证（命中时是一个很便宜的 304）
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(kind: str, row_id: int, version: int) -> str:
+    # kind 区分同一行的不同表示（/tutors/{id} 和 /profiles/{user_id} 都来自 profile 表）
+    return f'"{kind}-{row_id}-{version}"'
+
+
+def http_date(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # SQLite 里存的是 UTC 的 naive 时间
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match 用弱比较：忽略 W/ 前缀，支持逗号分隔的多个值和 *
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+def parse_http_date(value):
+    """解析 HTTP 日期，无法解析时返回 None。-0000 时区解析出来是 naive 时间，按 UTC 处理。"""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_not_modified(headers, etag: str, last_modified) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # 同时带了两个头时以 If-None-Match 为准
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        since = parse_http_date(if_modified_since)
+        modified = parse_http_date(last_modified)
+        # 头格式不对就忽略，按正常请求返回 200
+        if since is None or modified is None:
+            return False
+        return modified <= since
+    return False
+
+
+async def conditional_get(request, response, db, validator, build, cache_control=PUBLIC_CACHE_CONTROL):
+    """validator(db) -> (etag, updated_at)，记录不存在时由它抛 404；build(db) -> 响应体。
+
+    两步在同一个 run_db 里完成：验证器命中就不再调用 build。
+    """
+    def load(db):
+        etag, updated_at = validator(db)
+        last_modified = http_date(updated_at)
+        if is_not_modified(request.headers, etag, last_modified):
+            return etag, last_modified, None, True
+        return etag, last_modified, build(db), False
+
+    etag, last_modified, body, not_modified = await run_db(db, load)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return body
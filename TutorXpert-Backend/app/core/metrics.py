@@ -0,0 +1,175 @@
+# app/core/metrics.py
+# 请求级指标：按路由统计延迟直方图、SQL 条数和 SQL 耗时（SQLAlchemy engine 事件），
+# SQL 条数超过阈值的请求单独计数（N+1 嫌疑），慢请求写一行 JSON 日志。
+# 通过 GET /metrics 以 Prometheus 文本格式输出。
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+N_PLUS_ONE_QUERY_THRESHOLD = int(os.getenv("N_PLUS_ONE_QUERY_THRESHOLD", 20))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 1.0))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger("app.slow_requests")
+
+_current = contextvars.ContextVar("request_db_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+class _RouteMetrics:
+    __slots__ = ("buckets", "count", "seconds", "queries", "db_seconds", "over_threshold", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.over_threshold = 0
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}  # (method, route) -> _RouteMetrics
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            m = self._routes.get((method, route))
+            if m is None:
+                m = self._routes[(method, route)] = _RouteMetrics()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    m.buckets[i] += 1
+            m.count += 1
+            m.seconds += seconds
+            m.queries += stats.queries
+            m.db_seconds += stats.db_seconds
+            m.statuses[status] = m.statuses.get(status, 0) + 1
+            if stats.queries > N_PLUS_ONE_QUERY_THRESHOLD:
+                m.over_threshold += 1
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self, extra_lines=()):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), m in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, n in zip(LATENCY_BUCKETS, m.buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {m.count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {m.seconds:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {m.count}")
+
+            lines += ["# HELP http_requests_total Requests by route and status.", "# TYPE http_requests_total counter"]
+            for (method, route), m in routes:
+                for status, n in sorted(m.statuses.items()):
+                    lines.append(
+                        f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {n}'
+                    )
+
+            counters = (
+                ("db_queries_total", "SQL statements executed while serving the route.", "queries", "{}"),
+                ("db_query_duration_seconds_total", "Time spent in SQL while serving the route.", "db_seconds", "{:.6f}"),
+                (
+                    "http_requests_over_query_threshold_total",
+                    f"Requests that ran more than {N_PLUS_ONE_QUERY_THRESHOLD} SQL statements (likely N+1).",
+                    "over_threshold",
+                    "{}",
+                ),
+            )
+            for name, help_text, attr, fmt in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (method, route), m in routes:
+                    value = fmt.format(getattr(m, attr))
+                    lines.append(f'{name}{{method="{method}",route="{_escape(route)}"}} {value}')
+
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+def instrument_engine(engine):
+    """给同步引擎（异步引擎传 .sync_engine）挂上 SQL 计数 / 计时事件。"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：不包装响应体，流式响应和 WebSocket 不受影响。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            # 用路由模板而不是实际路径做标签，避免 /tasks/1、/tasks/2 … 各占一行
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe(scope["method"], route, status_code, elapsed, stats)
+            if elapsed >= SLOW_REQUEST_SECONDS or stats.queries > N_PLUS_ONE_QUERY_THRESHOLD:
+                slow_log.warning(json.dumps({
+                    "event": "slow_request" if elapsed >= SLOW_REQUEST_SECONDS else "query_threshold_exceeded",
+                    "method": scope["method"],
+                    "route": route,
+                    "path": scope["path"],
+                    "query_string": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "db_queries": stats.queries,
+                    "db_ms": round(stats.db_seconds * 1000, 2),
+                }))
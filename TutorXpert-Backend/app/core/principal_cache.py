@@ -0,0 +1,104 @@
+# app/core/principal_cache.py
+# 已验证 token -> 当前用户身份（id / 角色 / 显示名）的 LRU + TTL 缓存，
+# 大部分鉴权请求不用再解 JWT、查 users 表。资料或角色变化时按 user_id 失效。
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import models
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+# 多 worker 时其他进程的失效通知不到，靠 TTL 限制过期数据的存活时间
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    role: str
+    display_name: str
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # token -> (expires_at, Principal)
+        self._tokens_by_user = {}       # user_id -> set(token)
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: float = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (expires_at, principal)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[1].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[1].id]
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_principals(session, flush_context):
+    # ✅ 任何地方改了角色 / 姓名 / 邮箱都会让对应用户的缓存失效，不依赖每个路由记得手动清
+    for obj in session.new:
+        # 已有用户新建资料：缓存里的 display_name 还是没有资料时的值
+        if isinstance(obj, models.Profile) and obj.user_id is not None:
+            principal_cache.invalidate_user(obj.user_id)
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User):
+            fields = ("role", "email")
+            user_id = obj.id
+        elif isinstance(obj, models.Profile):
+            fields = ("first_name", "last_name")
+            user_id = obj.user_id
+        else:
+            continue
+        state = inspect(obj)
+        if obj in session.deleted or any(state.attrs[f].history.has_changes() for f in fields):
+            principal_cache.invalidate_user(user_id)
@@ -0,0 +1,157 @@
+# app/core/realtime.py
+# 消息实时推送：进程内按 user_id 维护 WebSocket 连接，发消息时推给在线的用户。
+# 后端可插拔：memory 只在当前进程内分发；broker 通过一个本地 TCP broker
+# （python -m app.core.realtime broker）在多个 uvicorn worker 之间转发。
+import asyncio
+import json
+import os
+from urllib.parse import urlparse
+
+from fastapi import WebSocket
+
+REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "memory")
+REALTIME_BROKER_URL = os.getenv("REALTIME_BROKER_URL", "tcp://127.0.0.1:8765")
+BROKER_RECONNECT_SECONDS = 2
+# 单个连接发送超过这个时间就认为是慢连接，直接摘掉，不拖慢同一用户的其他端
+REALTIME_SEND_TIMEOUT_SECONDS = float(os.getenv("REALTIME_SEND_TIMEOUT_SECONDS", "2"))
+
+
+class InProcessBackend:
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, user_id: int, payload: dict):
+        await self._deliver(user_id, payload)
+
+    async def stop(self):
+        pass
+
+
+class BrokerBackend:
+    """每个 worker 连到同一个 broker，publish 的消息由 broker 广播回所有 worker（包括自己）。"""
+
+    def __init__(self, url: str = REALTIME_BROKER_URL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 8765
+        self._writer = None
+        self._reader_task = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+        self._reader_task = asyncio.create_task(self._read_forever())
+
+    async def _read_forever(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    event = json.loads(line)
+                    await self._deliver(event["user_id"], event["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("🔥 Realtime broker connection lost:", repr(e))
+            self._writer = None
+            await asyncio.sleep(BROKER_RECONNECT_SECONDS)
+
+    async def publish(self, user_id: int, payload: dict):
+        if self._writer is None:
+            print("🔥 Realtime broker not connected, dropping push for user", user_id)
+            return
+        self._writer.write(json.dumps({"user_id": user_id, "payload": payload}).encode() + b"\n")
+        await self._writer.drain()
+
+    async def stop(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class MessageHub:
+    def __init__(self, backend):
+        self.backend = backend
+        self._connections = {}  # user_id -> set(WebSocket)
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def connect(self, user_id: int, websocket: WebSocket):
+        await websocket.accept()
+        self._connections.setdefault(user_id, set()).add(websocket)
+
+    def disconnect(self, user_id: int, websocket: WebSocket):
+        sockets = self._connections.get(user_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self._connections[user_id]
+
+    async def _send(self, user_id: int, websocket: WebSocket, payload: dict):
+        try:
+            await asyncio.wait_for(websocket.send_json(payload), REALTIME_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            # 发送失败或超时都当作断开，客户端会自己重连
+            self.disconnect(user_id, websocket)
+
+    async def _deliver(self, user_id: int, payload: dict):
+        sockets = list(self._connections.get(user_id, ()))
+        if sockets:
+            # ✅ 多端并发发送，一个慢连接不会阻塞其他连接
+            await asyncio.gather(*(self._send(user_id, websocket, payload) for websocket in sockets))
+
+    async def publish(self, user_id: int, payload: dict):
+        await self.backend.publish(user_id, payload)
+
+
+def create_backend(name: str = REALTIME_BACKEND):
+    if name == "broker":
+        return BrokerBackend()
+    return InProcessBackend()
+
+
+hub = MessageHub(create_backend())
+
+
+async def run_broker(url: str = REALTIME_BROKER_URL):
+    """本地 broker：把每个 worker 发来的一行 JSON 广播给所有已连接的 worker。"""
+    parsed = urlparse(url)
+    clients = set()
+
+    async def handle(reader, writer):
+        clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for client in list(clients):
+                    try:
+                        client.write(line)
+                        await client.drain()
+                    except Exception:
+                        clients.discard(client)
+        finally:
+            clients.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, parsed.hostname or "127.0.0.1", parsed.port or 8765)
+    print(f"✅ Realtime broker listening on {url}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["broker"]:
+        asyncio.run(run_broker())
+    else:
+        print("Usage: python -m app.core.realtime broker")
@@ -0,0 +1,134 @@
+# app/core/recurrence.py
+# 周期可用时间：按查询窗口把 AvailabilityRule 展开成具体 slot（不落库），
+# 学生预约某个时间点时才物化成一行 AvailableSlot。
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    # slot / 规则时间都按 UTC 的 naive 时间存；带时区的输入（如 JS 的 ...Z）先换算成 UTC
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _blocked(exceptions, rule, start: datetime, end: datetime):
+    for exc in exceptions:
+        if exc.date != start.date():
+            continue
+        if exc.rule_id is not None and exc.rule_id != rule.id:
+            continue
+        if exc.start_time is None or exc.end_time is None:
+            return True
+        exc_start = datetime.combine(exc.date, exc.start_time)
+        exc_end = datetime.combine(exc.date, exc.end_time)
+        if exc_start < end and start < exc_end:
+            return True
+    return False
+
+
+def expand_rules(rules, exceptions, start: datetime, end: datetime):
+    """返回 [start, end) 窗口内所有规则产生的 slot（dict），按开始时间排序。"""
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    by_date = {}
+    for exc in exceptions:
+        by_date.setdefault(exc.date, []).append(exc)
+
+    slots = []
+    day = start.date()
+    while day <= end.date():
+        for rule in rules:
+            if rule.weekday != day.weekday():
+                continue
+            if day < rule.valid_from or (rule.valid_until is not None and day > rule.valid_until):
+                continue
+            step = timedelta(minutes=rule.slot_minutes)
+            slot_start = datetime.combine(day, rule.start_time)
+            rule_end = datetime.combine(day, rule.end_time)
+            while slot_start + step <= rule_end:
+                slot_end = slot_start + step
+                if slot_start < end and start < slot_end and not _blocked(
+                    by_date.get(day, ()), rule, slot_start, slot_end
+                ):
+                    slots.append({
+                        "rule_id": rule.id,
+                        "tutor_id": rule.tutor_id,
+                        "start_time": slot_start,
+                        "end_time": slot_end,
+                        "subject": rule.subject,
+                    })
+                slot_start = slot_end
+        day += timedelta(days=1)
+
+    slots.sort(key=lambda s: s["start_time"])
+    return slots
+
+
+def load_rules(db, tutor_id: int, start: datetime, end: datetime):
+    rules = (
+        db.query(models.AvailabilityRule)
+        .filter(
+            models.AvailabilityRule.tutor_id == tutor_id,
+            models.AvailabilityRule.valid_from <= end.date(),
+            (models.AvailabilityRule.valid_until.is_(None))
+            | (models.AvailabilityRule.valid_until >= start.date()),
+        )
+        .all()
+    )
+    if not rules:
+        return [], []
+    exceptions = (
+        db.query(models.AvailabilityException)
+        .filter(
+            models.AvailabilityException.tutor_id == tutor_id,
+            models.AvailabilityException.date >= start.date(),
+            models.AvailabilityException.date <= end.date(),
+        )
+        .all()
+    )
+    return rules, exceptions
+
+
+def find_occurrence(db, rule: models.AvailabilityRule, start_time: datetime):
+    """校验 start_time 是否是规则的一个有效（未被例外屏蔽的）slot，是则返回该 slot。"""
+    end = start_time + timedelta(minutes=rule.slot_minutes)
+    exceptions = (
+        db.query(models.AvailabilityException)
+        .filter(
+            models.AvailabilityException.tutor_id == rule.tutor_id,
+            models.AvailabilityException.date == start_time.date(),
+        )
+        .all()
+    )
+    for slot in expand_rules([rule], exceptions, start_time, end):
+        if slot["start_time"] == start_time:
+            return slot
+    return None
+
+
+def materialize_slot(db, rule: models.AvailabilityRule, start_time: datetime):
+    """把规则里的一个时间点落成 AvailableSlot；已存在同一时间的 slot 时直接复用。"""
+    occurrence = find_occurrence(db, rule, start_time)
+    if occurrence is None:
+        return None
+
+    def existing():
+        return (
+            db.query(models.AvailableSlot)
+            .filter_by(tutor_id=rule.tutor_id, start_time=start_time)
+            .first()
+        )
+
+    slot = existing()
+    if slot is None:
+        try:
+            # 两个学生同时预约同一时间点时，(tutor_id, start_time) 唯一索引保证只落一行
+            with db.begin_nested():
+                slot = models.AvailableSlot(**occurrence, is_booked=False)
+                db.add(slot)
+        except IntegrityError:
+            slot = existing()
+    return slot
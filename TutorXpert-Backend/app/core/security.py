@@ -1,13 +1,25 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from jose import jwt
 from passlib.context import CryptContext
+from fastapi import HTTPException
+import asyncio
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "super-secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 天
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost，修改后老用户会在下次登录时自动按新 cost 重新哈希
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# 专门跑 bcrypt 的进程池大小，不占用 Starlette 的共享线程池
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# 同时进行的登录 / 注册数量上限，超出的请求排队，排队太久返回 503
+LOGIN_CONCURRENCY = int(os.getenv("LOGIN_CONCURRENCY", PASSWORD_HASH_WORKERS * 2))
+LOGIN_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LOGIN_QUEUE_TIMEOUT_SECONDS", 10))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
@@ -15,6 +27,57 @@ def verify_password(plain, hashed):
 def hash_password(password):
     return pwd_context.hash(password)
 
+def needs_rehash(hashed):
+    return pwd_context.needs_update(hashed)
+
+
+_hash_pool = None
+_login_semaphore = None
+
+
+def _get_hash_pool():
+    # 懒加载：uvicorn 多 worker 时每个 worker 进程各自创建
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def hash_password_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_pool(), hash_password, password)
+
+
+async def verify_password_async(plain, hashed):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_pool(), verify_password, plain, hashed)
+
+
+@asynccontextmanager
+async def login_slot():
+    global _login_semaphore
+    if _login_semaphore is None:
+        _login_semaphore = asyncio.Semaphore(LOGIN_CONCURRENCY)
+    try:
+        await asyncio.wait_for(_login_semaphore.acquire(), LOGIN_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        yield
+    finally:
+        _login_semaphore.release()
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
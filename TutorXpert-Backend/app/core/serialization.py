@@ -0,0 +1,135 @@
+# app/core/serialization.py
+# 大列表接口的快速序列化：只查需要的列（元组），用预先编译好的函数把每行拼成 dict，
+# 最后用 pydantic-core 一次性编码成 JSON，跳过 ORM 对象构造和逐行 Pydantic 校验。
+# 字段顺序 / 别名 / 类型转换和对应的 response_model 保持一致，输出逐字节相同。
+#
+# 支持 fields= 稀疏字段：只 SELECT 请求字段依赖的列，只输出这些 key（id 总是带上）。
+from functools import lru_cache
+
+from fastapi import HTTPException, Response
+from pydantic_core import to_json
+
+from app import models
+
+
+def _float(value):
+    # Optional[float] 字段：int 列（如 hourly_rate）输出成 1.0 的形式
+    return None if value is None else float(value)
+
+
+class Projection:
+    """一个列表接口的全部输出字段：[(key, 依赖的列, 计算函数, 是否需要 ctx)]。
+
+    没有依赖列的字段固定输出 null；没有计算函数时直接输出那一列的值；
+    需要 ctx 的计算函数第一个参数是调用方传进来的请求级数据（如科目关联表）。
+    """
+
+    def __init__(self, fields):
+        self.fields = [(key, columns, compute, bool(uses_ctx)) for key, columns, compute, *uses_ctx in fields]
+        self.keys = tuple(field[0] for field in self.fields)
+
+    def resolve(self, fields: str = None):
+        """解析 fields= 参数，返回按响应字段顺序排列的 key 元组。"""
+        if not fields:
+            return self.keys
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(self.keys)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(self.keys)}",
+            )
+        requested.add("id")
+        return tuple(key for key in self.keys if key in requested)
+
+    @lru_cache(maxsize=128)
+    def compile(self, keys):
+        """返回 (要 SELECT 的列, row -> dict 的函数)，同一组字段只编译一次。"""
+        columns, index, items, namespace = [], {}, [], {}
+        for n, (key, needed, compute, uses_ctx) in enumerate(self.fields):
+            if key not in keys:
+                continue
+            args = ["ctx"] if uses_ctx else []
+            for column in needed:
+                if column.key not in index:
+                    index[column.key] = len(columns)
+                    columns.append(column)
+                args.append(f"r[{index[column.key]}]")
+            if not needed:
+                items.append(f"{key!r}: None")
+            elif compute is None:
+                items.append(f"{key!r}: {args[0]}")
+            else:
+                namespace[f"_c{n}"] = compute
+                items.append(f"{key!r}: _c{n}({', '.join(args)})")
+        source = "def serialize(r, ctx=None):\n    return {" + ", ".join(items) + "}\n"
+        exec(source, namespace)
+        return tuple(columns), namespace["serialize"]
+
+
+def json_response(content, status_code: int = 200):
+    """和 FastAPI 按 response_model 输出时相同的编码器（pydantic-core），直接返回 bytes。"""
+    return Response(content=to_json(content), status_code=status_code, media_type="application/json")
+
+
+# TaskOut 的字段顺序；student 在列表里从不加载，固定为 null
+TASK_PROJECTION = Projection(
+    [
+        (name, (getattr(models.Task, name),), _float if name in ("lat", "lng") else None)
+        for name in (
+            "id", "title", "subject", "address", "lat", "lng", "description", "budget",
+            "deadline", "posted_by", "posted_date", "status", "accepted_tutor_id",
+        )
+    ]
+    + [("student", (), None)]
+)
+
+
+def _tutor_subjects(links, profile_id, text):
+    names = links.get(profile_id)
+    if names is None:
+        # 尚未回填的旧数据，和 Profile.subject_names 一样退回到文本列
+        return [s.strip() for s in text.split(",") if s.strip()] if text else []
+    return names
+
+
+# TutorOut（by_alias）的字段顺序
+P = models.Profile
+TUTOR_PROJECTION = Projection([
+    ("id", (P.id,), None),
+    ("firstName", (P.first_name,), None),
+    ("lastName", (P.last_name,), None),
+    ("title", (P.title,), None),
+    ("bio", (P.bio,), None),
+    ("experience", (), None),
+    ("hourlyRate", (P.hourly_rate,), _float),
+    ("rating", (P.rating,), _float),
+    ("subjects", (P.id, P.subjects), _tutor_subjects, True),
+    ("address", (P.address,), None),
+    ("lat", (P.lat,), _float),
+    ("lng", (P.lng,), _float),
+    ("name", (P.first_name, P.last_name), lambda first, last: f"{first} {last}"),
+])
+del P
+
+
+def tutor_subject_names(db, profile_ids, chunk_size: int = 500):
+    """profile_id -> 科目名列表（按 position），和 Profile.subject_names 的来源一致。"""
+    names = {}
+    for i in range(0, len(profile_ids), chunk_size):
+        rows = (
+            db.query(models.TutorSubject.profile_id, models.Subject.name)
+            .join(models.Subject, models.Subject.id == models.TutorSubject.subject_id)
+            .filter(models.TutorSubject.profile_id.in_(profile_ids[i:i + chunk_size]))
+            .order_by(models.TutorSubject.profile_id, models.TutorSubject.position)
+        )
+        for profile_id, name in rows:
+            names.setdefault(profile_id, []).append(name)
+    return names
+
+
+def serialize_tutor_rows(db, rows, keys=TUTOR_PROJECTION.keys):
+    """rows: TUTOR_PROJECTION.compile(keys) 给出的列顺序的元组（第一列总是 id）。"""
+    _, serialize = TUTOR_PROJECTION.compile(keys)
+    links = tutor_subject_names(db, [row[0] for row in rows]) if "subjects" in keys else None
+    return [serialize(row, links) for row in rows]
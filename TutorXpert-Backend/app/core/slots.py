@@ -0,0 +1,115 @@
+# app/core/slots.py
+# 批量写入可用时间：先按 (tutor_id, start_time) 有序读出窗口内已有 slot 做重叠检测，
+# 再用一条 INSERT ... RETURNING 写入所有无冲突的 slot。
+import bisect
+from datetime import timedelta
+
+from sqlalchemy import insert
+
+from app import models
+from app.core.recurrence import to_naive_utc
+
+# 单个 slot 最长时长，重叠检测时据此限定要读取的已有 slot 范围
+MAX_SLOT_HOURS = 24
+
+
+class _Intervals:
+    """按开始时间排序的区间集合，用于查找与 [start, end) 重叠的区间。"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r[0])
+        self.starts = [r[0] for r in rows]
+        self.rows = rows
+        # prefix_end[i] = rows[:i+1] 中最大的结束时间（历史数据可能本身就有重叠）
+        self.prefix_end = []
+        for _, end, _ in rows:
+            self.prefix_end.append(max(end, self.prefix_end[-1]) if self.prefix_end else end)
+
+    def find_overlap(self, start, end):
+        i = bisect.bisect_left(self.starts, end) - 1
+        if i < 0 or self.prefix_end[i] <= start:
+            return None
+        while i >= 0:
+            if self.rows[i][1] > start:
+                return self.rows[i][2]
+            i -= 1
+        return None
+
+    def add(self, start, end, ref):
+        # 只重算插入点之后的 prefix_end。plan_slots 按开始时间顺序加入批内已接受的 slot，
+        # 插入点总在末尾，每次 O(1)，整批 O(n log n) 而不是 O(n²)
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.rows.insert(i, (start, end, ref))
+        del self.prefix_end[i:]
+        for _, row_end, _ in self.rows[i:]:
+            self.prefix_end.append(max(row_end, self.prefix_end[-1]) if self.prefix_end else row_end)
+
+
+def plan_slots(db, slots):
+    """检查一批 AvailableSlotCreate，返回每一项的结果 dict（status: ok / conflict / invalid）。"""
+    results = [{"index": i, "status": "ok"} for i in range(len(slots))]
+    by_tutor = {}
+    for i, slot in enumerate(slots):
+        # 带时区的输入先换算成 UTC，和日历 / 预约接口一样按 naive UTC 比较和存储
+        start, end = to_naive_utc(slot.start_time), to_naive_utc(slot.end_time)
+        if start >= end:
+            results[i].update(status="invalid", detail="Start time must be before end time")
+        elif end - start > timedelta(hours=MAX_SLOT_HOURS):
+            results[i].update(status="invalid", detail=f"Slot cannot be longer than {MAX_SLOT_HOURS} hours")
+        else:
+            by_tutor.setdefault(slot.tutor_id, []).append((start, end, i))
+
+    for tutor_id, items in by_tutor.items():
+        window_start = min(start for start, _, _ in items) - timedelta(hours=MAX_SLOT_HOURS)
+        window_end = max(end for _, end, _ in items)
+        # 走 (tutor_id, start_time) 索引的范围扫描
+        existing = _Intervals(
+            db.query(models.AvailableSlot.start_time, models.AvailableSlot.end_time, models.AvailableSlot.id)
+            .filter(
+                models.AvailableSlot.tutor_id == tutor_id,
+                models.AvailableSlot.start_time >= window_start,
+                models.AvailableSlot.start_time < window_end,
+            )
+            .all()
+        )
+        accepted = _Intervals([])
+        for start, end, i in sorted(items):
+            slot_id = existing.find_overlap(start, end)
+            if slot_id is not None:
+                results[i].update(status="conflict", conflict_with=slot_id, detail="Overlaps an existing slot")
+                continue
+            other = accepted.find_overlap(start, end)
+            if other is not None:
+                results[i].update(
+                    status="conflict", conflict_with_index=other, detail="Overlaps another slot in this batch"
+                )
+                continue
+            accepted.add(start, end, i)
+    return results
+
+
+def insert_slots(db, slots):
+    """一条 INSERT ... RETURNING 写入所有 slot，返回与输入顺序一致的行。"""
+    if not slots:
+        return []
+    stmt = insert(models.AvailableSlot).returning(
+        models.AvailableSlot.id,
+        models.AvailableSlot.tutor_id,
+        models.AvailableSlot.start_time,
+        models.AvailableSlot.end_time,
+        models.AvailableSlot.subject,
+        models.AvailableSlot.is_booked,
+        sort_by_parameter_order=True,
+    )
+    rows = [
+        {
+            "tutor_id": slot.tutor_id,
+            "start_time": to_naive_utc(slot.start_time),
+            "end_time": to_naive_utc(slot.end_time),
+            "subject": slot.subject,
+            "is_booked": False,
+        }
+        for slot in slots
+    ]
+    return db.execute(stmt, rows).all()
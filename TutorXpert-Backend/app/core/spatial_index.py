@@ -0,0 +1,274 @@
+# app/core/spatial_index.py
+# 进程内的网格空间索引：地图拖动时直接在内存里按 bounds 找出 tutor / task，
+# 附近搜索（半径 / k 近邻）从所在格子一圈圈向外扩，按距离从近到远产出，
+# 数据库只负责按 id 取详情。
+import heapq
+import math
+import os
+import threading
+
+from fastapi import HTTPException
+
+from app import models
+
+TUTOR_INDEX_CELL_DEG = float(os.getenv("TUTOR_INDEX_CELL_DEG", 0.1))
+TUTOR_INDEX_REFRESH_SECONDS = int(os.getenv("TUTOR_INDEX_REFRESH_SECONDS", 60))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((p2 - p1) / 2) ** 2
+        + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class GridIndex:
+    """按经纬度切成固定大小网格的点索引，key -> (lat, lng)。"""
+
+    def __init__(self, cell_deg: float = TUTOR_INDEX_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._points = {}   # key -> (lat, lng)
+        self._cells = {}    # (row, col) -> set(key)
+
+    def _cell(self, lat: float, lng: float):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def __len__(self):
+        return len(self._points)
+
+    def upsert(self, key, lat, lng):
+        if lat is None or lng is None:
+            self.remove(key)
+            return
+        with self._lock:
+            old = self._points.get(key)
+            if old is not None:
+                if old == (lat, lng):
+                    return
+                self._discard(key, old)
+            self._points[key] = (lat, lng)
+            self._cells.setdefault(self._cell(lat, lng), set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard(key, old)
+
+    def _discard(self, key, point):
+        cell = self._cell(*point)
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def load(self, items):
+        """整体替换索引内容，items 为 (key, lat, lng) 可迭代对象。"""
+        points, cells = {}, {}
+        for key, lat, lng in items:
+            if lat is None or lng is None:
+                continue
+            points[key] = (lat, lng)
+            cells.setdefault(self._cell(lat, lng), set()).add(key)
+        with self._lock:
+            self._points, self._cells = points, cells
+
+    def query_bbox(self, north: float, south: float, east: float, west: float):
+        """返回落在 [south, north] x [west, east] 内的 (key, lat, lng) 列表。"""
+        if north < south or east < west:
+            return []
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+
+        with self._lock:
+            span = (row_max - row_min + 1) * (col_max - col_min + 1)
+            # 视野很大时（缩放到国家级别），遍历已占用的格子比遍历整个矩形便宜
+            if span > len(self._cells):
+                candidates = [
+                    keys for (row, col), keys in self._cells.items()
+                    if row_min <= row <= row_max and col_min <= col <= col_max
+                ]
+            else:
+                candidates = [
+                    self._cells[(row, col)]
+                    for row in range(row_min, row_max + 1)
+                    for col in range(col_min, col_max + 1)
+                    if (row, col) in self._cells
+                ]
+
+            result = []
+            for keys in candidates:
+                for key in keys:
+                    lat, lng = self._points[key]
+                    if south <= lat <= north and west <= lng <= east:
+                        result.append((key, lat, lng))
+            return result
+
+    def nearest(self, lat: float, lng: float, radius_km: float = None):
+        """按距离从近到远惰性产出 (key, lat, lng, distance_km)，可选只到 radius_km 为止。
+
+        从 (lat, lng) 所在格子开始一圈圈向外扩：第 r 圈扫完后，圈外的点离查询点至少有
+        bound(r) 公里，于是堆里距离 <= bound(r) 的点可以按顺序放出去。调用方拿够 k 个就停，
+        不会去碰远处的格子。不处理跨 180° 经线的情况。
+        """
+        row0, col0 = self._cell(lat, lng)
+        cos_lat = math.cos(math.radians(lat))
+        heap, r = [], 0
+        while True:
+            with self._lock:
+                occupied = len(self._cells)
+                # 圈已经比所有已占用的格子还多时，直接扫剩下的格子（等价于扩到无穷远）
+                if (2 * r + 1) ** 2 > 4 * occupied:
+                    cells = [
+                        keys for (row, col), keys in self._cells.items()
+                        if max(abs(row - row0), abs(col - col0)) >= r
+                    ]
+                    last = True
+                else:
+                    cells = [self._cells.get(cell) for cell in _ring(row0, col0, r)]
+                    last = False
+                points = [(key, *self._points[key]) for keys in cells if keys for key in keys]
+
+            for key, plat, plng in points:
+                distance = haversine_km(lat, lng, plat, plng)
+                if radius_km is None or distance <= radius_km:
+                    heapq.heappush(heap, (distance, key, plat, plng))
+
+            bound = math.inf if last else self._ring_bound(lat, lng, cos_lat, row0, col0, r)
+            while heap and heap[0][0] <= bound:
+                distance, key, plat, plng = heapq.heappop(heap)
+                yield key, plat, plng, distance
+            if last or (radius_km is not None and bound > radius_km):
+                return
+            r += 1
+
+    def _ring_bound(self, lat, lng, cos_lat, row0, col0, r):
+        """第 0..r 圈组成的方块之外的点，离 (lat, lng) 的最小可能距离（公里）。"""
+        c = self.cell_deg
+        south, north = (row0 - r) * c, (row0 + r + 1) * c
+        west, east = (col0 - r) * c, (col0 + r + 1) * c
+        # 纬度在方块外：至少差 gap_lat 度的经线距离
+        gap_lat = min(lat - south, north - lat) * KM_PER_DEG
+        # 纬度在方块内、经度在方块外：haversine 里 cos(lat2) 取方块内的最小值
+        gap_lng = math.radians(min(lng - west, east - lng))
+        if gap_lng >= math.pi:
+            return gap_lat
+        cos_min = math.cos(math.radians(min(max(abs(south), abs(north)), 90.0)))
+        a = cos_lat * cos_min * math.sin(gap_lng / 2) ** 2
+        return min(gap_lat, 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+
+
+def _ring(row0, col0, r):
+    # 切比雪夫距离正好为 r 的一圈格子
+    if r == 0:
+        yield row0, col0
+        return
+    for col in range(col0 - r, col0 + r + 1):
+        yield row0 - r, col
+        yield row0 + r, col
+    for row in range(row0 - r + 1, row0 + r):
+        yield row, col0 - r
+        yield row, col0 + r
+
+
+# 附近搜索只给了 lat / lng 时默认返回的条数
+NEAREST_DEFAULT_LIMIT = int(os.getenv("NEAREST_DEFAULT_LIMIT", 50))
+# 有科目 / 关键词过滤时，每批交给数据库过滤的候选数的下限
+NEAREST_BATCH_SIZE = int(os.getenv("NEAREST_BATCH_SIZE", 100))
+
+
+def parse_near_query(bounds, lat, lng, radius_km, k, cluster=False):
+    """地图搜索的两种模式：bounds 模式返回 None，附近模式返回 (lat, lng, radius_km, limit)。"""
+    if lat is None and lng is None:
+        if radius_km is not None or k is not None:
+            raise HTTPException(status_code=400, detail="radius_km / k require lat and lng")
+        if any(value is None for value in bounds):
+            raise HTTPException(status_code=400, detail="Either north/south/east/west or lat/lng is required")
+        return None
+    if lat is None or lng is None:
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    if cluster:
+        raise HTTPException(status_code=400, detail="cluster=true requires north/south/east/west")
+    if radius_km is None and k is None:
+        k = NEAREST_DEFAULT_LIMIT
+    return lat, lng, radius_km, k
+
+
+def take_nearest(hits, load, limit=None, batch_size=None):
+    """hits 为 nearest() 的输出；load(keys) 返回通过过滤条件（科目 / 关键词）的 {key: row}。
+
+    候选按距离分批交给 load，攒够 limit 条就停；过滤掉的多就把下一批翻倍。
+    没有过滤条件时调用方传 batch_size=limit，一次查询就够。
+    返回 [(row, distance_km)]，按距离升序。
+    """
+    result = []
+    if batch_size is None:
+        batch_size = max(NEAREST_BATCH_SIZE, 2 * limit) if limit else NEAREST_BATCH_SIZE
+    size = batch_size
+    batch = []
+
+    def flush():
+        rows = load([hit[0] for hit in batch])
+        for key, _, _, distance in batch:
+            row = rows.get(key)
+            if row is not None:
+                result.append((row, distance))
+                if limit and len(result) >= limit:
+                    return True
+        batch.clear()
+        return False
+
+    for hit in hits:
+        batch.append(hit)
+        if len(batch) >= size:
+            if flush():
+                return result
+            size = min(size * 2, 500)
+    if batch:
+        flush()
+    return result
+
+
+# tutor 索引：key 为 Profile.id（即 TutorOut.id）
+tutor_index = GridIndex()
+
+
+def rebuild_tutor_index(db):
+    rows = (
+        db.query(models.Profile.id, models.Profile.lat, models.Profile.lng)
+        .join(models.User)
+        .filter(models.User.role == "tutor")
+        .all()
+    )
+    tutor_index.load(rows)
+    return len(tutor_index)
+
+
+def sync_tutor_location(profile: models.Profile, role: str):
+    # 注册 / 修改资料后调用，只有 tutor 会出现在地图上
+    if role == "tutor":
+        tutor_index.upsert(profile.id, profile.lat, profile.lng)
+    else:
+        tutor_index.remove(profile.id)
+
+
+# task 索引：key 为 Task.id，只用于附近搜索（bounds 搜索仍走 (lat, lng) 索引）
+task_index = GridIndex()
+
+
+def rebuild_task_index(db):
+    rows = db.query(models.Task.id, models.Task.lat, models.Task.lng).all()
+    task_index.load(rows)
+    return len(task_index)
+
+
+def sync_task_location(task: models.Task):
+    # 发布任务后调用；删除时直接 task_index.remove(task_id)
+    task_index.upsert(task.id, task.lat, task.lng)
@@ -0,0 +1,123 @@
+# app/core/subjects.py
+# 科目规范化：subjects 表 + tutor_subjects / task_subjects 关联表，
+# 地图搜索按 slug 做等值查询，不再 ilike('%subject%')。
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+
+
+def normalize_subject(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+def split_subjects(text):
+    """把逗号分隔的科目文本拆成去重后的名称列表，保持原顺序。"""
+    if not text:
+        return []
+    names, seen = [], set()
+    for part in text.split(","):
+        name = " ".join(part.split())
+        slug = name.lower()
+        if name and slug not in seen:
+            seen.add(slug)
+            names.append(name)
+    return names
+
+
+def get_or_create_subjects(db, names):
+    """按 slug 查找科目，不存在则创建；返回与 names 顺序一致的 Subject 列表。"""
+    slugs = [normalize_subject(n) for n in names]
+    if not slugs:
+        return []
+    existing = {
+        s.slug: s for s in db.query(models.Subject).filter(models.Subject.slug.in_(slugs))
+    }
+    for name, slug in zip(names, slugs):
+        if slug in existing:
+            continue
+        try:
+            # 并发创建同名科目时只会有一个成功，失败的一方重新读取
+            with db.begin_nested():
+                subject = models.Subject(name=name, slug=slug)
+                db.add(subject)
+            existing[slug] = subject
+        except IntegrityError:
+            existing[slug] = db.query(models.Subject).filter(models.Subject.slug == slug).one()
+    return [existing[slug] for slug in slugs]
+
+
+def sync_profile_subjects(db, profile: models.Profile):
+    subjects = get_or_create_subjects(db, split_subjects(profile.subjects))
+    current = {link.subject_id: link for link in profile.subject_links}
+    links = []
+    for position, subject in enumerate(subjects):
+        link = current.get(subject.id) or models.TutorSubject(subject=subject)
+        link.position = position
+        links.append(link)
+    profile.subject_links = links
+
+
+def sync_task_subjects(db, task: models.Task):
+    subjects = get_or_create_subjects(db, split_subjects(task.subject))
+    current = {link.subject_id: link for link in task.subject_links}
+    task.subject_links = [current.get(s.id) or models.TaskSubject(subject=s) for s in subjects]
+
+
+def profile_subject_clause(subject: str):
+    # Profile.id IN (该科目下的 tutor)，走 tutor_subjects.subject_id 索引
+    return models.Profile.id.in_(
+        select(models.TutorSubject.profile_id)
+        .join(models.Subject, models.Subject.id == models.TutorSubject.subject_id)
+        .where(models.Subject.slug == normalize_subject(subject))
+    )
+
+
+def task_subject_clause(subject: str):
+    return models.Task.id.in_(
+        select(models.TaskSubject.task_id)
+        .join(models.Subject, models.Subject.id == models.TaskSubject.subject_id)
+        .where(models.Subject.slug == normalize_subject(subject))
+    )
+
+
+def backfill_subjects(db, batch_size: int = 500):
+    """为还没有关联记录的 profile / task 回填科目，可重复执行。"""
+    count = 0
+    for model, sync in (
+        (models.Profile, sync_profile_subjects),
+        (models.Task, sync_task_subjects),
+    ):
+        text_column = model.subjects if model is models.Profile else model.subject
+        last_id = 0
+        while True:
+            rows = (
+                db.query(model)
+                .filter(
+                    model.id > last_id,
+                    text_column.isnot(None),
+                    text_column != "",
+                    ~model.subject_links.any(),
+                )
+                .order_by(model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                sync(db, row)
+            db.commit()
+            count += len(rows)
+    return count
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print("Backfilled subjects for", backfill_subjects(session), "rows")
+    finally:
+        session.close()
@@ -0,0 +1,316 @@
+# app/core/suggestions.py
+# 给任务推荐 tutor：所有 tutor 的位置 / 时薪 / 评分 / 科目按列存成 NumPy 数组，
+# 每次请求对全部候选一次性向量化打分（haversine 距离、科目匹配、时薪 vs 预算、评分），
+# 再用 argpartition 取 top-k，不再逐行 Python 循环。
+#
+# 资料变更时 Session 事件把对应 user 标记为 pending，下次打分前按批重读这些行并原地更新数组；
+# 启动和定时刷新（TUTOR_INDEX_REFRESH_SECONDS）时整体重建，吸收批量导入和其他进程的修改。
+import math
+import os
+import re
+import threading
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.subjects import normalize_subject, split_subjects
+from app.core.serialization import TUTOR_PROJECTION, serialize_tutor_rows
+
+EARTH_RADIUS_KM = 6371.0088
+# 距离得分 exp(-d / scale)：scale 公里处得分约 0.37
+SUGGEST_DISTANCE_SCALE_KM = float(os.getenv("SUGGEST_DISTANCE_SCALE_KM", 10))
+# 默认只推荐这个半径内的 tutor（任务没有坐标时不限制），0 表示不限制
+SUGGEST_MAX_DISTANCE_KM = float(os.getenv("SUGGEST_MAX_DISTANCE_KM", 100))
+
+# 各项得分都在 0..1，按权重加总
+WEIGHT_DISTANCE = 0.4
+WEIGHT_SUBJECT = 0.35
+WEIGHT_PRICE = 0.15
+WEIGHT_RATING = 0.1
+# 没填时薪 / 任务没写预算、没有评分时的中性分
+NEUTRAL_PRICE = 0.5
+NEUTRAL_RATING = 0.7
+
+_BUDGET_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_budget(budget):
+    """任务预算是自由文本（"$50/h"、"50"、"1,200"），取第一个数字；没有数字返回 None。"""
+    if not budget:
+        return None
+    match = _BUDGET_NUMBER.search(budget.replace(",", ""))
+    return float(match.group()) if match else None
+
+
+class TutorMatrix:
+    """tutor 的列式缓存：第 i 行对应一个 tutor，subjects 是 行 x 科目 的布尔矩阵。
+
+    删除只把 active 置 False，空出来的行在下次整体重建时回收。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()   # 资料有变、待重读的 user_id
+        self._allocate(0, 0)
+
+    def __len__(self):
+        return int(self.active[:self.size].sum())
+
+    def _allocate(self, capacity, n_subjects):
+        self.size = 0
+        self._rows = {}           # user_id -> 行号
+        self._subject_cols = {}   # subject_id -> 列号
+        self.profile_id = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.located = np.zeros(capacity, dtype=bool)
+        self.lat = np.zeros(capacity)       # 弧度
+        self.lng = np.zeros(capacity)
+        self.cos_lat = np.zeros(capacity)
+        self.rate = np.full(capacity, np.nan)
+        self.rating = np.full(capacity, np.nan)
+        self.subjects = np.zeros((capacity, n_subjects), dtype=bool)
+
+    def _grow(self, rows, cols):
+        # 容量不够时按 2 倍扩容，摊还下来每次 upsert 还是 O(1)
+        capacity, n_subjects = self.subjects.shape
+        if rows > capacity:
+            extra = max(rows, capacity * 2, 64) - capacity
+            for name in ("profile_id", "active", "located", "lat", "lng", "cos_lat"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros(extra, dtype=array.dtype)]))
+            self.rate = np.concatenate([self.rate, np.full(extra, np.nan)])
+            self.rating = np.concatenate([self.rating, np.full(extra, np.nan)])
+            self.subjects = np.vstack([self.subjects, np.zeros((extra, n_subjects), dtype=bool)])
+        if cols > n_subjects:
+            extra = max(cols, n_subjects * 2, 16) - n_subjects
+            self.subjects = np.hstack([self.subjects, np.zeros((self.subjects.shape[0], extra), dtype=bool)])
+
+    def _set_location(self, rows, lat, lng):
+        # Profile.lat / lng 默认是 0.0，(0, 0) 视为没有坐标
+        self.located[rows] = ~(np.isnan(lat) | np.isnan(lng) | ((lat == 0) & (lng == 0)))
+        self.lat[rows] = np.radians(np.nan_to_num(lat))
+        self.lng[rows] = np.radians(np.nan_to_num(lng))
+        self.cos_lat[rows] = np.cos(self.lat[rows])
+
+    def load(self, rows, links):
+        """整体替换：rows 为 (user_id, profile_id, lat, lng, hourly_rate, rating)，links 为 (profile_id, subject_id)。"""
+        user_ids = [row[0] for row in rows]
+        profile_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        # None -> nan
+        values = np.array([row[2:] for row in rows], dtype=float).reshape(len(rows), 4)
+        subject_ids = sorted({subject_id for _, subject_id in links})
+
+        matrix = TutorMatrix.__new__(TutorMatrix)
+        matrix._allocate(len(rows), len(subject_ids))
+        n = matrix.size = len(rows)
+        matrix._rows = {user_id: i for i, user_id in enumerate(user_ids)}
+        matrix._subject_cols = {subject_id: j for j, subject_id in enumerate(subject_ids)}
+        matrix.profile_id[:] = profile_ids
+        matrix.active[:] = True
+        matrix._set_location(slice(0, n), values[:, 0], values[:, 1])
+        matrix.rate[:] = values[:, 2]
+        matrix.rating[:] = values[:, 3]
+        row_of_profile = {profile_id: i for i, profile_id in enumerate(profile_ids.tolist())}
+        pairs = [(row_of_profile[p], matrix._subject_cols[s]) for p, s in links if p in row_of_profile]
+        if pairs:
+            r, c = np.array(pairs).T
+            matrix.subjects[r, c] = True
+
+        with self._lock:
+            for name in ("size", "_rows", "_subject_cols", "profile_id", "active", "located",
+                         "lat", "lng", "cos_lat", "rate", "rating", "subjects"):
+                setattr(self, name, getattr(matrix, name))
+        return n
+
+    def mark_stale(self, user_ids):
+        with self._lock:
+            self._pending.update(user_ids)
+
+    def refresh_pending(self, db):
+        """重读 pending 的 tutor 并原地更新对应行；不再是 tutor / 资料被删的行置为 inactive。"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            user_ids, self._pending = list(self._pending), set()
+        rows = _tutor_rows(db, models.Profile.user_id.in_(user_ids))
+        links = _tutor_links(db, models.Profile.user_id.in_(user_ids))
+        subjects_of = {}
+        for profile_id, subject_id in links:
+            subjects_of.setdefault(profile_id, []).append(subject_id)
+
+        with self._lock:
+            found = set()
+            for user_id, profile_id, lat, lng, rate, rating in rows:
+                found.add(user_id)
+                self._upsert(user_id, profile_id, lat, lng, rate, rating, subjects_of.get(profile_id, []))
+            for user_id in set(user_ids) - found:
+                row = self._rows.get(user_id)
+                if row is not None:
+                    self.active[row] = False
+        return len(user_ids)
+
+    def _upsert(self, user_id, profile_id, lat, lng, rate, rating, subject_ids):
+        row = self._rows.get(user_id)
+        if row is None:
+            row = self._rows[user_id] = self.size
+            self.size += 1
+        for subject_id in subject_ids:
+            if subject_id not in self._subject_cols:
+                self._subject_cols[subject_id] = len(self._subject_cols)
+        self._grow(self.size, len(self._subject_cols))
+
+        self.profile_id[row] = profile_id
+        self.active[row] = True
+        self._set_location([row], np.array([lat], dtype=float), np.array([lng], dtype=float))
+        self.rate[row] = np.nan if rate is None else rate
+        self.rating[row] = np.nan if rating is None else rating
+        self.subjects[row] = False
+        self.subjects[row, [self._subject_cols[s] for s in subject_ids]] = True
+
+    def rank(self, lat, lng, subject_ids, budget, limit, max_km=None):
+        """返回 [(profile_id, score, distance_km 或 None, subject_match)]，按得分从高到低。"""
+        with self._lock:
+            n = self.size
+            candidates = self.active[:n].copy()
+            located = self.located[:n]
+
+            distance = np.full(n, np.inf)
+            if lat is not None and lng is not None and (lat, lng) != (0, 0):
+                lat1, lng1 = math.radians(lat), math.radians(lng)
+                # haversine
+                a = (
+                    np.sin((self.lat[:n] - lat1) / 2) ** 2
+                    + math.cos(lat1) * self.cos_lat[:n] * np.sin((self.lng[:n] - lng1) / 2) ** 2
+                )
+                distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+                distance[~located] = np.inf
+                if max_km:
+                    candidates &= distance <= max_km
+            distance_score = np.exp(-distance / SUGGEST_DISTANCE_SCALE_KM)   # inf -> 0
+
+            cols = [self._subject_cols[s] for s in subject_ids if s in self._subject_cols]
+            if cols:
+                subject_match = self.subjects[:n, cols].sum(axis=1) / len(subject_ids)
+            else:
+                subject_match = np.zeros(n)
+
+            rate = self.rate[:n]
+            if budget:
+                # 不超预算满分，超出部分按比例扣分，超一倍及以上为 0
+                price = np.clip(2 - rate / budget, 0, 1)
+                price = np.where(np.isnan(rate), NEUTRAL_PRICE, price)
+            else:
+                price = np.full(n, NEUTRAL_PRICE)
+
+            rating = self.rating[:n]
+            rating_score = np.where(np.isnan(rating), NEUTRAL_RATING, np.clip(rating / 5, 0, 1))
+
+            score = (
+                WEIGHT_DISTANCE * distance_score
+                + WEIGHT_SUBJECT * subject_match
+                + WEIGHT_PRICE * price
+                + WEIGHT_RATING * rating_score
+            )
+            profile_id = self.profile_id[:n]
+
+        index = np.flatnonzero(candidates)
+        if limit < len(index):
+            index = index[np.argpartition(-score[index], limit - 1)[:limit]]
+        # 同分时按 profile id 排，结果稳定
+        index = index[np.lexsort((profile_id[index], -score[index]))]
+        return [
+            (
+                int(profile_id[i]),
+                float(score[i]),
+                float(distance[i]) if np.isfinite(distance[i]) else None,
+                float(subject_match[i]),
+            )
+            for i in index
+        ]
+
+
+tutor_matrix = TutorMatrix()
+
+
+def _tutor_rows(db, *criteria):
+    P = models.Profile
+    return (
+        db.query(P.user_id, P.id, P.lat, P.lng, P.hourly_rate, P.rating)
+        .join(models.User, models.User.id == P.user_id)
+        .filter(models.User.role == "tutor", *criteria)
+        .all()
+    )
+
+
+def _tutor_links(db, *criteria):
+    return (
+        db.query(models.TutorSubject.profile_id, models.TutorSubject.subject_id)
+        .join(models.Profile, models.Profile.id == models.TutorSubject.profile_id)
+        .join(models.User, models.User.id == models.Profile.user_id)
+        .filter(models.User.role == "tutor", *criteria)
+        .all()
+    )
+
+
+def rebuild_tutor_matrix(db):
+    return tutor_matrix.load(_tutor_rows(db), _tutor_links(db))
+
+
+def task_subject_ids(db, task: models.Task):
+    subject_ids = [link.subject_id for link in task.subject_links]
+    if not subject_ids and task.subject:
+        # 尚未回填关联表的旧任务，按 slug 查
+        slugs = [normalize_subject(name) for name in split_subjects(task.subject)]
+        subject_ids = [
+            row[0] for row in db.query(models.Subject.id).filter(models.Subject.slug.in_(slugs))
+        ]
+    return subject_ids
+
+
+def suggest_tutors(db, task: models.Task, limit: int = 10, max_km: float = None):
+    """返回 TutorOut（by_alias）字段 + score / distanceKm / subjectMatch 的 dict 列表。"""
+    tutor_matrix.refresh_pending(db)
+    ranked = tutor_matrix.rank(
+        task.lat, task.lng, task_subject_ids(db, task), parse_budget(task.budget),
+        limit, SUGGEST_MAX_DISTANCE_KM if max_km is None else max_km,
+    )
+    if not ranked:
+        return []
+    columns, _ = TUTOR_PROJECTION.compile(TUTOR_PROJECTION.keys)
+    ids = [profile_id for profile_id, *_ in ranked]
+    rows = {row[0]: row for row in db.query(*columns).filter(models.Profile.id.in_(ids))}
+    tutors = serialize_tutor_rows(db, [rows[i] for i in ids if i in rows])
+    ranked = {profile_id: rest for profile_id, *rest in ranked}
+    result = []
+    for tutor in tutors:
+        score, distance, subject_match = ranked[tutor["id"]]
+        tutor["score"] = round(score, 4)
+        tutor["distanceKm"] = None if distance is None else round(distance, 3)
+        tutor["subjectMatch"] = round(subject_match, 4)
+        result.append(tutor)
+    return result
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tutors(session, flush_context):
+    # 资料（坐标 / 时薪 / 评分 / 科目文本）或角色变化都要重读；科目关联表和 subjects 文本在同一次 flush 里改
+    changed = session.info.setdefault("tutor_matrix_stale", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Profile) and obj.user_id is not None:
+            changed.add(obj.user_id)
+        elif isinstance(obj, models.User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_tutors_stale(session):
+    changed = session.info.pop("tutor_matrix_stale", None)
+    if changed:
+        tutor_matrix.mark_stale(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tutor_changes(session):
+    session.info.pop("tutor_matrix_stale", None)
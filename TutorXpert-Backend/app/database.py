@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi.concurrency import run_in_threadpool
+from app.core.db_pool import engine_options
 import os
 from dotenv import load_dotenv
 
@@ -10,25 +14,78 @@ load_dotenv()
 # 默认连接字符串（本地 SQLite）
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+# ✅ 路由默认走异步引擎（Postgres 用 asyncpg，SQLite 用 aiosqlite）；DB_ASYNC=false 退回同步 Session + 线程池
+DB_ASYNC = os.getenv("DB_ASYNC", "true").lower() in ("1", "true", "yes")
+
 # SQLite 特有参数配置
 if DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 else:
     connect_args = {}  # ✅ PostgreSQL/Render 不要加 sslmode 这里，加在 URL 即可
 
-# 创建数据库引擎
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+def _engine_kwargs(url, is_async: bool = False):
+    # ✅ 连接池大小 / overflow / recycle / pre-ping / 语句超时见 app/core/db_pool.py
+    options = engine_options(make_url(url), is_async)
+    extra = options.pop("connect_args", {})
+    base = {} if is_async else connect_args
+    return dict(options, connect_args={**base, **extra})
+
+
+# 创建数据库引擎（后台任务、启动回填、命令行脚本始终用同步引擎）
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def async_database_url(url: str):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        # asyncpg 不认识 libpq 的 sslmode 参数，换成它自己的 ssl
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(async_database_url(DATABASE_URL), **_engine_kwargs(DATABASE_URL, is_async=True))
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False)
+
 # 声明基类
 Base = declarative_base()
 
-# FastAPI 中的依赖注入用法
-def get_db():
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# FastAPI 中的依赖注入用法
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """在请求的 Session 上执行 fn(session, *args)。
+
+    AsyncSession 通过 run_sync 在 greenlet 里跑同步 ORM 代码，等待数据库时让出事件循环；
+    同步 Session 放进线程池。fn 需要在内部把结果转成 schema / dict，
+    不能把未加载完的 ORM 对象带出来（异步模式下懒加载会报 MissingGreenlet）。
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
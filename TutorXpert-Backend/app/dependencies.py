@@ -4,7 +4,8 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from app import models
-from app.database import get_db
+from app.database import get_db, run_db
+from app.core.principal_cache import Principal, principal_cache
 import os
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -12,22 +13,59 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 SECRET_KEY = os.getenv("SECRET_KEY", "super-secret")
 ALGORITHM = "HS256"
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+def decode_token(token: str):
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+
+def decode_user_id(token: str):
+    # 解析 JWT 返回 user_id，无效时返回 None（WebSocket 等无法用 Depends 的地方也会用到）
+    payload = decode_token(token)
+    user_id = payload.get("sub") if payload else None
+    return int(user_id) if user_id is not None else None
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    # ✅ 命中缓存时既不解 JWT 也不查库；Session 没有执行语句时不会占用连接
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    payload = decode_token(token)
+    if payload is None or payload.get("sub") is None:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
-    if user is None:
+    principal = await run_db(db, _load_principal, int(payload["sub"]))
+    if principal is None:
         raise credentials_exception
-    return user
+
+    # 缓存不会比 token 本身活得更久
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+
+def _load_principal(db: Session, user_id: int):
+    row = (
+        db.query(
+            models.User.id,
+            models.User.email,
+            models.User.role,
+            models.Profile.first_name,
+            models.Profile.last_name,
+        )
+        .outerjoin(models.Profile, models.Profile.user_id == models.User.id)
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+    display_name = f"{row.first_name} {row.last_name}" if row.first_name else row.email
+    return Principal(id=row.id, email=row.email, role=row.role, display_name=display_name)
@@ -1,15 +1,85 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import Base, engine
+from app.database import engine, SessionLocal, async_engine
+from app.core import spatial_index, suggestions
+from app.core.subjects import backfill_subjects
+from app.core.fulltext import detect_fulltext_backend
+from app.core.conversations import ensure_conversations
+from app.core.realtime import hub
+from app.core.booking import backfill_booked_flags
+from app.core.security import shutdown_hash_pool
+from app.core.geocoding import geocode_worker
+from app.core.db_pool import pool_status
+from app.core.metrics import MetricsMiddleware, instrument_engine, registry
+from app.core.compression import CompressionMiddleware
 from app.routes import student, profile, tutor, task, message, auth, availability, appointment     # ✅ 添加 profile 路由导入
 
 # ⛳ 确保模型被正确注册
 from app import models
 
+def _backfill():
+    db = SessionLocal()
+    try:
+        backfill_subjects(db)
+        ensure_conversations(db)
+        backfill_booked_flags(db)
+    finally:
+        db.close()
+
+
+def _rebuild_indexes():
+    db = SessionLocal()
+    try:
+        # 地图用的网格索引（tutor / task）和推荐用的列式数组一起重建
+        suggestions.rebuild_tutor_matrix(db)
+        spatial_index.rebuild_task_index(db)
+        return spatial_index.rebuild_tutor_index(db)
+    finally:
+        db.close()
+
+
+async def _refresh_indexes_forever():
+    # 多 worker 时每个进程各有一份索引，定期全量重建以吸收其他进程的修改
+    while True:
+        await asyncio.sleep(spatial_index.TUTOR_INDEX_REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(_rebuild_indexes)
+        except Exception as e:
+            print("🔥 Spatial index refresh failed:", repr(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ✅ 表结构由迁移维护（alembic upgrade head），启动时不做 DDL；
+    # 这里只回填科目关联表 / 会话摘要，并构建 tutor / task 空间索引
+    await run_in_threadpool(detect_fulltext_backend, engine)
+    await run_in_threadpool(_backfill)
+    await run_in_threadpool(_rebuild_indexes)
+    await hub.start()
+    geocode_worker.start()
+    refresher = None
+    if spatial_index.TUTOR_INDEX_REFRESH_SECONDS > 0:
+        refresher = asyncio.create_task(_refresh_indexes_forever())
+    yield
+    if refresher:
+        refresher.cancel()
+    await hub.stop()
+    geocode_worker.stop()
+    shutdown_hash_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 app = FastAPI(
     title="GlowUpTutors API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -23,8 +93,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ 超过 COMPRESSION_MIN_SIZE 的 JSON 按 Accept-Encoding 压缩（br 优先，其次 gzip）
+app.add_middleware(CompressionMiddleware)
+
+# ✅ 按路由统计延迟 / SQL 条数 / SQL 耗时，结果见 /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
 
-Base.metadata.create_all(bind=engine)
 
 # ✅ 注册路由
 app.include_router(student.router)
@@ -43,4 +120,32 @@ def root():
     return {
         "message": "GlowUpTutors backend is running.",
         "db_url": str(engine.url)
-    }
\ No newline at end of file
+    }
+
+
+# ✅ 连接池运行时状态：借出 / 空闲连接数、排队等待次数和时长、超时次数
+@app.get("/db/pool")
+def db_pool_status():
+    status = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine.sync_engine)
+    return status
+
+
+# ✅ Prometheus 抓取入口（多 worker 时每个进程各自计数）
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    pool_lines = []
+    gauges = (
+        ("db_pool_checked_out", "gauge", "checked_out"),
+        ("db_pool_waits_total", "counter", "waits"),
+        ("db_pool_wait_seconds_total", "counter", "wait_seconds_total"),
+        ("db_pool_timeouts_total", "counter", "timeouts"),
+    )
+    pools = db_pool_status()
+    for name, kind, key in gauges:
+        pool_lines.append(f"# TYPE {name} {kind}")
+        for engine_name, status in pools.items():
+            if key in status:
+                pool_lines.append(f'{name}{{engine="{engine_name}"}} {status[key]}')
+    return registry.render(pool_lines)
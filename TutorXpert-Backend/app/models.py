@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, Text, Date, DateTime, Time, ForeignKey, Index, UniqueConstraint, func, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from sqlalchemy import Float
@@ -22,6 +22,10 @@ class User(Base):
 
 class Profile(Base):
     __tablename__ = "profile"
+    __table_args__ = (
+        # ✅ 地图边界查询按 (lat, lng) 范围扫描
+        Index("ix_profile_lat_lng", "lat", "lng"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
@@ -44,11 +48,34 @@ class Profile(Base):
     rating = Column(Float, nullable=True)
     title = Column(String(100), nullable=True)
     bio = Column(Text, nullable=True)
+    # ✅ 每次 UPDATE 自增，详情接口据此生成 ETag / Last-Modified
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
     user = relationship("User", back_populates="profile")
 
+    # ✅ 规范化后的科目（subjects 文本列仍保留原始输入）
+    subject_links = relationship(
+        "TutorSubject",
+        order_by="TutorSubject.position",
+        lazy="selectin",
+        cascade="all, delete-orphan",
+    )
+
+    @property
+    def subject_names(self):
+        if self.subject_links:
+            return [link.subject.name for link in self.subject_links]
+        # 尚未回填的旧数据
+        if self.subjects:
+            return [s.strip() for s in self.subjects.split(",") if s.strip()]
+        return []
+
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_lat_lng", "lat", "lng"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
@@ -62,34 +89,97 @@ class Task(Base):
     status = Column(String, default="Open")
     posted_by = Column(String)
     posted_date = Column(DateTime(timezone=True), server_default=func.now())
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     accepted_tutor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="tasks", foreign_keys=[user_id])
 
     # ✅ 对应绑定 task -> task_applications
     applications = relationship("TaskApplication", back_populates="task", cascade="all, delete-orphan")
+    subject_links = relationship("TaskSubject", cascade="all, delete-orphan")
+
+
+class Subject(Base):
+    __tablename__ = "subjects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    slug = Column(String(100), unique=True, index=True, nullable=False)  # 小写、去多余空格后的名称
+
+
+class TutorSubject(Base):
+    __tablename__ = "tutor_subjects"
+
+    profile_id = Column(Integer, ForeignKey("profile.id", ondelete="CASCADE"), primary_key=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)  # 保持 tutor 填写的顺序
+
+    subject = relationship("Subject", lazy="joined")
+
+
+class TaskSubject(Base):
+    __tablename__ = "task_subjects"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    subject = relationship("Subject", lazy="joined")
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # ✅ 聊天记录按 (会话, id) 做 keyset 分页
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     text = Column(Text, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # 所属会话（无序用户对），send_message 时写入
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=True)
 
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
 
 
+# 每对用户一行的会话摘要，send_message 时在同一事务里更新，收件箱只读这张表
+class Conversation(Base):
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        Index("ix_conversations_low_last", "user_low_id", "last_message_at"),
+        Index("ix_conversations_high_last", "user_high_id", "last_message_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 两个用户按 id 从小到大存放，保证一对用户只有一行
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_text = Column(Text, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    unread_low = Column(Integer, nullable=False, default=0)    # user_low 的未读数
+    unread_high = Column(Integer, nullable=False, default=0)   # user_high 的未读数
+    last_read_low_id = Column(Integer, nullable=True)          # user_low 已读到的消息 id
+    last_read_high_id = Column(Integer, nullable=True)
+
+
 
 class TaskApplication(Base):
     __tablename__ = "task_applications"
+    __table_args__ = (
+        # ✅ 一个 tutor 对同一个任务只能申请一次（create_task_application 靠它兜底并发重复提交）
+        UniqueConstraint("task_id", "tutor_id", name="uq_task_applications_task_tutor"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
-    tutor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    tutor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     applied_at = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(String, default="pending")
     message = Column(Text, nullable=True)
@@ -101,6 +191,10 @@ class TaskApplication(Base):
 
 class AvailableSlot(Base):
     __tablename__ = "available_slots"
+    __table_args__ = (
+        # ✅ 按 tutor + 开始时间有序，重叠检测 / 日历查询走范围扫描
+        Index("ix_available_slots_tutor_start", "tutor_id", "start_time", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tutor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -108,17 +202,59 @@ class AvailableSlot(Base):
     end_time = Column(DateTime, nullable=False)
     subject = Column(String(100), nullable=False)  # ✅ 新增字段
     is_booked = Column(Boolean, default=False)
+    # 由周期规则预约时生成；已有库上的这一列由 migrations 0002 添加（alembic upgrade head）
+    rule_id = Column(Integer, ForeignKey("availability_rules.id", ondelete="SET NULL"), nullable=True, index=True)
     tutor = relationship("User", back_populates="available_slots")
     appointments = relationship("Appointment", back_populates="slot")  # ✅ 加上这行
 
 
+# 每周重复的可用时间（如每周一 9:00–17:00），读取时按窗口展开成 slot，
+# 只有被预约时才写入 available_slots
+class AvailabilityRule(Base):
+    __tablename__ = "availability_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tutor_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = 周一 ... 6 = 周日
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    subject = Column(String(100), nullable=False)
+    slot_minutes = Column(Integer, nullable=False, default=15)
+    valid_from = Column(Date, nullable=False)
+    valid_until = Column(Date, nullable=True)  # 为空表示长期有效
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# 规则的例外（请假 / 节假日），rule_id 为空时对该 tutor 所有规则生效，
+# start_time / end_time 为空表示全天
+class AvailabilityException(Base):
+    __tablename__ = "availability_exceptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tutor_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    rule_id = Column(Integer, ForeignKey("availability_rules.id", ondelete="CASCADE"), nullable=True)
+    date = Column(Date, nullable=False)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+
+
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # ✅ 一个 slot 同时只能有一个未被拒绝的预约
+        Index(
+            "uq_appointments_active_slot",
+            "slot_id",
+            unique=True,
+            sqlite_where=text("status != 'rejected'"),
+            postgresql_where=text("status != 'rejected'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    tutor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    slot_id = Column(Integer, ForeignKey("available_slots.id"), nullable=False)
+    tutor_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    slot_id = Column(Integer, ForeignKey("available_slots.id"), nullable=False, index=True)
     message = Column(Text, nullable=True)
     status = Column(String(20), default="pending")  # pending / accepted / rejected
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -126,3 +262,14 @@ class Appointment(Base):
     student = relationship("User", foreign_keys=[student_id])
     tutor = relationship("User", foreign_keys=[tutor_id])
 
+
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+
+    # ✅ 规范化后的地址（小写、合并空白）作为主键，lat/lng 为空表示查无结果
+    address_key = Column(Text, primary_key=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    provider = Column(String(50), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
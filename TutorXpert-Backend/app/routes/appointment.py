@@ -1,72 +1,119 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, run_db
 from app import models, schemas
 from typing import List, Optional
+from app.core.recurrence import materialize_slot, to_naive_utc
+from app.core.booking import SlotUnavailable, book_slot, release_slot
 
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
 @router.post("/", response_model=schemas.AppointmentOut)
-def create_appointment(app_req: schemas.AppointmentCreate, db: Session = Depends(get_db)):
-    # 检查 slot 是否存在且未被预约
-    slot = db.query(models.AvailableSlot).filter_by(id=app_req.slot_id).first()
-    if not slot:
-        raise HTTPException(status_code=404, detail="Slot not found")
-
-    existing = db.query(models.Appointment).filter_by(slot_id=app_req.slot_id).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Slot already booked")
-
-    appointment = models.Appointment(**app_req.dict())
-    db.add(appointment)
+async def create_appointment(app_req: schemas.AppointmentCreate, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _create_appointment, app_req)
+
+
+def _create_appointment(db: Session, app_req: schemas.AppointmentCreate):
+    # ✅ 预约周期规则里的时间：先把这个时间点物化成 slot
+    if app_req.slot_id is None:
+        if app_req.rule_id is None or app_req.start_time is None:
+            raise HTTPException(status_code=400, detail="slot_id or rule_id + start_time is required")
+        rule = db.query(models.AvailabilityRule).filter_by(id=app_req.rule_id).first()
+        if not rule or rule.tutor_id != app_req.tutor_id:
+            raise HTTPException(status_code=404, detail="Availability rule not found")
+        slot = materialize_slot(db, rule, to_naive_utc(app_req.start_time))
+        if slot is None:
+            raise HTTPException(status_code=400, detail="Requested time is not available in this rule")
+    else:
+        # 检查 slot 是否存在且未被预约
+        slot = db.query(models.AvailableSlot).filter_by(id=app_req.slot_id).first()
+        if not slot:
+            raise HTTPException(status_code=404, detail="Slot not found")
+
+    # ✅ 条件 UPDATE 抢占 slot，抢不到的请求直接 409，不会重复预约
+    try:
+        appointment = book_slot(db, slot.id, app_req.student_id, app_req.tutor_id, app_req.message)
+    except SlotUnavailable:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slot already booked")
     db.commit()
     db.refresh(appointment)
-    return appointment
+    return schemas.AppointmentOut.model_validate(appointment)
 
 
 @router.patch("/{appointment_id}/status")
-def update_appointment_status(
+async def update_appointment_status(
     appointment_id: int,
     payload: schemas.AppointmentStatusUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    appointment = db.query(models.Appointment).filter_by(id=appointment_id).first()
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
+    return await run_db(db, _update_appointment_status, appointment_id, payload)
 
-    if appointment.status != "pending":
-        raise HTTPException(status_code=400, detail="Cannot update status once finalized")
 
-    appointment.status = payload.status
+def _update_appointment_status(db: Session, appointment_id: int, payload: schemas.AppointmentStatusUpdate):
+    # 和 accept / reject 一样走条件 UPDATE，只有真正从 pending 改过来的请求才释放 slot
+    appointment = _finalize_pending(db, appointment_id, payload.status)
+    if payload.status == "rejected":
+        # 被拒绝后 slot 重新开放预约
+        release_slot(db, appointment.slot_id)
     db.commit()
-    db.refresh(appointment)
     return {"message": f"Appointment status updated to {payload.status}"}
 
 
 @router.get("/tutor/{tutor_id}", response_model=List[schemas.AppointmentWithSlotOut])
-def get_appointments_by_tutor(tutor_id: int, db: Session = Depends(get_db)):
-    appointments = db.query(models.Appointment).filter(models.Appointment.tutor_id == tutor_id).all()
-    for a in appointments:
-        _ = a.slot  # 确保 ORM 正确加载 slot
-    return appointments
+async def get_appointments_by_tutor(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        appointments = db.query(models.Appointment).filter(models.Appointment.tutor_id == tutor_id).all()
+        return [schemas.AppointmentWithSlotOut.model_validate(a) for a in appointments]
+    return await run_db(db, load)
 
 @router.post("/{appointment_id}/accept")
-def accept_appointment(appointment_id: int, db: Session = Depends(get_db)):
+async def accept_appointment(appointment_id: int, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _accept_appointment, appointment_id)
+
+
+def _finalize_pending(db: Session, appointment_id: int, status: str):
+    # ✅ 条件 UPDATE：只有 pending 的预约能被接受 / 拒绝，并发的重复请求只有一个会生效
     appt = db.query(models.Appointment).filter_by(id=appointment_id).first()
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    appt.status = "accepted"
-    appt.slot.is_booked = True
+    try:
+        with db.begin_nested():
+            result = db.execute(
+                update(models.Appointment)
+                .where(models.Appointment.id == appointment_id, models.Appointment.status == "pending")
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            )
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slot already booked")
+    if result.rowcount != 1:
+        # 读到的 appt.status 可能已经过时（并发请求抢先改了），不回显具体状态
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Appointment is no longer pending")
+    return appt
+
+
+def _accept_appointment(db: Session, appointment_id: int):
+    # pending 的预约在创建时已经通过 claim_slot 抢占了 slot，这里不再写 is_booked
+    _finalize_pending(db, appointment_id, "accepted")
     db.commit()
     return {"detail": "Appointment accepted"}
 
 
 @router.post("/{appointment_id}/reject")
-def reject_appointment(appointment_id: int, db: Session = Depends(get_db)):
-    appt = db.query(models.Appointment).filter_by(id=appointment_id).first()
-    if not appt:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    appt.status = "rejected"
+async def reject_appointment(appointment_id: int, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _reject_appointment, appointment_id)
+
+
+def _reject_appointment(db: Session, appointment_id: int):
+    appt = _finalize_pending(db, appointment_id, "rejected")
+    # 只有这次把 pending 变成 rejected 时才释放；重复拒绝不会放掉已被新预约占用的 slot
+    release_slot(db, appt.slot_id)
     db.commit()
-    return {"detail": "Appointment rejected"}
\ No newline at end of file
+    return {"detail": "Appointment rejected"}
@@ -1,22 +1,39 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from app import models, schemas
-from app.database import get_db
-from app.core.security import verify_password, create_access_token, hash_password
+from app.database import get_db, run_db
+from app.core.security import (
+    create_access_token,
+    hash_password_async,
+    login_slot,
+    needs_rehash,
+    verify_password_async,
+)
 from sqlalchemy.orm import joinedload
 from app.schemas import UserWithProfileOut
+from app.core.spatial_index import sync_tutor_location
+from app.core.subjects import sync_profile_subjects
 
 
 router = APIRouter(tags=["auth"])
 
+# ✅ bcrypt 在独立进程池里计算，数据库操作走请求的 Session，事件循环不会被哈希占满
 @router.post("/register", response_model=schemas.UserOut)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    async with login_slot():
+        if await run_db(db, _email_taken, user.email):
+            raise HTTPException(status_code=400, detail="Email already registered")
+        hashed_pw = await hash_password_async(user.password)
+    return await run_db(db, _create_user, user, hashed_pw)
 
-    hashed_pw = hash_password(user.password)
+
+def _email_taken(db: Session, email: str):
+    return db.query(models.User.id).filter(models.User.email == email).first() is not None
+
+
+def _create_user(db: Session, user: schemas.UserCreate, hashed_pw: str):
     new_user = models.User(
         email=user.email,
         hashed_password=hashed_pw,
@@ -45,29 +62,49 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         lng=user.lng            # ✅ 添加
     )
     db.add(new_profile)
+    sync_profile_subjects(db, new_profile)
     db.commit()
 
-    return new_user
+    # ✅ 新 tutor 立即出现在地图索引里
+    sync_tutor_location(new_profile, new_user.role)
+
+    return schemas.UserOut.model_validate(new_user)
 
 @router.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    async with login_slot():
+        user, user_out = await run_db(db, _load_user, form_data.username)
+
+        if not user or not await verify_password_async(form_data.password, user.hashed_password):
+            raise HTTPException(status_code=401, detail="Incorrect email or password")
+
+        # ✅ bcrypt cost 调整过的老哈希，登录成功时顺便按新 cost 重新哈希
+        if needs_rehash(user.hashed_password):
+            new_hash = await hash_password_async(form_data.password)
+            await run_db(db, _update_password_hash, user, new_hash)
+
+    access_token = create_access_token(data={"sub": str(user_out.id)})
+
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": user_out
+    }
+
+
+def _load_user(db: Session, email: str):
     user = (
         db.query(models.User)
         .options(joinedload(models.User.profile))
-        .filter(models.User.email == form_data.username)
+        .filter(models.User.email == email)
         .first()
     )
+    return user, UserWithProfileOut.from_orm(user) if user else None
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="Incorrect email or password")
-
-    access_token = create_access_token(data={"sub": str(user.id)})
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": UserWithProfileOut.from_orm(user)
-    }
\ No newline at end of file
+def _update_password_hash(db: Session, user: models.User, new_hash: str):
+    user.hashed_password = new_hash
+    db.commit()
@@ -1,67 +1,164 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
+from app.database import get_db, run_db
 from app import models, schemas
 from sqlalchemy.sql import exists
 from fastapi import HTTPException, status
 from app import database
+from app.core.recurrence import expand_rules, load_rules, to_naive_utc
+from app.core.slots import insert_slots, plan_slots
+from sqlalchemy.exc import IntegrityError
 
 
 
 router = APIRouter(prefix="/availability", tags=["availability"])
 
 SLOT_DURATION_MINUTES = 15  # 每个 slot 持续 15 分钟
+MAX_CALENDAR_DAYS = 92      # 日历接口单次最多查询的天数
 
 @router.post("/", response_model=List[schemas.AvailableSlotOut])
-def create_slots(slots: List[schemas.AvailableSlotCreate], db: Session = Depends(get_db)):
-    created = []
+async def create_slots(slots: List[schemas.AvailableSlotCreate], db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _create_slots, slots)
 
-    for slot in slots:
-        if slot.start_time >= slot.end_time:
-            raise HTTPException(status_code=400, detail="Start time must be before end time")
-
-        new_slot = models.AvailableSlot(
-            tutor_id=slot.tutor_id,
-            start_time=slot.start_time,
-            end_time=slot.end_time,
-            subject=slot.subject
-        )
-        db.add(new_slot)
-        created.append(new_slot)
 
-    db.commit()
-    for s in created:
-        db.refresh(s)
+def _create_slots(db: Session, slots: List[schemas.AvailableSlotCreate]):
+    plan = plan_slots(db, slots)
+
+    invalid = [r for r in plan if r["status"] == "invalid"]
+    if invalid:
+        raise HTTPException(status_code=400, detail=invalid[0]["detail"])
+    conflicts = [r for r in plan if r["status"] == "conflict"]
+    if conflicts:
+        raise HTTPException(status_code=409, detail={"message": "Slots overlap", "conflicts": conflicts})
+
+    # ✅ 整批一条 INSERT ... RETURNING，不再逐条 refresh
+    try:
+        rows = insert_slots(db, slots)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slots overlap")
+    return [dict(row._mapping) for row in rows]
+
+
+# ✅ 批量导入：逐条返回结果，有冲突的跳过，其余照常写入
+@router.post("/bulk", response_model=schemas.BulkSlotResult)
+async def bulk_create_slots(slots: List[schemas.AvailableSlotCreate], db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _bulk_create_slots, slots)
+
+
+def _bulk_create_slots(db: Session, slots: List[schemas.AvailableSlotCreate]):
+    plan = plan_slots(db, slots)
+    accepted = [r for r in plan if r["status"] == "ok"]
+
+    try:
+        rows = insert_slots(db, [slots[r["index"]] for r in accepted])
+        db.commit()
+    except IntegrityError:
+        # 并发写入了同一开始时间的 slot
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slots were modified concurrently, please retry")
+
+    for result, row in zip(accepted, rows):
+        result.update(status="created", slot=dict(row._mapping))
+
+    return {
+        "created": len(accepted),
+        "conflicts": sum(1 for r in plan if r["status"] == "conflict"),
+        "invalid": sum(1 for r in plan if r["status"] == "invalid"),
+        "results": plan,
+    }
+
+
+def _slots_with_booking(db: Session, tutor_id: int, start: datetime = None, end: datetime = None):
+    # ✅ is_booked 在预约时原子置位、拒绝时释放，直接读列即可，一条 SQL 取完
+    query = db.query(
+        models.AvailableSlot,
+        models.AvailableSlot.is_booked.label("booked"),
+    ).filter(models.AvailableSlot.tutor_id == tutor_id)
+    if start is not None:
+        query = query.filter(models.AvailableSlot.end_time > start)
+    if end is not None:
+        query = query.filter(models.AvailableSlot.start_time < end)
+
+    return [
+        {
+            "id": slot.id,
+            "rule_id": slot.rule_id,
+            "tutor_id": slot.tutor_id,
+            "start_time": slot.start_time,
+            "end_time": slot.end_time,
+            "subject": slot.subject,
+            "is_booked": bool(booked),
+        }
+        for slot, booked in query.order_by(models.AvailableSlot.start_time)
+    ]
 
-    return created
 
 # 获取某个 tutor 的所有可用时间
 @router.get("/tutor/{tutor_id}", response_model=list[schemas.AvailableSlotOut])
-def get_tutor_slots(tutor_id: int, db: Session = Depends(get_db)):
-    slots = db.query(models.AvailableSlot).filter(models.AvailableSlot.tutor_id == tutor_id).all()
-    result = []
+async def get_tutor_slots(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _slots_with_booking, tutor_id)
+
+
+# ✅ 日历视图：只取 [from, to) 窗口内的 slot，可按天分组
+@router.get("/tutor/{tutor_id}/calendar", response_model=schemas.AvailabilityCalendarOut)
+async def get_tutor_calendar(
+    tutor_id: int,
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    group_by_day: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    # 两端可能一个带时区一个不带，先统一成 naive UTC 再比较
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if end - start > timedelta(days=MAX_CALENDAR_DAYS):
+        raise HTTPException(status_code=400, detail=f"Calendar window cannot exceed {MAX_CALENDAR_DAYS} days")
+
+    slots, rules, exceptions = await run_db(db, _load_calendar, tutor_id, start, end)
+
+    # ✅ 合并周期规则展开的 slot；同一时间已经落库的以数据库为准
+    if rules:
+        taken = {slot["start_time"] for slot in slots}
+        virtual = [
+            dict(slot, id=None, is_booked=False)
+            for slot in expand_rules(rules, exceptions, start, end)
+            if slot["start_time"] not in taken
+        ]
+        slots = sorted(slots + virtual, key=lambda s: s["start_time"])
+
+    if not group_by_day:
+        return {"tutor_id": tutor_id, "start": start, "end": end, "slots": slots}
 
+    days = {}
     for slot in slots:
-        is_booked = db.query(
-            exists().where(models.Appointment.slot_id == slot.id)
-        ).scalar()
+        days.setdefault(slot["start_time"].date(), []).append(slot)
+    return {
+        "tutor_id": tutor_id,
+        "start": start,
+        "end": end,
+        "days": [{"date": day, "slots": day_slots} for day, day_slots in days.items()],
+    }
 
-        result.append(schemas.AvailableSlotOut(
-            id=slot.id,
-            tutor_id=slot.tutor_id,
-            start_time=slot.start_time,
-            end_time=slot.end_time,
-            subject=slot.subject,
-            is_booked=is_booked
-        ))
 
-    return result
+def _load_calendar(db: Session, tutor_id: int, start: datetime, end: datetime):
+    slots = _slots_with_booking(db, tutor_id, start, end)
+    rules, exceptions = load_rules(db, tutor_id, start, end)
+    # expand_rules 只读规则 / 例外的列属性，离开 Session 后照样可用
+    return slots, rules, exceptions
 
 
 @router.delete("/{slot_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_slot(slot_id: int, db: Session = Depends(get_db)):
+async def delete_slot(slot_id: int, db: AsyncSession = Depends(get_db)):
+    await run_db(db, _delete_slot, slot_id)
+
+
+def _delete_slot(db: Session, slot_id: int):
     slot = db.query(models.AvailableSlot).filter(models.AvailableSlot.id == slot_id).first()
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
@@ -74,4 +171,101 @@ def delete_slot(slot_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Cannot delete a booked slot")
 
     db.delete(slot)
-    db.commit()
\ No newline at end of file
+    db.commit()
+
+
+# ✅ 周期规则：只存规则本身，读取时按窗口展开
+@router.post("/rules", response_model=schemas.AvailabilityRuleOut)
+async def create_rule(rule: schemas.AvailabilityRuleCreate, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _create_rule, rule)
+
+
+def _create_rule(db: Session, rule: schemas.AvailabilityRuleCreate):
+    if rule.start_time >= rule.end_time:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+    if rule.valid_until is not None and rule.valid_until < rule.valid_from:
+        raise HTTPException(status_code=400, detail="valid_until must not be before valid_from")
+
+    new_rule = models.AvailabilityRule(**rule.dict())
+    db.add(new_rule)
+    db.commit()
+    db.refresh(new_rule)
+    return schemas.AvailabilityRuleOut.model_validate(new_rule)
+
+
+@router.get("/tutor/{tutor_id}/rules", response_model=List[schemas.AvailabilityRuleOut])
+async def get_tutor_rules(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        rules = (
+            db.query(models.AvailabilityRule)
+            .filter(models.AvailabilityRule.tutor_id == tutor_id)
+            .order_by(models.AvailabilityRule.weekday, models.AvailabilityRule.start_time)
+            .all()
+        )
+        return [schemas.AvailabilityRuleOut.model_validate(rule) for rule in rules]
+    return await run_db(db, load)
+
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
+    await run_db(db, _delete_rule, rule_id)
+
+
+def _delete_rule(db: Session, rule_id: int):
+    rule = db.query(models.AvailabilityRule).filter(models.AvailabilityRule.id == rule_id).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+
+    # 已经预约出去的 slot 保留，只断开和规则的关联
+    db.query(models.AvailableSlot).filter(models.AvailableSlot.rule_id == rule_id).update(
+        {"rule_id": None}, synchronize_session=False
+    )
+    db.query(models.AvailabilityException).filter(
+        models.AvailabilityException.rule_id == rule_id
+    ).delete(synchronize_session=False)
+    db.delete(rule)
+    db.commit()
+
+
+@router.post("/exceptions", response_model=schemas.AvailabilityExceptionOut)
+async def create_exception(exc: schemas.AvailabilityExceptionCreate, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _create_exception, exc)
+
+
+def _create_exception(db: Session, exc: schemas.AvailabilityExceptionCreate):
+    if (exc.start_time is None) != (exc.end_time is None):
+        raise HTTPException(status_code=400, detail="start_time and end_time must be given together")
+    if exc.start_time is not None and exc.start_time >= exc.end_time:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+
+    new_exc = models.AvailabilityException(**exc.dict())
+    db.add(new_exc)
+    db.commit()
+    db.refresh(new_exc)
+    return schemas.AvailabilityExceptionOut.model_validate(new_exc)
+
+
+@router.get("/tutor/{tutor_id}/exceptions", response_model=List[schemas.AvailabilityExceptionOut])
+async def get_tutor_exceptions(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        exceptions = (
+            db.query(models.AvailabilityException)
+            .filter(models.AvailabilityException.tutor_id == tutor_id)
+            .order_by(models.AvailabilityException.date)
+            .all()
+        )
+        return [schemas.AvailabilityExceptionOut.model_validate(exc) for exc in exceptions]
+    return await run_db(db, load)
+
+
+@router.delete("/exceptions/{exception_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_exception(exception_id: int, db: AsyncSession = Depends(get_db)):
+    await run_db(db, _delete_exception, exception_id)
+
+
+def _delete_exception(db: Session, exception_id: int):
+    exc = db.query(models.AvailabilityException).filter(models.AvailabilityException.id == exception_id).first()
+    if not exc:
+        raise HTTPException(status_code=404, detail="Exception not found")
+    db.delete(exc)
+    db.commit()
@@ -1,54 +1,128 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, run_db
 from app import models, schemas
-from typing import List
+from app.core.conversations import inbox_query, mark_read, pair, record_message
+from app.core.realtime import hub
+from app.dependencies import decode_user_id
+from typing import List, Optional
 
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
 @router.post("/", response_model=schemas.MessageOut)
-def send_message(msg: schemas.MessageCreate, db: Session = Depends(get_db)):
+async def send_message(msg: schemas.MessageCreate, db: AsyncSession = Depends(get_db)):
+    message_out = await run_db(db, _save_message, msg)
+
+    # ✅ 推送给在线的收发双方（多端同步）
+    payload = message_out.model_dump(mode="json")
+    for user_id in {message_out.receiver_id, message_out.sender_id}:
+        await hub.publish(user_id, payload)
+    return message_out
+
+
+def _save_message(db: Session, msg: schemas.MessageCreate):
     db_msg = models.Message(**msg.dict())
     db.add(db_msg)
+    db.flush()
+    # ✅ 同一事务内更新会话摘要
+    record_message(db, db_msg)
     db.commit()
     db.refresh(db_msg)
-    return db_msg
+    return schemas.MessageOut.model_validate(db_msg, from_attributes=True)
+
+
+# ✅ 实时消息通道：ws://.../messages/ws?token=<JWT>
+@router.websocket("/ws")
+async def message_socket(websocket: WebSocket, token: str = Query(...)):
+    user_id = decode_user_id(token)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await hub.connect(user_id, websocket)
+    try:
+        while True:
+            # 客户端只需要保持连接，收到的内容（心跳）直接忽略
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(user_id, websocket)
 
 @router.get("/history/{user1_id}/{user2_id}", response_model=list[schemas.MessageOut])
-def get_conversation(user1_id: int, user2_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Message).filter(
-        ((models.Message.sender_id == user1_id) & (models.Message.receiver_id == user2_id)) |
-        ((models.Message.sender_id == user2_id) & (models.Message.receiver_id == user1_id))
-    ).order_by(models.Message.timestamp).all()
+async def get_conversation(
+    user1_id: int,
+    user2_id: int,
+    before_id: Optional[int] = Query(None, description="往前翻页：只返回 id 小于它的消息"),
+    after_id: Optional[int] = Query(None, description="增量拉取：只返回 id 大于它的新消息"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """按 id 倒序返回最多 limit 条（最新在前）；客户端反转后显示，用最小的 id 作 before_id 继续往前翻。"""
+    def load(db: Session):
+        messages = _load_history(db, user1_id, user2_id, before_id, after_id, limit)
+        return [schemas.MessageOut.model_validate(m, from_attributes=True) for m in messages]
+    return await run_db(db, load)
+
+
+def _load_history(db: Session, user1_id: int, user2_id: int, before_id, after_id, limit: int):
+    # ✅ keyset 分页，按 id 倒序（最新在前）
+    # before_id：往前翻页；after_id：只拉取该 id 之后的新消息
+    low, high = pair(user1_id, user2_id)
+    conv = db.query(models.Conversation.id).filter_by(user_low_id=low, user_high_id=high).first()
+    if conv is None:
+        return []
+
+    query = db.query(models.Message).filter(models.Message.conversation_id == conv.id)
+    if before_id is not None:
+        query = query.filter(models.Message.id < before_id)
+    if after_id is not None:
+        query = query.filter(models.Message.id > after_id)
+        if before_id is None:
+            # 新消息从 after_id 往后取，避免超过 limit 时中间漏消息
+            messages = query.order_by(models.Message.id.asc()).limit(limit).all()
+            return messages[::-1]
+
+    return query.order_by(models.Message.id.desc()).limit(limit).all()
 
 
 @router.get("/conversations/{user_id}", response_model=List[schemas.ConversationOut])
-def get_conversations(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def get_conversations(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    return await run_db(db, _load_inbox, user_id, limit, offset)
+
+
+def _load_inbox(db: Session, user_id: int, limit: int, offset: int):
+    user = db.query(models.User.id).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # 获取所有和该用户有过消息往来的对话人
-    messages = db.query(models.Message).filter(
-        (models.Message.sender_id == user_id) | (models.Message.receiver_id == user_id)
-    ).order_by(models.Message.timestamp.desc()).all()
-
-    seen_ids = set()
-    conversations = []
-    for msg in messages:
-        other_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
-        if other_id in seen_ids:
-            continue
-        seen_ids.add(other_id)
-        other_user = db.query(models.User).filter(models.User.id == other_id).first()
-        profile = db.query(models.Profile).filter(models.Profile.user_id == other_id).first()
-        conversations.append({
-            "id": other_id,
-            "name": f"{profile.first_name} {profile.last_name}" if profile else other_user.email,
-            "last_message": msg.text,
-            "timestamp": msg.timestamp.isoformat(),
-            "unread": 0  # 可选：你也可以计算 unread 数
-        })
-
-    return conversations
+    # ✅ 直接读会话摘要表，一次 join 拿到对方姓名和未读数
+    rows = inbox_query(db, user_id).offset(offset).limit(limit).all()
+    return [
+        {
+            "id": row.other_id,
+            "name": f"{row.first_name} {row.last_name}" if row.first_name is not None else row.email,
+            "last_message": row.last_message_text,
+            "timestamp": row.last_message_at,
+            "unread": row.unread,
+        }
+        for row in rows
+    ]
+
+
+@router.post("/conversations/{user_id}/read/{other_id}")
+async def mark_conversation_read(user_id: int, other_id: int, db: AsyncSession = Depends(get_db)):
+    def update(db: Session):
+        conv = mark_read(db, user_id, other_id)
+        if conv is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        db.commit()
+    await run_db(db, update)
+    return {"detail": "Conversation marked as read"}
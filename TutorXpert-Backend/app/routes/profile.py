@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models, schemas
-from app.database import get_db
-import requests
+from app.database import get_db, run_db
+from app.core.spatial_index import sync_tutor_location
+from app.core.subjects import sync_profile_subjects
+from app.core.geocoding import cached_coordinates, geocode_worker, normalize_address
+from app.core.http_cache import PRIVATE_CACHE_CONTROL, conditional_get, make_etag
 
 from fastapi.encoders import jsonable_encoder
 
@@ -10,44 +14,56 @@ from fastapi.encoders import jsonable_encoder
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
 
-def get_lat_lng_from_address(address: str):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json"}
-    headers = {"User-Agent": "TutorPlatform/1.0"}  # 必须加 UA，否则被拒绝
-    try:
-        res = requests.get(url, params=params, headers=headers)
-        data = res.json()
-        if data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
-    except Exception as e:
-        print("地址解析失败:", e)
-    return None, None
+@router.get("/{user_id}", response_model=schemas.ProfileOut)
+async def get_profile(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    def version(db: Session):
+        row = db.query(models.Profile.id, models.Profile.version, models.Profile.updated_at).filter(
+            models.Profile.user_id == user_id
+        ).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return make_etag("profile", row.id, row.version), row.updated_at
 
+    def load(db: Session):
+        profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
+        return schemas.ProfileOut.model_validate(profile)
 
-@router.get("/{user_id}", response_model=schemas.ProfileOut)
-def get_profile(user_id: int, db: Session = Depends(get_db)):
-    profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    return schemas.ProfileOut.model_validate(profile)
+    return await conditional_get(request, response, db, version, load, PRIVATE_CACHE_CONTROL)
 
 
 @router.put("/{user_id}", response_model=schemas.ProfileOut)
-def update_profile(user_id: int, updated: schemas.ProfileUpdate, db: Session = Depends(get_db)):
+async def update_profile(user_id: int, updated: schemas.ProfileUpdate, db: AsyncSession = Depends(get_db)):
+    profile_id, profile_out, pending_address = await run_db(db, _update_profile, user_id, updated)
+    if pending_address:
+        geocode_worker.enqueue(profile_id, pending_address)
+    return profile_out
+
+
+def _update_profile(db: Session, user_id: int, updated: schemas.ProfileUpdate):
     profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    for field, value in updated.dict(exclude_unset=True).items():
+    old_address = profile.address
+    changes = updated.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(profile, field, value)
 
-    # ✅ 如果地址有更新，则获取经纬度并写入数据库
-    if updated.address:
-        lat, lng = get_lat_lng_from_address(updated.address)
-        if lat and lng:
-            profile.lat = lat
-            profile.lng = lng
+    if "subjects" in changes:
+        sync_profile_subjects(db, profile)
+
+    # ✅ 地址有变化时先查地理编码缓存，未命中则提交后交给后台 worker 解析，不阻塞请求
+    pending_address = None
+    if updated.address and normalize_address(updated.address) != normalize_address(old_address):
+        hit, coords = cached_coordinates(db, updated.address)
+        if coords:
+            profile.lat, profile.lng = coords
+        elif not hit:
+            pending_address = updated.address
 
     db.commit()
     db.refresh(profile)
-    return profile
+
+    # ✅ 坐标可能变化，同步更新 tutor 空间索引
+    sync_tutor_location(profile, profile.user.role)
+    return profile.id, schemas.ProfileOut.model_validate(profile), pending_address
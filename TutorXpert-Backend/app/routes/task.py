@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, run_db
 from pydantic import BaseModel
 from app.dependencies import get_current_user
+from app.core.principal_cache import Principal
 from datetime import datetime
 from fastapi import Depends, HTTPException, APIRouter, status
 from sqlalchemy.orm import joinedload
+from app.core.clustering import cluster_points, zoom_for_bounds
+from app.core.subjects import sync_task_subjects, task_subject_clause
+from app.core.fulltext import task_text_search
+from app.core.serialization import TASK_PROJECTION, json_response
+from app.core.http_cache import conditional_get, make_etag
+from app.core.suggestions import suggest_tutors
+from app.core.spatial_index import parse_near_query, sync_task_location, take_nearest, task_index
 
 
 class TaskStatusUpdate(BaseModel):
@@ -17,46 +27,136 @@ class TaskStatusUpdate(BaseModel):
 router = APIRouter(tags=["tasks"])
 print("✅ task.py loaded")
 
-# ✅ 地图边界筛选任务列表
-@router.get("/tasks/search", response_model=List[schemas.TaskOut])
-def search_tasks_by_bounds(
-    north: float = Query(...),
-    south: float = Query(...),
-    east: float = Query(...),
-    west: float = Query(...),
+# ✅ 地图边界筛选任务列表；或者传 lat / lng（+ radius_km / k）按距离从近到远返回附近的任务
+@router.get(
+    "/tasks/search",
+    response_model=Union[List[schemas.TaskOut], List[schemas.NearbyTaskOut], List[schemas.MapClusterOut]],
+)
+async def search_tasks_by_bounds(
+    north: Optional[float] = None,
+    south: Optional[float] = None,
+    east: Optional[float] = None,
+    west: Optional[float] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="附近搜索的中心点纬度"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="附近搜索的中心点经度"),
+    radius_km: Optional[float] = Query(None, gt=0, description="只返回该半径（公里）内的任务"),
+    k: Optional[int] = Query(None, ge=1, le=500, description="最多返回最近的 k 个"),
     subject: Optional[str] = None,
-    db: Session = Depends(get_db)
+    q: Optional[str] = None,
+    cluster: bool = False,
+    zoom: Optional[int] = Query(None, ge=0, le=20),
+    fields: Optional[str] = Query(None, description="逗号分隔的 TaskOut 字段（如 id,lat,lng,title），只返回这些字段"),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(models.Task).filter(
+    keys = TASK_PROJECTION.resolve(fields)
+    near = parse_near_query((north, south, east, west), lat, lng, radius_km, k, cluster)
+    if near:
+        return await run_db(db, _nearest_tasks, *near, subject, q, keys)
+    return await run_db(db, _search_tasks, north, south, east, west, subject, q, cluster, zoom, keys)
+
+
+def _search_tasks(db: Session, north, south, east, west, subject, q, cluster, zoom, keys=TASK_PROJECTION.keys):
+    bounds = (
         models.Task.lat <= north,
         models.Task.lat >= south,
         models.Task.lng <= east,
         models.Task.lng >= west,
     )
 
+    # ✅ 关键词搜索：join 全文索引子查询，按相关度排序
+    fts = task_text_search(q) if q else None
+
+    # ✅ 聚合模式：只查 id + 坐标三列，在服务端按瓦片格子聚合
+    if cluster:
+        query = db.query(models.Task.id, models.Task.lat, models.Task.lng).filter(*bounds)
+        if subject:
+            query = query.filter(task_subject_clause(subject))
+        if fts is not None:
+            query = query.join(fts, fts.c.id == models.Task.id)
+        return cluster_points(query.all(), zoom if zoom is not None else zoom_for_bounds(east, west))
+
+    # ✅ 只查请求字段需要的列，跳过 ORM 对象和逐行校验，直接编码成 JSON
+    columns, serialize = TASK_PROJECTION.compile(keys)
+    query = db.query(*columns).filter(*bounds)
+
     if subject:
-        query = query.filter(models.Task.subject.ilike(f"%{subject}%"))
+        query = query.filter(task_subject_clause(subject))
+
+    if fts is not None:
+        query = query.join(fts, fts.c.id == models.Task.id).order_by(fts.c.rank.desc())
+
+    return json_response([serialize(row) for row in query])
+
+
+def _nearest_tasks(db: Session, lat, lng, radius_km, limit, subject, q, keys=TASK_PROJECTION.keys):
+    # ✅ 空间索引按距离从近到远给出候选，数据库只按 id 取详情 / 做科目和关键词过滤
+    fts = task_text_search(q) if q else None
+    columns, serialize = TASK_PROJECTION.compile(keys)
 
-    return query.all()
+    def load(ids):
+        query = db.query(*columns).filter(models.Task.id.in_(ids))
+        if subject:
+            query = query.filter(task_subject_clause(subject))
+        if fts is not None:
+            query = query.join(fts, fts.c.id == models.Task.id)
+        return {row[0]: row for row in query}
+
+    batch_size = None if subject or fts is not None else limit
+    nearest = take_nearest(task_index.nearest(lat, lng, radius_km), load, limit, batch_size)
+    return json_response([
+        {**serialize(row), "distance_km": round(distance, 3)} for row, distance in nearest
+    ])
 
 
 
 # ✅ 加这个
 @router.get("/tasks/my_tasks", response_model=List[schemas.TaskOut])
-def get_my_tasks(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(models.Task).filter(models.Task.user_id == current_user.id).all()
+async def get_my_tasks(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        tasks = db.query(models.Task).filter(models.Task.user_id == current_user.id).all()
+        return [schemas.TaskOut.model_validate(task) for task in tasks]
+    return await run_db(db, load)
 
 
 # ✅ 根据 task_id 返回任务详情
 @router.get("/tasks/{task_id}", response_model=schemas.TaskOut)
-def get_task_by_id(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return task
+async def get_task_by_id(task_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    def version(db: Session):
+        row = db.query(models.Task.version, models.Task.updated_at).filter(models.Task.id == task_id).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return make_etag("task", task_id, row.version), row.updated_at
+
+    def load(db: Session):
+        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        return schemas.TaskOut.model_validate(task)
+
+    return await conditional_get(request, response, db, version, load)
+
+
+# ✅ 给任务推荐 tutor：距离 / 科目匹配 / 时薪 vs 预算 / 评分 综合打分，返回 top-k
+@router.get("/tasks/{task_id}/suggested_tutors", response_model=List[schemas.SuggestedTutorOut])
+async def get_suggested_tutors(
+    task_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    max_km: Optional[float] = Query(None, gt=0, description="只推荐该半径（公里）内的 tutor，默认 SUGGEST_MAX_DISTANCE_KM"),
+    db: AsyncSession = Depends(get_db),
+):
+    def load(db: Session):
+        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return suggest_tutors(db, task, limit, max_km)
+
+    return json_response(await run_db(db, load))
+
 
 @router.post("/tasks", response_model=schemas.TaskOut, status_code=status.HTTP_201_CREATED)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def create_task(task: schemas.TaskCreate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return await run_db(db, _create_task, task, current_user)
+
+
+def _create_task(db: Session, task: schemas.TaskCreate, current_user: Principal):
     new_task = models.Task(
         title=task.title,
         subject=task.subject,
@@ -68,16 +168,22 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current
         deadline=task.deadline,
         status="Open",
         user_id=current_user.id,
-        posted_by=f"{current_user.profile.first_name} {current_user.profile.last_name}",
+        posted_by=current_user.display_name,
         posted_date=datetime.utcnow()
     )
     db.add(new_task)
+    sync_task_subjects(db, new_task)
     db.commit()
     db.refresh(new_task)
-    return new_task
+    sync_task_location(new_task)
+    return schemas.TaskOut.model_validate(new_task)
 
 @router.post("/task_applications", response_model=schemas.TaskApplicationOut)
-def create_task_application(application: schemas.TaskApplicationCreate, db: Session = Depends(get_db)):
+async def create_task_application(application: schemas.TaskApplicationCreate, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _create_task_application, application)
+
+
+def _create_task_application(db: Session, application: schemas.TaskApplicationCreate):
     # 检查是否重复申请
     existing = db.query(models.TaskApplication).filter_by(
         task_id=application.task_id,
@@ -93,36 +199,49 @@ def create_task_application(application: schemas.TaskApplicationCreate, db: Sess
         message=application.message,
         bid_amount=application.bid_amount  # 保存竞价
     )
-    db.add(new_app)
+    try:
+        with db.begin_nested():
+            db.add(new_app)
+    except IntegrityError:
+        # 并发的重复提交绕过了上面的检查，由 (task_id, tutor_id) 唯一约束兜底
+        raise HTTPException(status_code=400, detail="You have already applied for this task.")
     db.commit()
     db.refresh(new_app)
-    return new_app
+    return schemas.TaskApplicationOut.model_validate(new_app, from_attributes=True)
 
 
 @router.get("/my_applications", response_model=List[schemas.TaskApplicationSimple])
-def get_my_applications(tutor_id: int, db: Session = Depends(get_db)):
-    applications = db.query(models.TaskApplication).filter_by(tutor_id=tutor_id).all()
-    return applications
+async def get_my_applications(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        applications = db.query(models.TaskApplication).filter_by(tutor_id=tutor_id).all()
+        return [schemas.TaskApplicationSimple.model_validate(a, from_attributes=True) for a in applications]
+    return await run_db(db, load)
 
 
 # 学生查看某个任务收到的所有申请（含 tutor 信息）
 
 @router.get("/tasks/{task_id}/applications", response_model=List[schemas.TaskApplicationWithTutorOut])
-def get_applications_for_task(task_id: int, db: Session = Depends(get_db)):
-    apps = (
-        db.query(models.TaskApplication)
-        .filter(models.TaskApplication.task_id == task_id)
-        .options(
-            joinedload(models.TaskApplication.tutor).joinedload(models.User.profile)  # 加载嵌套 profile
+async def get_applications_for_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    def load(db: Session):
+        apps = (
+            db.query(models.TaskApplication)
+            .filter(models.TaskApplication.task_id == task_id)
+            .options(
+                joinedload(models.TaskApplication.tutor).joinedload(models.User.profile)  # 加载嵌套 profile
+            )
+            .all()
         )
-        .all()
-    )
-    return apps
+        return [schemas.TaskApplicationWithTutorOut.model_validate(a) for a in apps]
+    return await run_db(db, load)
 
 
 # 学生对申请做出决策（accept / reject）
 @router.post("/tasks/applications/{application_id}/decision")
-def decide_application(application_id: int, decision: dict, db: Session = Depends(get_db)):
+async def decide_application(application_id: int, decision: dict, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _decide_application, application_id, decision)
+
+
+def _decide_application(db: Session, application_id: int, decision: dict):
     app = db.query(models.TaskApplication).filter_by(id=application_id).first()
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
@@ -150,7 +269,11 @@ def decide_application(application_id: int, decision: dict, db: Session = Depend
 
 
 @router.get("/tutor/applied_tasks", response_model=List[schemas.TaskWithApplicationStatus])
-def get_applied_tasks(tutor_id: int, db: Session = Depends(get_db)):
+async def get_applied_tasks(tutor_id: int, db: AsyncSession = Depends(get_db)):
+    return await run_db(db, _get_applied_tasks, tutor_id)
+
+
+def _get_applied_tasks(db: Session, tutor_id: int):
     results = (
         db.query(models.Task, models.TaskApplication.status)
         .join(models.TaskApplication, models.Task.id == models.TaskApplication.task_id)
@@ -172,7 +295,11 @@ def get_applied_tasks(tutor_id: int, db: Session = Depends(get_db)):
 
 
 @router.patch("/tasks/{task_id}/status")
-def update_task_status(task_id: int, data: TaskStatusUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def update_task_status(task_id: int, data: TaskStatusUpdate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return await run_db(db, _update_task_status, task_id, data, current_user)
+
+
+def _update_task_status(db: Session, task_id: int, data: TaskStatusUpdate, current_user: Principal):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -209,7 +336,11 @@ def update_task_status(task_id: int, data: TaskStatusUpdate, db: Session = Depen
 
 
 @router.delete("/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return await run_db(db, _delete_task, task_id, current_user)
+
+
+def _delete_task(db: Session, task_id: int, current_user: Principal):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -219,15 +350,20 @@ def delete_task(task_id: int, db: Session = Depends(get_db), current_user: model
 
     db.delete(task)
     db.commit()
+    task_index.remove(task_id)
     return {"detail": "Task deleted successfully"}
 
 
 @router.post("/tasks/applications/{application_id}/decision")
-def decide_application(
+async def decide_application(
     application_id: int,
     decision: schemas.ApplicationDecision,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    return await run_db(db, _decide_application_v2, application_id, decision)
+
+
+def _decide_application_v2(db: Session, application_id: int, decision: schemas.ApplicationDecision):
     app = db.query(models.TaskApplication).filter_by(id=application_id).first()
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
@@ -1,51 +1,143 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, run_db
 from fastapi import HTTPException
 from passlib.context import CryptContext
+from app.core.spatial_index import parse_near_query, take_nearest, tutor_index
+from app.core.clustering import cluster_points, zoom_for_bounds
+from app.core.subjects import profile_subject_clause
+from app.core.fulltext import profile_text_search
+from app.core.serialization import TUTOR_PROJECTION, json_response, serialize_tutor_rows
+from app.core.http_cache import conditional_get, make_etag
 
 router = APIRouter(prefix="/tutors", tags=["tutors"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# IN (...) 参数个数上限，避免超过 SQLite 的变量数限制
+ID_CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 # 前端访问 /tutors/search，从地图中筛选当前区域内的 tutor 列表。
-# 根据地图边界 + 可选科目，返回 tutor 数据
+# 根据地图边界 + 可选科目，返回 tutor 数据；
+# 或者传 lat / lng（+ radius_km / k）按距离从近到远返回附近的 tutor（带 distanceKm）
 
 
-@router.get("/search", response_model=List[schemas.TutorOut], response_model_by_alias=True)
-def search_tutors_by_map(
-    north: float = Query(...),
-    south: float = Query(...),
-    east: float = Query(...),
-    west: float = Query(...),
+@router.get(
+    "/search",
+    response_model=Union[List[schemas.TutorOut], List[schemas.NearbyTutorOut], List[schemas.MapClusterOut]],
+    response_model_by_alias=True,
+)
+async def search_tutors_by_map(
+    north: Optional[float] = None,
+    south: Optional[float] = None,
+    east: Optional[float] = None,
+    west: Optional[float] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="附近搜索的中心点纬度"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="附近搜索的中心点经度"),
+    radius_km: Optional[float] = Query(None, gt=0, description="只返回该半径（公里）内的 tutor"),
+    k: Optional[int] = Query(None, ge=1, le=500, description="最多返回最近的 k 个"),
     subject: Optional[str] = None,
-    db: Session = Depends(get_db)
+    q: Optional[str] = None,
+    cluster: bool = False,
+    zoom: Optional[int] = Query(None, ge=0, le=20),
+    fields: Optional[str] = Query(None, description="逗号分隔的 TutorOut 字段（如 id,lat,lng,name），只返回这些字段"),
+    db: AsyncSession = Depends(get_db)
 ):
-    print(f"Received bounds: north={north}, south={south}, east={east}, west={west}")
+    keys = TUTOR_PROJECTION.resolve(fields)
+    near = parse_near_query((north, south, east, west), lat, lng, radius_km, k, cluster)
     try:
-        query = db.query(models.Profile).join(models.User).filter(
-            models.User.role == "tutor",
-            models.Profile.lat <= north,
-            models.Profile.lat >= south,
-            models.Profile.lng <= east,
-            models.Profile.lng >= west
-        )
+        if near:
+            return await run_db(db, _nearest_tutors, *near, subject, q, keys)
+        return await run_db(db, _search_tutors, north, south, east, west, subject, q, cluster, zoom, keys)
+    except Exception as e:
+        print("🔥 Tutor search failed:", repr(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-        if subject:
-            query = query.filter(models.Profile.subjects.ilike(f"%{subject}%"))
 
-        results = query.all()
-        print("Fetched tutors:", results)
+def _search_tutors(db: Session, north, south, east, west, subject, q, cluster, zoom, keys=TUTOR_PROJECTION.keys):
+    # ✅ 先在内存空间索引里按 bounds 找 id，数据库只取命中的详情
+    hits = tutor_index.query_bbox(north=north, south=south, east=east, west=west)
+    ids = sorted(profile_id for profile_id, _, _ in hits)
 
-        return [schemas.TutorOut.model_validate(row) for row in results]
+    # ✅ 关键词搜索：join 全文索引子查询，按相关度排序
+    fts = profile_text_search(q) if q else None
 
-    except Exception as e:
-        print("🔥 Tutor search failed:", repr(e))
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+    def filtered(*columns):
+        for chunk in _chunks(ids, ID_CHUNK_SIZE):
+            query = db.query(*columns).filter(models.Profile.id.in_(chunk))
+            if subject:
+                query = query.filter(profile_subject_clause(subject))
+            if fts is not None:
+                query = query.join(fts, fts.c.id == models.Profile.id)
+            yield from query
+
+    # ✅ 聚合模式：只返回格子统计，不构造 TutorOut
+    if cluster:
+        if subject or fts is not None:
+            matched = {row.id for row in filtered(models.Profile.id)}
+            hits = [hit for hit in hits if hit[0] in matched]
+        return cluster_points(hits, zoom if zoom is not None else zoom_for_bounds(east, west))
+
+    # ✅ 只查请求字段需要的列，跳过 ORM 对象和逐行校验，直接编码成 JSON
+    columns, _ = TUTOR_PROJECTION.compile(keys)
+    if fts is not None:
+        ranked = sorted(filtered(*columns, fts.c.rank), key=lambda row: -row.rank)
+        rows = [row[:-1] for row in ranked]
+    else:
+        rows = list(filtered(*columns))
+
+    return json_response(serialize_tutor_rows(db, rows, keys))
+
+
+def _nearest_tutors(db: Session, lat, lng, radius_km, limit, subject, q, keys=TUTOR_PROJECTION.keys):
+    # ✅ 空间索引按距离从近到远给出候选，数据库只按 id 取详情 / 做科目和关键词过滤
+    fts = profile_text_search(q) if q else None
+    columns, _ = TUTOR_PROJECTION.compile(keys)
+
+    def load(ids):
+        query = db.query(*columns).filter(models.Profile.id.in_(ids))
+        if subject:
+            query = query.filter(profile_subject_clause(subject))
+        if fts is not None:
+            query = query.join(fts, fts.c.id == models.Profile.id)
+        return {row[0]: row for row in query}
+
+    batch_size = None if subject or fts is not None else limit
+    nearest = take_nearest(tutor_index.nearest(lat, lng, radius_km), load, limit, batch_size)
+    tutors = serialize_tutor_rows(db, [row for row, _ in nearest], keys)
+    for tutor, (_, distance) in zip(tutors, nearest):
+        tutor["distanceKm"] = round(distance, 3)
+    return json_response(tutors)
 
 @router.get("/{tutor_id}", response_model=schemas.TutorOut, response_model_by_alias=True)
-def get_tutor_by_id(tutor_id: int, db: Session = Depends(get_db)):
+async def get_tutor_by_id(tutor_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    # ✅ 带 If-None-Match 且版本没变时直接 304
+    return await conditional_get(
+        request, response, db,
+        lambda db: _tutor_version(db, tutor_id),
+        lambda db: _get_tutor_by_id(db, tutor_id),
+    )
+
+
+def _tutor_version(db: Session, tutor_id: int):
+    row = db.query(models.Profile.version, models.Profile.updated_at).join(models.User).filter(
+        models.User.role == "tutor",
+        models.Profile.id == tutor_id
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Tutor not found")
+    return make_etag("tutor", tutor_id, row.version), row.updated_at
+
+
+def _get_tutor_by_id(db: Session, tutor_id: int):
     # 查询 Profile 和关联 User（确保是 tutor 身份）
     tutor = db.query(models.Profile).join(models.User).filter(
         models.Profile.user_id == models.User.id,
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from datetime import datetime
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
+from datetime import date, datetime, time
 from typing import Optional, List, Literal
 
 
@@ -60,17 +60,12 @@ class ProfileOut(BaseModel):
     hourly_rate: Optional[int] = None
     lat: Optional[float] = None
     lng: Optional[float] = None
-    subjects: List[str] = []   # ✅ 转换为 list
+    # ✅ 直接读取规范化后的科目列表（Profile.subject_names）
+    subjects: List[str] = Field([], validation_alias=AliasChoices("subject_names", "subjects"))
 
     class Config:
         from_attributes = True
 
-    @validator("subjects", pre=True)
-    def parse_subjects(cls, v):
-        if isinstance(v, str):
-            return [s.strip() for s in v.split(",")]
-        return v or []
-
 
 class UserWithProfileOut(BaseModel):
     id: int
@@ -126,6 +121,10 @@ class TaskOut(BaseModel):
         populate_by_name = True
 
 
+class NearbyTaskOut(TaskOut):
+    distance_km: float
+
+
 
 class TutorOut(BaseModel):
     id: int
@@ -136,7 +135,7 @@ class TutorOut(BaseModel):
     experience: Optional[str] = None
     hourly_rate: Optional[float] = Field(None, alias="hourlyRate")
     rating: Optional[float] = None
-    subjects: Optional[List[str]] = None
+    subjects: Optional[List[str]] = Field(None, validation_alias=AliasChoices("subject_names", "subjects"))
     address: Optional[str] = None
     lat: Optional[float] = None
     lng: Optional[float] = None
@@ -146,12 +145,6 @@ class TutorOut(BaseModel):
         from_attributes = True
         populate_by_name = True
 
-    @validator("subjects", pre=True)
-    def split_subjects(cls, v):
-        if isinstance(v, str):
-            return [s.strip() for s in v.split(",")]
-        return v
-
     @classmethod
     def model_validate(cls, obj):
         base = super().model_validate(obj)
@@ -160,6 +153,28 @@ class TutorOut(BaseModel):
 
 
 
+# 附近搜索（lat / lng + radius_km / k）：按距离升序，附带距离
+class NearbyTutorOut(TutorOut):
+    distance_km: float = Field(..., alias="distanceKm")
+
+
+# /tasks/{task_id}/suggested_tutors：TutorOut 加上推荐得分
+class SuggestedTutorOut(TutorOut):
+    score: float
+    distance_km: Optional[float] = Field(None, alias="distanceKm")
+    subject_match: float = Field(0.0, alias="subjectMatch")
+
+
+# 地图缩小时的聚合结果（cluster=true）
+class MapClusterOut(BaseModel):
+    cell: str
+    count: int
+    lat: float
+    lng: float
+    ids: List[int] = []
+
+
+
 class TaskCreate(BaseModel):
     title: str
     subject: Optional[str] = None
@@ -255,10 +270,89 @@ class AvailableSlotOut(BaseModel):
         from_attributes = True
 
 
+# 批量导入 slot 的逐条结果
+class SlotIngestResult(BaseModel):
+    index: int
+    status: Literal["created", "conflict", "invalid"]
+    slot: Optional[AvailableSlotOut] = None
+    conflict_with: Optional[int] = None          # 冲突的已有 slot id
+    conflict_with_index: Optional[int] = None    # 冲突的本批次内序号
+    detail: Optional[str] = None
+
+
+class BulkSlotResult(BaseModel):
+    created: int
+    conflicts: int
+    invalid: int
+    results: List[SlotIngestResult]
+
+
+# 周期可用时间规则
+class AvailabilityRuleCreate(BaseModel):
+    tutor_id: int
+    weekday: int = Field(..., ge=0, le=6)  # 0 = 周一
+    start_time: time
+    end_time: time
+    subject: str
+    slot_minutes: int = Field(15, gt=0, le=24 * 60)
+    valid_from: date
+    valid_until: Optional[date] = None
+
+
+class AvailabilityRuleOut(AvailabilityRuleCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class AvailabilityExceptionCreate(BaseModel):
+    tutor_id: int
+    rule_id: Optional[int] = None   # 为空表示对该 tutor 所有规则生效
+    date: date
+    start_time: Optional[time] = None   # 为空表示全天
+    end_time: Optional[time] = None
+
+
+class AvailabilityExceptionOut(AvailabilityExceptionCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+# 日历里的 slot：由规则展开、尚未落库的 slot 没有 id，用 rule_id + start_time 预约
+class CalendarSlotOut(BaseModel):
+    id: Optional[int] = None
+    rule_id: Optional[int] = None
+    tutor_id: int
+    start_time: datetime
+    end_time: datetime
+    subject: str
+    is_booked: bool
+
+
+# 日历视图：按时间窗口返回 slot，可按天分组
+class CalendarDayOut(BaseModel):
+    date: date
+    slots: List[CalendarSlotOut]
+
+
+class AvailabilityCalendarOut(BaseModel):
+    tutor_id: int
+    start: datetime
+    end: datetime
+    slots: List[CalendarSlotOut] = []
+    days: Optional[List[CalendarDayOut]] = None
+
+
 class AppointmentCreate(BaseModel):
     student_id: int
     tutor_id: int
-    slot_id: int
+    slot_id: Optional[int] = None
+    # 预约周期规则里尚未落库的 slot 时，传 rule_id + start_time 代替 slot_id
+    rule_id: Optional[int] = None
+    start_time: Optional[datetime] = None
     message: Optional[str] = None
 
 class AppointmentOut(BaseModel):
@@ -287,18 +381,12 @@ class ProfileMini(BaseModel):
     first_name: Optional[str]
     last_name: Optional[str]
     hourly_rate: Optional[int]
-    subjects: Optional[List[str]]
+    subjects: Optional[List[str]] = Field(validation_alias=AliasChoices("subject_names", "subjects"))
     address: Optional[str]
 
     class Config:
         from_attributes = True
 
-    @validator("subjects", pre=True)
-    def split_subjects(cls, v):
-        if isinstance(v, str):
-            return [s.strip() for s in v.split(",")]
-        return v or []
-
 class TutorBasicInfo(BaseModel):
     id: int
     profile: Optional[ProfileMini]
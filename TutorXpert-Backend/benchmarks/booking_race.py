@@ -0,0 +1,156 @@
+# benchmarks/booking_race.py
+# 并发抢同一批 slot 的预约压测：统计吞吐量、成功 / 冲突数，以及最终有没有重复预约。
+# 会 create_all、写入测试数据，naive 模式还会删掉部分唯一索引，所以只在一次性的库上跑：
+# 默认是临时目录里的 SQLite 文件，不读 DATABASE_URL。
+#
+#   python benchmarks/booking_race.py --clients 32 --slots 20 --attempts 400
+#   python benchmarks/booking_race.py --mode naive     # 旧的先查后插写法，对照用
+#   python benchmarks/booking_race.py --database-url postgresql://.../scratch --i-know-this-is-scratch
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from dotenv import dotenv_values
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+parser = argparse.ArgumentParser(description="Concurrent slot booking benchmark")
+parser.add_argument("--database-url", help="一次性的压测库，必须同时加 --i-know-this-is-scratch；默认临时 SQLite 文件")
+parser.add_argument("--i-know-this-is-scratch", action="store_true", dest="scratch",
+                    help="确认 --database-url 是可以随意建表 / 删索引的压测库")
+parser.add_argument("--clients", type=int, default=32, help="并发客户端（线程）数")
+parser.add_argument("--slots", type=int, default=20, help="被争抢的 slot 数")
+parser.add_argument("--attempts", type=int, default=400, help="总预约请求数")
+parser.add_argument("--mode", choices=["atomic", "naive"], default="atomic")
+args = parser.parse_args()
+
+if args.database_url:
+    if not args.scratch:
+        parser.error("--database-url requires --i-know-this-is-scratch (the run creates tables and may drop indexes)")
+    # 应用自己配置的库（环境变量或 .env）无论如何都不碰
+    configured = {
+        os.getenv("DATABASE_URL"),
+        dotenv_values(os.path.join(BACKEND_DIR, ".env")).get("DATABASE_URL"),
+    } - {None, ""}
+    if args.database_url in configured:
+        parser.error("--database-url is the app's configured DATABASE_URL; use a separate scratch database")
+    database_url = args.database_url
+else:
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='booking-race-'), 'booking_race.db')}"
+
+# app.database 导入时读取 DATABASE_URL（load_dotenv 不覆盖已设置的值）
+os.environ["DATABASE_URL"] = database_url
+
+from sqlalchemy import func  # noqa: E402
+
+from app import models  # noqa: E402
+from app.core.booking import SlotUnavailable, book_slot  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    if args.mode == "naive":
+        # 旧 schema 没有这个部分唯一索引；留着它 naive 写法也不会出现重复预约，对照就没有意义
+        for index in models.Appointment.__table__.indexes:
+            if index.name == "uq_appointments_active_slot":
+                index.drop(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        tutor = models.User(email=f"bench-tutor-{time.time_ns()}@example.com", hashed_password="x", role="tutor")
+        student = models.User(email=f"bench-student-{time.time_ns()}@example.com", hashed_password="x", role="student")
+        db.add_all([tutor, student])
+        db.flush()
+        base = datetime(2030, 1, 1, 9, 0) + timedelta(days=random.randint(0, 10000))
+        slots = [
+            models.AvailableSlot(
+                tutor_id=tutor.id,
+                start_time=base + timedelta(minutes=15 * i),
+                end_time=base + timedelta(minutes=15 * (i + 1)),
+                subject="Math",
+                is_booked=False,
+            )
+            for i in range(args.slots)
+        ]
+        db.add_all(slots)
+        db.commit()
+        return tutor.id, student.id, [s.id for s in slots]
+    finally:
+        db.close()
+
+
+def naive_book(db, slot_id, student_id, tutor_id):
+    # 旧实现：先查有没有预约，再插入（check-then-act）
+    if db.query(models.Appointment).filter_by(slot_id=slot_id).first():
+        raise SlotUnavailable()
+    appointment = models.Appointment(student_id=student_id, tutor_id=tutor_id, slot_id=slot_id)
+    db.add(appointment)
+    return appointment
+
+
+def main():
+    tutor_id, student_id, slot_ids = seed()
+    counts = {"booked": 0, "conflict": 0, "error": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients)
+
+    def client(worker):
+        barrier.wait()
+        # 除不尽的部分分给前几个客户端，总请求数正好是 --attempts
+        per_client = args.attempts // args.clients + (1 if worker < args.attempts % args.clients else 0)
+        for _ in range(per_client):
+            slot_id = random.choice(slot_ids)
+            db = SessionLocal()
+            try:
+                if args.mode == "atomic":
+                    book_slot(db, slot_id, student_id, tutor_id)
+                else:
+                    naive_book(db, slot_id, student_id, tutor_id)
+                db.commit()
+                outcome = "booked"
+            except SlotUnavailable:
+                db.rollback()
+                outcome = "conflict"
+            except Exception:
+                # SQLite 写锁超时、唯一索引冲突等
+                db.rollback()
+                outcome = "error"
+            finally:
+                db.close()
+            with lock:
+                counts[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(client, range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        per_slot = (
+            db.query(models.Appointment.slot_id, func.count(models.Appointment.id))
+            .filter(models.Appointment.slot_id.in_(slot_ids), models.Appointment.status != "rejected")
+            .group_by(models.Appointment.slot_id)
+            .all()
+        )
+    finally:
+        db.close()
+    double_booked = sum(1 for _, n in per_slot if n > 1)
+
+    total = sum(counts.values())
+    print(f"mode={args.mode} db={engine.url.render_as_string()} clients={args.clients} slots={args.slots}")
+    print(f"requests={total} elapsed={elapsed:.3f}s throughput={total / elapsed:.1f} req/s")
+    print(f"booked={counts['booked']} conflict={counts['conflict']} error={counts['error']}")
+    print(f"slots booked={len(per_slot)}/{args.slots} double-booked slots={double_booked}")
+    return 1 if double_booked else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
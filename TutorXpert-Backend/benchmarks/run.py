@@ -0,0 +1,229 @@
+# benchmarks/run.py
+# 接口压测：通过 httpx.ASGITransport 直接驱动 FastAPI 应用（不经过网络），
+# 统计每个场景的 p50 / p95 / p99 延迟和吞吐量，结果存成 JSON 便于前后对比。
+#
+#   python benchmarks/seed.py --reset                       # 先生成数据
+#   python benchmarks/run.py --requests 500 --concurrency 16
+#   python benchmarks/run.py --scenarios tutors_search,history --compare benchmarks/results/<旧结果>.json
+#
+# 需要 httpx（pip install httpx）。
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+SCENARIOS = ["tutors_search", "tasks_search", "tutors_near", "tasks_near", "conversations", "history", "availability", "login"]
+
+parser = argparse.ArgumentParser(description="Benchmark hot API endpoints in-process")
+parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///./bench.db"))
+parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+parser.add_argument("--requests", type=int, default=500, help="每个场景的请求数")
+parser.add_argument("--login-requests", type=int, default=50, help="login 场景的请求数（bcrypt 很慢）")
+parser.add_argument("--concurrency", type=int, default=16)
+parser.add_argument("--warmup", type=int, default=20, help="每个场景正式计时前的预热请求数")
+parser.add_argument("--password", default="benchpass", help="seed.py 使用的密码")
+parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+parser.add_argument("--seed", type=int, default=7)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def load_fixtures(db):
+    """从库里取压测要用到的 id：城市中心、有会话的用户对、有 slot 的 tutor 等。"""
+    from sqlalchemy import func
+
+    from app import models
+    from benchmarks.seed import CITIES, SUBJECTS
+
+    def sample(query, n=2000):
+        return [tuple(row) for row in query.order_by(func.random()).limit(n)]
+
+    return {
+        "cities": [(lat, lng) for _, lat, lng, _ in CITIES],
+        "subjects": SUBJECTS,
+        "pairs": sample(db.query(models.Conversation.user_low_id, models.Conversation.user_high_id)),
+        "slot_tutors": [row[0] for row in sample(db.query(models.AvailableSlot.tutor_id).distinct())],
+        "emails": [row[0] for row in sample(db.query(models.User.email).filter(models.User.email.like("bench-%")))],
+        "counts": {
+            "users": db.query(func.count(models.User.id)).scalar(),
+            "tasks": db.query(func.count(models.Task.id)).scalar(),
+            "messages": db.query(func.count(models.Message.id)).scalar(),
+            "slots": db.query(func.count(models.AvailableSlot.id)).scalar(),
+        },
+    }
+
+
+def make_requests(name, fixtures, rng, password):
+    """返回一个生成 (method, url, kwargs) 的函数。"""
+
+    def viewport():
+        lat, lng = rng.choice(fixtures["cities"])
+        half = rng.uniform(0.02, 0.25)
+        lat, lng = rng.gauss(lat, 0.05), rng.gauss(lng, 0.05)
+        params = {"north": lat + half, "south": lat - half, "east": lng + half, "west": lng - half}
+        if rng.random() < 0.3:
+            params["subject"] = rng.choice(fixtures["subjects"])
+        return params
+
+    if name == "tutors_search":
+        return lambda: ("GET", "/tutors/search", {"params": viewport()})
+    if name == "tasks_search":
+        return lambda: ("GET", "/tasks/search", {"params": viewport()})
+    if name in ("tutors_near", "tasks_near"):
+        # 手机端首页：当前位置附近最近的 k 个 / 半径内按距离排序
+        def near():
+            lat, lng = rng.choice(fixtures["cities"])
+            params = {"lat": rng.gauss(lat, 0.05), "lng": rng.gauss(lng, 0.05)}
+            if rng.random() < 0.5:
+                params["k"] = 20
+            else:
+                params["radius_km"] = rng.choice([2, 5, 10])
+            if rng.random() < 0.3:
+                params["subject"] = rng.choice(fixtures["subjects"])
+            return "GET", f"/{name.split('_')[0]}/search", {"params": params}
+        return near
+    if name == "conversations":
+        return lambda: ("GET", f"/messages/conversations/{rng.choice(rng.choice(fixtures['pairs']))}", {})
+    if name == "history":
+        def history():
+            low, high = rng.choice(fixtures["pairs"])
+            return "GET", f"/messages/history/{low}/{high}", {"params": {"limit": 50}}
+        return history
+    if name == "availability":
+        return lambda: ("GET", f"/availability/tutor/{rng.choice(fixtures['slot_tutors'])}", {})
+    if name == "login":
+        return lambda: ("POST", "/login", {"data": {"username": rng.choice(fixtures["emails"]), "password": password}})
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+async def run_scenario(client, next_request, total, concurrency):
+    latencies, errors = [], 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = next_request()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def print_table(results, baseline=None):
+    header = f"{'scenario':<15}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header + ("   Δp50     Δp95" if baseline else ""))
+    for name, r in results.items():
+        line = f"{name:<15}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        old = (baseline or {}).get(name)
+        if old:
+            for key in ("p50_ms", "p95_ms"):
+                line += f" {(r[key] - old[key]) / old[key] * 100:+7.1f}%" if old[key] else "       -"
+        print(line)
+
+
+async def main(args):
+    import httpx
+
+    from app.database import SessionLocal, engine
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        fixtures = load_fixtures(db)
+    finally:
+        db.close()
+    if not fixtures["pairs"] or not fixtures["slot_tutors"]:
+        sys.exit("No benchmark data found, run benchmarks/seed.py first")
+
+    results = {}
+    # ✅ 手动进入 lifespan，空间索引 / 后台任务和线上启动方式一致
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios.split(","):
+                next_request = make_requests(name, fixtures, rng, args.password)
+                total = args.login_requests if name == "login" else args.requests
+                await run_scenario(client, next_request, min(args.warmup, total), args.concurrency)
+                results[name] = await run_scenario(client, next_request, total, args.concurrency)
+                print(f"  {name} done")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git_commit": git_commit(),
+            "database": engine.url.get_backend_name(),
+            "db_async": os.getenv("DB_ASYNC", "true"),
+            "python": sys.version.split()[0],
+            "rows": fixtures["counts"],
+        },
+        "scenarios": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+    print_table(results, baseline)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"bench-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved", path)
+
+
+if __name__ == "__main__":
+    parsed = parser.parse_args()
+    os.environ["DATABASE_URL"] = parsed.database_url
+    asyncio.run(main(parsed))
@@ -0,0 +1,223 @@
+# benchmarks/seed.py
+# 压测数据生成：按澳洲主要城市的人口比例撒点生成 tutor / 学生 / 任务 / 消息 / 可用时间。
+# 默认规模适合本地快速跑，大规模示例：
+#
+#   python benchmarks/seed.py --reset --tutors 50000 --students 100000 --tasks 200000 \
+#       --messages 2000000 --slots 500000
+#   DATABASE_URL=postgresql://... python benchmarks/seed.py --reset
+#
+# 所有账号的密码都是 --password（默认 benchpass），邮箱为 bench-tutor-<n>@example.com / bench-student-<n>@example.com。
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+CITIES = [
+    # (名称, 纬度, 经度, 权重)
+    ("Sydney", -33.8688, 151.2093, 0.33),
+    ("Melbourne", -37.8136, 144.9631, 0.31),
+    ("Brisbane", -27.4698, 153.0251, 0.14),
+    ("Perth", -31.9523, 115.8613, 0.1),
+    ("Adelaide", -34.9285, 138.6007, 0.07),
+    ("Canberra", -35.2809, 149.1300, 0.03),
+    ("Hobart", -42.8821, 147.3272, 0.02),
+]
+CITY_SPREAD_DEG = 0.15  # 约 15km 的正态分布，模拟市区到郊区
+
+SUBJECTS = [
+    "Math", "Physics", "Chemistry", "Biology", "English", "Literature", "History", "Geography",
+    "Economics", "Accounting", "Computer Science", "Programming", "Chinese", "Japanese", "French",
+    "Spanish", "Music", "Piano", "Art", "Legal Studies",
+]
+FIRST_NAMES = ["Olivia", "Jack", "Charlotte", "Noah", "Amelia", "William", "Isla", "Oliver", "Mia", "Leo",
+               "Wei", "Mei", "Aarav", "Priya", "Lucas", "Chloe", "Ethan", "Grace", "Henry", "Zoe"]
+LAST_NAMES = ["Smith", "Jones", "Williams", "Brown", "Wilson", "Taylor", "Nguyen", "Chen", "Wang", "Li",
+              "Martin", "Anderson", "Patel", "Singh", "Kelly", "Walker", "White", "Harris", "Lee", "King"]
+TASK_TEMPLATES = [
+    ("Need help with {s} homework", "Looking for a patient {s} tutor for weekly homework help and exam revision."),
+    ("{s} exam preparation", "Final exams are coming up, need intensive {s} practice with past papers."),
+    ("Year 12 {s} tutoring", "Seeking an experienced tutor for Year 12 {s}, focus on difficult topics."),
+    ("Beginner {s} lessons", "Complete beginner wants to learn {s} from scratch, flexible schedule."),
+]
+
+parser = argparse.ArgumentParser(description="Seed a database with synthetic benchmark data")
+parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///./bench.db"))
+parser.add_argument("--reset", action="store_true", help="先删除并重建所有表")
+parser.add_argument("--tutors", type=int, default=5000)
+parser.add_argument("--students", type=int, default=10000)
+parser.add_argument("--tasks", type=int, default=20000)
+parser.add_argument("--messages", type=int, default=200000)
+parser.add_argument("--messages-per-conversation", type=int, default=40)
+parser.add_argument("--slots", type=int, default=50000)
+parser.add_argument("--batch-size", type=int, default=5000)
+parser.add_argument("--password", default="benchpass")
+parser.add_argument("--seed", type=int, default=42)
+
+
+def random_point(rng):
+    _, lat, lng, _ = rng.choices(CITIES, weights=[c[3] for c in CITIES])[0]
+    return round(rng.gauss(lat, CITY_SPREAD_DEG), 6), round(rng.gauss(lng, CITY_SPREAD_DEG), 6)
+
+
+def main(args):
+    from sqlalchemy import insert
+
+    from app import models
+    from app.core.conversations import rebuild_conversations
+    from app.core.fulltext import ensure_fulltext_indexes
+    from app.core.security import pwd_context
+    from app.core.subjects import normalize_subject
+    from app.database import Base, SessionLocal, engine
+
+    rng = random.Random(args.seed)
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    ensure_fulltext_indexes(engine)
+
+    db = SessionLocal()
+    started = time.perf_counter()
+
+    def bulk(model, rows):
+        for i in range(0, len(rows), args.batch_size):
+            db.execute(insert(model.__table__), rows[i:i + args.batch_size])
+        db.commit()
+
+    def step(label, t0):
+        print(f"  {label:<14} {time.perf_counter() - t0:8.2f}s")
+        return time.perf_counter()
+
+    try:
+        if db.query(models.User.id).first() is not None:
+            sys.exit("Database is not empty, pass --reset to start from scratch")
+        t = time.perf_counter()
+
+        # ✅ 所有账号共用一个 bcrypt 哈希，生成速度不受哈希成本影响
+        hashed = pwd_context.hash(args.password)
+        users = [
+            {"email": f"bench-tutor-{i}@example.com", "hashed_password": hashed, "role": "tutor"}
+            for i in range(args.tutors)
+        ] + [
+            {"email": f"bench-student-{i}@example.com", "hashed_password": hashed, "role": "student"}
+            for i in range(args.students)
+        ]
+        bulk(models.User, users)
+        rows = db.query(models.User.id, models.User.role).order_by(models.User.id).all()
+        tutor_ids = [r.id for r in rows if r.role == "tutor"]
+        student_ids = [r.id for r in rows if r.role == "student"]
+        t = step("users", t)
+
+        bulk(models.Subject, [{"name": s, "slug": normalize_subject(s)} for s in SUBJECTS])
+        subject_ids = {r.name: r.id for r in db.query(models.Subject.id, models.Subject.name)}
+
+        profiles, tutor_subjects = [], {}
+        tutor_set = set(tutor_ids)
+        for user_id in tutor_ids + student_ids:
+            lat, lng = random_point(rng)
+            is_tutor = user_id in tutor_set
+            names = rng.sample(SUBJECTS, rng.randint(1, 3)) if is_tutor else []
+            if is_tutor:
+                tutor_subjects[user_id] = names
+            profiles.append({
+                "user_id": user_id,
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": rng.choice(LAST_NAMES),
+                "subjects": ", ".join(names) or None,
+                "bio": f"Experienced {' and '.join(names)} tutor, friendly and patient." if is_tutor else None,
+                "title": f"{names[0]} Tutor" if is_tutor else None,
+                "hourly_rate": rng.randint(30, 120) if is_tutor else None,
+                "rating": round(rng.uniform(3.0, 5.0), 1) if is_tutor else None,
+                "lat": lat,
+                "lng": lng,
+            })
+        bulk(models.Profile, profiles)
+        profile_ids = dict(db.query(models.Profile.user_id, models.Profile.id))
+        bulk(models.TutorSubject, [
+            {"profile_id": profile_ids[user_id], "subject_id": subject_ids[name], "position": pos}
+            for user_id, names in tutor_subjects.items()
+            for pos, name in enumerate(names)
+        ])
+        t = step("profiles", t)
+
+        tasks = []
+        base_date = datetime.utcnow() - timedelta(days=90)
+        for i in range(args.tasks):
+            subject = rng.choice(SUBJECTS)
+            title, description = rng.choice(TASK_TEMPLATES)
+            lat, lng = random_point(rng)
+            tasks.append({
+                "title": title.format(s=subject),
+                "subject": subject,
+                "description": description.format(s=subject),
+                "lat": lat,
+                "lng": lng,
+                "budget": f"${rng.randint(20, 100)}/h",
+                "status": "Open",
+                "posted_by": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "posted_date": base_date + timedelta(minutes=i),
+                "user_id": rng.choice(student_ids),
+            })
+        bulk(models.Task, tasks)
+        task_rows = db.query(models.Task.id, models.Task.subject).order_by(models.Task.id).all()
+        bulk(models.TaskSubject, [{"task_id": r.id, "subject_id": subject_ids[r.subject]} for r in task_rows])
+        t = step("tasks", t)
+
+        if args.messages and tutor_ids and student_ids:
+            messages, moment = [], base_date
+            conversations = max(1, args.messages // args.messages_per_conversation)
+            pairs = set()
+            while len(pairs) < min(conversations, len(tutor_ids) * len(student_ids)):
+                pairs.add((rng.choice(student_ids), rng.choice(tutor_ids)))
+            pairs = list(pairs)
+            for n in range(args.messages):
+                student, tutor = pairs[n % len(pairs)]
+                sender, receiver = (student, tutor) if rng.random() < 0.5 else (tutor, student)
+                moment += timedelta(seconds=rng.randint(1, 30))
+                messages.append({
+                    "sender_id": sender,
+                    "receiver_id": receiver,
+                    "text": f"Message {n}: are you free for a {rng.choice(SUBJECTS)} session?",
+                    "timestamp": moment,
+                })
+                if len(messages) >= args.batch_size * 10:
+                    bulk(models.Message, messages)
+                    messages = []
+            bulk(models.Message, messages)
+            t = step("messages", t)
+            rebuild_conversations(db)
+            t = step("conversations", t)
+
+        slots = []
+        per_tutor = args.slots // max(len(tutor_ids), 1)
+        first_day = datetime.utcnow().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for tutor_id in tutor_ids:
+            for n in range(per_tutor):
+                # 每天 9:00 起 32 个 15 分钟的 slot
+                start = first_day + timedelta(days=n // 32, minutes=15 * (n % 32))
+                slots.append({
+                    "tutor_id": tutor_id,
+                    "start_time": start,
+                    "end_time": start + timedelta(minutes=15),
+                    "subject": tutor_subjects[tutor_id][0],
+                    "is_booked": rng.random() < 0.1,
+                })
+            if len(slots) >= args.batch_size * 10:
+                bulk(models.AvailableSlot, slots)
+                slots = []
+        bulk(models.AvailableSlot, slots)
+        step("slots", t)
+    finally:
+        db.close()
+
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parsed = parser.parse_args()
+    os.environ["DATABASE_URL"] = parsed.database_url
+    main(parsed)
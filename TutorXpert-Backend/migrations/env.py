@@ -0,0 +1,49 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import engine, Base
+from app import models  # noqa: F401  注册所有模型，autogenerate 对比用
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # FTS5 虚表及其影子表由 app/core/fulltext.py 维护，autogenerate 不要去删
+    return not (type_ == "table" and reflected and compare_to is None and "_fts" in name)
+
+
+def run_migrations_offline():
+    # alembic upgrade head --sql：只输出 SQL 不连库
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # ✅ 直接复用应用的同步引擎（同一个 DATABASE_URL / 连接参数）
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite 不支持 ALTER 加约束，改用复制表的 batch 模式
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
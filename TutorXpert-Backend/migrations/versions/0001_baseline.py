@@ -0,0 +1,136 @@
+"""baseline schema
+
+原来由 Base.metadata.create_all 建出的表。已有数据库里这些表都在，这里只补建缺的，
+所以新库和老库都可以直接 alembic upgrade head。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("role", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not _has_table("profile"):
+        op.create_table(
+            "profile",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+            sa.Column("first_name", sa.String(100), nullable=False),
+            sa.Column("last_name", sa.String(100), nullable=False),
+            sa.Column("phone_number", sa.String(20)),
+            sa.Column("address", sa.Text()),
+            sa.Column("education_level", sa.String(50)),
+            sa.Column("major", sa.Text()),
+            sa.Column("certifications", sa.Text()),
+            sa.Column("working_with_children_check", sa.String(50)),
+            sa.Column("subjects", sa.Text()),
+            sa.Column("has_experience", sa.Boolean()),
+            sa.Column("experience_details", sa.Text()),
+            sa.Column("availability", sa.Text()),
+            sa.Column("accepts_short_notice", sa.Boolean()),
+            sa.Column("lat", sa.Float(), nullable=False),
+            sa.Column("lng", sa.Float(), nullable=False),
+            sa.Column("hourly_rate", sa.Integer()),
+            sa.Column("rating", sa.Float()),
+            sa.Column("title", sa.String(100)),
+            sa.Column("bio", sa.Text()),
+        )
+        op.create_index("ix_profile_id", "profile", ["id"])
+
+    if not _has_table("tasks"):
+        op.create_table(
+            "tasks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("subject", sa.String()),
+            sa.Column("description", sa.String()),
+            sa.Column("address", sa.String()),
+            sa.Column("lat", sa.Float()),
+            sa.Column("lng", sa.Float()),
+            sa.Column("budget", sa.String()),
+            sa.Column("deadline", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("posted_by", sa.String()),
+            sa.Column("posted_date", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("accepted_tutor_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_tasks_id", "tasks", ["id"])
+
+    if not _has_table("messages"):
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("text", sa.Text(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_messages_id", "messages", ["id"])
+
+    if not _has_table("task_applications"):
+        op.create_table(
+            "task_applications",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("task_id", sa.Integer(), sa.ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("applied_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("status", sa.String()),
+            sa.Column("message", sa.Text()),
+            sa.Column("bid_amount", sa.Float()),
+        )
+        op.create_index("ix_task_applications_id", "task_applications", ["id"])
+
+    if not _has_table("available_slots"):
+        op.create_table(
+            "available_slots",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("start_time", sa.DateTime(), nullable=False),
+            sa.Column("end_time", sa.DateTime(), nullable=False),
+            sa.Column("subject", sa.String(100), nullable=False),
+            sa.Column("is_booked", sa.Boolean()),
+        )
+        op.create_index("ix_available_slots_id", "available_slots", ["id"])
+
+    if not _has_table("appointments"):
+        op.create_table(
+            "appointments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("slot_id", sa.Integer(), sa.ForeignKey("available_slots.id"), nullable=False),
+            sa.Column("message", sa.Text()),
+            sa.Column("status", sa.String(20)),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_appointments_id", "appointments", ["id"])
+
+
+def downgrade():
+    for table in ("appointments", "available_slots", "task_applications", "messages", "tasks", "profile", "users"):
+        op.drop_table(table)
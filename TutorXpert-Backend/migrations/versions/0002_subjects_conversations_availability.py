@@ -0,0 +1,228 @@
+"""subjects, conversations, recurring availability, geocode cache, full-text search
+
+科目规范化表、会话摘要、周期可用时间、地理编码缓存和全文索引。
+用过 create_all 的库里可能已经有一部分，已存在的表 / 列跳过。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.fulltext import create_fulltext_indexes
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_table("subjects"):
+        op.create_table(
+            "subjects",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("slug", sa.String(100), nullable=False),
+        )
+        op.create_index("ix_subjects_id", "subjects", ["id"])
+        op.create_index("ix_subjects_slug", "subjects", ["slug"], unique=True)
+
+    if not _has_table("tutor_subjects"):
+        op.create_table(
+            "tutor_subjects",
+            sa.Column("profile_id", sa.Integer(), sa.ForeignKey("profile.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("subject_id", sa.Integer(), sa.ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("position", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_tutor_subjects_subject_id", "tutor_subjects", ["subject_id"])
+
+    if not _has_table("task_subjects"):
+        op.create_table(
+            "task_subjects",
+            sa.Column("task_id", sa.Integer(), sa.ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("subject_id", sa.Integer(), sa.ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True),
+        )
+        op.create_index("ix_task_subjects_subject_id", "task_subjects", ["subject_id"])
+
+    if not _has_table("conversations"):
+        op.create_table(
+            "conversations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_low_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("user_high_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("last_message_id", sa.Integer()),
+            sa.Column("last_message_text", sa.Text()),
+            sa.Column("last_message_at", sa.DateTime(timezone=True)),
+            sa.Column("unread_low", sa.Integer(), nullable=False),
+            sa.Column("unread_high", sa.Integer(), nullable=False),
+            sa.Column("last_read_low_id", sa.Integer()),
+            sa.Column("last_read_high_id", sa.Integer()),
+            sa.UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        )
+        op.create_index("ix_conversations_id", "conversations", ["id"])
+        op.create_index("ix_conversations_low_last", "conversations", ["user_low_id", "last_message_at"])
+        op.create_index("ix_conversations_high_last", "conversations", ["user_high_id", "last_message_at"])
+
+    if not _has_column("messages", "conversation_id"):
+        # 会话 id 由应用启动时的 ensure_conversations 回填
+        with op.batch_alter_table("messages") as batch:
+            batch.add_column(sa.Column("conversation_id", sa.Integer(), nullable=True))
+            batch.create_foreign_key("fk_messages_conversation_id", "conversations", ["conversation_id"], ["id"])
+    op.create_index("ix_messages_conversation_id_id", "messages", ["conversation_id", "id"], if_not_exists=True)
+
+    if not _has_table("availability_rules"):
+        op.create_table(
+            "availability_rules",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("weekday", sa.Integer(), nullable=False),
+            sa.Column("start_time", sa.Time(), nullable=False),
+            sa.Column("end_time", sa.Time(), nullable=False),
+            sa.Column("subject", sa.String(100), nullable=False),
+            sa.Column("slot_minutes", sa.Integer(), nullable=False),
+            sa.Column("valid_from", sa.Date(), nullable=False),
+            sa.Column("valid_until", sa.Date()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_availability_rules_id", "availability_rules", ["id"])
+        op.create_index("ix_availability_rules_tutor_id", "availability_rules", ["tutor_id"])
+
+    if not _has_table("availability_exceptions"):
+        op.create_table(
+            "availability_exceptions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column(
+                "rule_id", sa.Integer(), sa.ForeignKey("availability_rules.id", ondelete="CASCADE"), nullable=True
+            ),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("start_time", sa.Time()),
+            sa.Column("end_time", sa.Time()),
+        )
+        op.create_index("ix_availability_exceptions_id", "availability_exceptions", ["id"])
+        op.create_index("ix_availability_exceptions_tutor_id", "availability_exceptions", ["tutor_id"])
+
+    if not _has_column("available_slots", "rule_id"):
+        with op.batch_alter_table("available_slots") as batch:
+            batch.add_column(sa.Column("rule_id", sa.Integer(), nullable=True))
+            batch.create_foreign_key(
+                "fk_available_slots_rule_id", "availability_rules", ["rule_id"], ["id"], ondelete="SET NULL"
+            )
+
+    # 唯一索引之前先清掉重复数据：同一 tutor 同一开始时间的 slot 只留一个。
+    # 优先保留有已接受 / 未拒绝预约的、其次有任何预约的、再次 is_booked 的，最后 id 最小的；
+    # 其余行上的预约先改指向保留的那一行再删除（多出来的有效预约由下面的预约去重处理）
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT s.id, s.tutor_id, s.start_time FROM available_slots s"
+        " JOIN (SELECT tutor_id, start_time FROM available_slots"
+        "       GROUP BY tutor_id, start_time HAVING COUNT(*) > 1) d"
+        "   ON d.tutor_id = s.tutor_id AND d.start_time = s.start_time"
+        " ORDER BY s.tutor_id, s.start_time,"
+        "  CASE"
+        "   WHEN EXISTS (SELECT 1 FROM appointments a WHERE a.slot_id = s.id AND a.status = 'accepted') THEN 0"
+        "   WHEN EXISTS (SELECT 1 FROM appointments a WHERE a.slot_id = s.id AND a.status != 'rejected') THEN 1"
+        "   WHEN EXISTS (SELECT 1 FROM appointments a WHERE a.slot_id = s.id) THEN 2"
+        "   WHEN s.is_booked THEN 3"
+        "   ELSE 4"
+        "  END,"
+        "  s.id"
+    )).all()
+    groups = {}
+    for slot_id, tutor_id, start_time in rows:
+        groups.setdefault((tutor_id, start_time), []).append(slot_id)
+    for survivor, *others in groups.values():
+        params = {"survivor": survivor, "others": others}
+        for statement in (
+            "UPDATE available_slots SET is_booked = true WHERE id = :survivor"
+            " AND EXISTS (SELECT 1 FROM available_slots WHERE id IN :others AND is_booked)",
+            "UPDATE appointments SET slot_id = :survivor WHERE slot_id IN :others",
+            "DELETE FROM available_slots WHERE id IN :others",
+        ):
+            bind.execute(
+                sa.text(statement).bindparams(sa.bindparam("others", expanding=True)), params
+            )
+    op.create_index(
+        "ix_available_slots_tutor_start", "available_slots", ["tutor_id", "start_time"], unique=True, if_not_exists=True
+    )
+
+    # 同一 slot 多个未拒绝的预约（修复抢占竞争之前留下的）：保留已接受的，否则保留最早的，其余标记为 rejected
+    duplicates = bind.execute(sa.text(
+        "SELECT slot_id FROM appointments WHERE status != 'rejected' GROUP BY slot_id HAVING COUNT(*) > 1"
+    )).scalars().all()
+    for slot_id in duplicates:
+        ids = bind.execute(
+            sa.text(
+                "SELECT id FROM appointments WHERE slot_id = :slot_id AND status != 'rejected' "
+                "ORDER BY CASE WHEN status = 'accepted' THEN 0 ELSE 1 END, id"
+            ),
+            {"slot_id": slot_id},
+        ).scalars().all()
+        bind.execute(
+            sa.text("UPDATE appointments SET status = 'rejected' WHERE id IN :ids").bindparams(
+                sa.bindparam("ids", expanding=True)
+            ),
+            {"ids": ids[1:]},
+        )
+    op.create_index(
+        "uq_appointments_active_slot",
+        "appointments",
+        ["slot_id"],
+        unique=True,
+        sqlite_where=sa.text("status != 'rejected'"),
+        postgresql_where=sa.text("status != 'rejected'"),
+        if_not_exists=True,
+    )
+
+    if not _has_table("geocode_cache"):
+        op.create_table(
+            "geocode_cache",
+            sa.Column("address_key", sa.Text(), primary_key=True),
+            sa.Column("lat", sa.Float()),
+            sa.Column("lng", sa.Float()),
+            sa.Column("provider", sa.String(50), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+
+    # SQLite FTS5 虚表 + 触发器 / PostgreSQL GIN 表达式索引
+    create_fulltext_indexes(op.get_bind())
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for table in ("tasks", "profile"):
+            for suffix in ("ai", "ad", "au"):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_tasks_fulltext")
+        op.execute("DROP INDEX IF EXISTS ix_profile_fulltext")
+
+    op.drop_table("geocode_cache")
+    op.drop_index("uq_appointments_active_slot", table_name="appointments")
+    op.drop_index("ix_available_slots_tutor_start", table_name="available_slots")
+    with op.batch_alter_table("available_slots") as batch:
+        batch.drop_constraint("fk_available_slots_rule_id", type_="foreignkey")
+        batch.drop_column("rule_id")
+    op.drop_table("availability_exceptions")
+    op.drop_table("availability_rules")
+    op.drop_index("ix_messages_conversation_id_id", table_name="messages")
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_constraint("fk_messages_conversation_id", type_="foreignkey")
+        batch.drop_column("conversation_id")
+    op.drop_table("conversations")
+    op.drop_table("task_subjects")
+    op.drop_table("tutor_subjects")
+    op.drop_table("subjects")
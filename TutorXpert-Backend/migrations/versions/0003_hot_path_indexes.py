@@ -0,0 +1,68 @@
+"""hot-path indexes and unique task applications
+
+给热点查询补索引（之前除了主键和 users.email 全是全表扫描），
+并用唯一约束保证同一 tutor 对同一任务只有一条申请。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_tasks_user_id", "tasks", ["user_id"]),                  # 我的任务
+    ("ix_tasks_lat_lng", "tasks", ["lat", "lng"]),               # 地图边界搜索
+    ("ix_profile_lat_lng", "profile", ["lat", "lng"]),
+    ("ix_task_applications_tutor_id", "task_applications", ["tutor_id"]),  # 我的申请
+    ("ix_messages_sender_receiver_timestamp", "messages", ["sender_id", "receiver_id", "timestamp"]),
+    ("ix_appointments_slot_id", "appointments", ["slot_id"]),
+    ("ix_appointments_tutor_id", "appointments", ["tutor_id"]),
+    ("ix_available_slots_rule_id", "available_slots", ["rule_id"]),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    for name, table, columns in INDEXES:
+        if bind.dialect.name == "postgresql":
+            # ✅ 大表上建索引不锁写
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        else:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+    # 加唯一约束前清理重复申请：每组保留已接受的那条，否则保留最早的
+    duplicates = bind.execute(sa.text(
+        "SELECT task_id, tutor_id FROM task_applications GROUP BY task_id, tutor_id HAVING COUNT(*) > 1"
+    )).all()
+    for task_id, tutor_id in duplicates:
+        ids = bind.execute(
+            sa.text(
+                "SELECT id FROM task_applications WHERE task_id = :task_id AND tutor_id = :tutor_id "
+                "ORDER BY CASE WHEN status = 'accepted' THEN 0 ELSE 1 END, id"
+            ),
+            {"task_id": task_id, "tutor_id": tutor_id},
+        ).scalars().all()
+        bind.execute(
+            sa.text("DELETE FROM task_applications WHERE id IN :ids").bindparams(sa.bindparam("ids", expanding=True)),
+            {"ids": ids[1:]},
+        )
+
+    existing = {c["name"] for c in sa.inspect(bind).get_unique_constraints("task_applications")}
+    if "uq_task_applications_task_tutor" not in existing:
+        with op.batch_alter_table("task_applications") as batch:
+            batch.create_unique_constraint("uq_task_applications_task_tutor", ["task_id", "tutor_id"])
+
+
+def downgrade():
+    with op.batch_alter_table("task_applications") as batch:
+        batch.drop_constraint("uq_task_applications_task_tutor", type_="unique")
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
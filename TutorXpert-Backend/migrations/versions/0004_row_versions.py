@@ -0,0 +1,32 @@
+"""row version and updated_at on profile and tasks
+
+详情接口的 ETag / Last-Modified 用。已有行的 version 从 1 开始，updated_at 取迁移时间。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLES = ("profile", "tasks")
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+        op.add_column(table, sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("updated_at")
+            batch.drop_column("version")
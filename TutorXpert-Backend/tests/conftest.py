@@ -0,0 +1,64 @@
+# tests/conftest.py
+# 在 TutorXpert-Backend 目录下执行：python -m pytest -q tests
+# 每次测试会话用一个临时 SQLite 库，先 alembic upgrade head 再导入 app（DATABASE_URL 在导入时读取）。
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmpdir = tempfile.mkdtemp(prefix="tutorxpert-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+
+
+def alembic(database_url, *args):
+    """在子进程里跑 alembic，连接串只影响这一次调用。"""
+    subprocess.run(
+        [sys.executable, "-m", "alembic", *args],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DATABASE_URL": database_url},
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    alembic(os.environ["DATABASE_URL"], "upgrade", "head")
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def tutor_id(client):
+    response = client.post("/register", json={
+        "email": "tutor@example.com", "password": "pw", "role": "tutor",
+        "first_name": "T", "last_name": "Tutor", "lat": -33.8, "lng": 151.0, "subjects": "Math",
+    })
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+@pytest.fixture(scope="session")
+def student_id(client):
+    response = client.post("/register", json={
+        "email": "student@example.com", "password": "pw", "role": "student",
+        "first_name": "S", "last_name": "Student", "lat": -33.8, "lng": 151.0,
+    })
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+@pytest.fixture(scope="session")
+def student_headers(client, student_id):
+    response = client.post("/login", data={"username": "student@example.com", "password": "pw"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
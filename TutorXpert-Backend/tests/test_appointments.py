@@ -0,0 +1,46 @@
+# tests/test_appointments.py
+# 预约状态只能 pending -> accepted / rejected；重复拒绝不能释放已被新预约占用的 slot。
+
+
+def _slot(client, tutor_id, start):
+    response = client.post("/availability/", json=[{
+        "tutor_id": tutor_id, "start_time": start, "end_time": start[:-5] + "15:00", "subject": "Math",
+    }])
+    assert response.status_code == 200, response.text
+    return response.json()[0]["id"]
+
+
+def _book(client, tutor_id, student_id, slot_id):
+    return client.post("/appointments/", json={"student_id": student_id, "tutor_id": tutor_id, "slot_id": slot_id})
+
+
+def _is_booked(client, tutor_id, slot_id):
+    return next(s["is_booked"] for s in client.get(f"/availability/tutor/{tutor_id}").json() if s["id"] == slot_id)
+
+
+def test_repeated_reject_keeps_new_booking(client, tutor_id, student_id):
+    slot_id = _slot(client, tutor_id, "2026-03-02T09:00:00")
+    first = _book(client, tutor_id, student_id, slot_id).json()["id"]
+    assert client.post(f"/appointments/{first}/reject").status_code == 200
+    assert _book(client, tutor_id, student_id, slot_id).status_code == 200
+
+    response = client.post(f"/appointments/{first}/reject")
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Appointment is no longer pending"
+    assert _is_booked(client, tutor_id, slot_id) is True
+    assert client.post(f"/appointments/{first}/accept").status_code == 409
+
+
+def test_patch_status_only_from_pending(client, tutor_id, student_id):
+    slot_id = _slot(client, tutor_id, "2026-03-02T10:00:00")
+    appointment_id = _book(client, tutor_id, student_id, slot_id).json()["id"]
+    url = f"/appointments/{appointment_id}/status"
+
+    assert client.patch(url, json={"status": "rejected"}).status_code == 200
+    assert _is_booked(client, tutor_id, slot_id) is False
+    assert _book(client, tutor_id, student_id, slot_id).status_code == 200
+
+    # 已经 rejected：不能再改，也不能把新预约占用的 slot 放掉
+    assert client.patch(url, json={"status": "rejected"}).status_code == 409
+    assert client.patch(url, json={"status": "accepted"}).status_code == 409
+    assert _is_booked(client, tutor_id, slot_id) is True
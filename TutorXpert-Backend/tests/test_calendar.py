@@ -0,0 +1,39 @@
+# tests/test_calendar.py
+# /availability/tutor/{id}/calendar：带时区的 from / to（JS toISOString() 的 ...Z）按 UTC 换算后展开周期规则。
+
+
+def _create_monday_rule(client, tutor_id):
+    response = client.post("/availability/rules", json={
+        "tutor_id": tutor_id, "weekday": 0, "start_time": "09:00", "end_time": "10:00",
+        "subject": "Math", "slot_minutes": 30, "valid_from": "2025-01-01",
+    })
+    assert response.status_code == 200, response.text
+
+
+def _calendar(client, tutor_id, start, end):
+    return client.get(f"/availability/tutor/{tutor_id}/calendar", params={"from": start, "to": end})
+
+
+def test_calendar_accepts_aware_bounds(client, tutor_id):
+    _create_monday_rule(client, tutor_id)
+    response = _calendar(client, tutor_id, "2025-01-06T00:00:00Z", "2025-01-13T00:00:00Z")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [slot["start_time"] for slot in body["slots"]] == ["2025-01-06T09:00:00", "2025-01-06T09:30:00"]
+    assert body["start"] == "2025-01-06T00:00:00"
+
+
+def test_calendar_converts_offsets_to_utc(client, tutor_id):
+    # 19:30+10:00 == 09:30Z：窗口只覆盖第二个 slot
+    response = _calendar(client, tutor_id, "2025-01-06T19:30:00+10:00", "2025-01-06T20:00:00+10:00")
+    assert response.status_code == 200, response.text
+    assert [slot["start_time"] for slot in response.json()["slots"]] == ["2025-01-06T09:30:00"]
+
+
+def test_calendar_mixed_naive_and_aware_bounds(client, tutor_id):
+    response = _calendar(client, tutor_id, "2025-01-06T00:00:00", "2025-01-13T00:00:00Z")
+    assert response.status_code == 200, response.text
+    assert len(response.json()["slots"]) == 2
+
+    response = _calendar(client, tutor_id, "2025-01-13T00:00:00Z", "2025-01-06T00:00:00")
+    assert response.status_code == 400
@@ -0,0 +1,29 @@
+# tests/test_conversations.py
+# 启动时的回填只处理 conversation_id 为空的消息，已有会话的未读数不能被清零。
+from app import models
+from app.core.conversations import ensure_conversations
+from app.database import SessionLocal
+
+
+def test_backfill_keeps_existing_unread(client, tutor_id, student_id):
+    response = client.post("/messages/", json={"sender_id": student_id, "receiver_id": tutor_id, "text": "hi"})
+    assert response.status_code == 200, response.text
+
+    db = SessionLocal()
+    try:
+        # 模拟升级前留下的、还没有归属会话的历史消息（另一对用户）
+        db.add(models.Message(sender_id=tutor_id, receiver_id=tutor_id, text="note to self"))
+        db.commit()
+        assert ensure_conversations(db) == 1
+
+        conv = (
+            db.query(models.Conversation)
+            .filter_by(user_low_id=min(tutor_id, student_id), user_high_id=max(tutor_id, student_id))
+            .one()
+        )
+        unread = conv.unread_low if tutor_id < student_id else conv.unread_high
+        assert unread == 1
+        assert db.query(models.Message).filter(models.Message.conversation_id.is_(None)).count() == 0
+        assert ensure_conversations(db) == 0
+    finally:
+        db.close()
@@ -0,0 +1,67 @@
+# tests/test_http_cache.py
+# 条件 GET：ETag / If-None-Match、If-Modified-Since（含 -0000 时区、格式错误）和 Cache-Control。
+from app.core.http_cache import is_not_modified
+
+LAST_MODIFIED = "Mon, 02 Mar 2026 08:00:00 GMT"
+
+
+def test_if_modified_since_minus_zero_zone_is_utc():
+    assert is_not_modified({"if-modified-since": "Mon, 02 Mar 2026 09:00:00 -0000"}, '"x"', LAST_MODIFIED)
+    assert not is_not_modified({"if-modified-since": "Mon, 02 Mar 2026 07:00:00 -0000"}, '"x"', LAST_MODIFIED)
+
+
+def test_malformed_if_modified_since_is_ignored():
+    assert not is_not_modified({"if-modified-since": "yesterday"}, '"x"', LAST_MODIFIED)
+
+
+def _tutor_url(client, tutor_id):
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        profile_id = db.query(models.Profile.id).filter(models.Profile.user_id == tutor_id).scalar()
+    finally:
+        db.close()
+    return f"/tutors/{profile_id}"
+
+
+def test_conditional_get_with_etag(client, tutor_id):
+    url = _tutor_url(client, tutor_id)
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public")
+    assert response.headers["last-modified"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert client.get(url, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # 资料更新后 version 变了，旧 ETag 不再命中
+    assert client.put(f"/profiles/{tutor_id}", json={"hourly_rate": 55}).status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["hourlyRate"] == 55.0
+
+
+def test_conditional_get_with_if_modified_since(client, tutor_id):
+    url = _tutor_url(client, tutor_id)
+    last_modified = client.get(url).headers["last-modified"]
+
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    minus_zero = last_modified.replace("GMT", "-0000")
+    assert client.get(url, headers={"If-Modified-Since": minus_zero}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": "not a date"}).status_code == 200
+    assert client.get(url, headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}).status_code == 200
+
+
+def test_private_profile_cache_control(client, tutor_id):
+    response = client.get(f"/profiles/{tutor_id}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "private, no-cache"
+    assert client.get(f"/profiles/{tutor_id}", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
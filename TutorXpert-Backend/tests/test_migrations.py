@@ -0,0 +1,44 @@
+# tests/test_migrations.py
+# 0002 在建 (tutor_id, start_time) 唯一索引前对 slot 去重：每组只留一行，优先留有预约 / 已预约的那一行。
+import sqlite3
+
+from conftest import alembic
+
+
+def test_slot_dedupe_keeps_the_booked_duplicate(tmp_path):
+    path = tmp_path / "migrate.db"
+    url = f"sqlite:///{path}"
+    alembic(url, "upgrade", "0001")
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        INSERT INTO users (id, email, hashed_password, role) VALUES
+            (1, 'tutor@example.com', 'x', 'tutor'),
+            (2, 'student@example.com', 'x', 'student');
+        -- 同一时间两行，被预约的是 id 较大的那一行
+        INSERT INTO available_slots (id, tutor_id, start_time, end_time, subject, is_booked) VALUES
+            (1, 1, '2025-01-06 09:00:00.000000', '2025-01-06 09:15:00.000000', 'Math', 0),
+            (2, 1, '2025-01-06 09:00:00.000000', '2025-01-06 09:15:00.000000', 'Math', 1),
+            (3, 1, '2025-01-06 10:00:00.000000', '2025-01-06 10:15:00.000000', 'Math', 0),
+            (4, 1, '2025-01-06 10:00:00.000000', '2025-01-06 10:15:00.000000', 'Math', 0);
+        INSERT INTO appointments (id, student_id, tutor_id, slot_id, status) VALUES
+            (1, 2, 1, 2, 'accepted'),
+            (2, 2, 1, 1, 'rejected');
+    """)
+    conn.commit()
+    conn.close()
+
+    alembic(url, "upgrade", "head")
+
+    conn = sqlite3.connect(path)
+    try:
+        slots = conn.execute("SELECT id, is_booked FROM available_slots ORDER BY id").fetchall()
+        appointments = conn.execute("SELECT id, slot_id, status FROM appointments ORDER BY id").fetchall()
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list('available_slots')")}
+    finally:
+        conn.close()
+
+    assert slots == [(2, 1), (3, 0)]
+    # 指向被删行的预约改指向保留的那一行
+    assert appointments == [(1, 2, "accepted"), (2, 2, "rejected")]
+    assert "ix_available_slots_tutor_start" in indexes
@@ -0,0 +1,20 @@
+# tests/test_principal_cache.py
+# 给已有用户新建资料时，缓存里的身份（display_name）要失效。
+from app import models
+from app.core.principal_cache import Principal, principal_cache
+from app.database import SessionLocal
+
+
+def test_new_profile_invalidates_principal(client):
+    db = SessionLocal()
+    try:
+        user = models.User(email="noprofile@example.com", hashed_password="x", role="student")
+        db.add(user)
+        db.commit()
+        principal_cache.put("token-noprofile", Principal(user.id, user.email, user.role, user.email))
+
+        db.add(models.Profile(user_id=user.id, first_name="New", last_name="Name"))
+        db.commit()
+        assert principal_cache.get("token-noprofile") is None
+    finally:
+        db.close()
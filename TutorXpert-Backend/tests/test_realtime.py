@@ -0,0 +1,32 @@
+# tests/test_realtime.py
+# 推送并发发给同一用户的所有连接，慢连接超时后被摘掉，不影响其他连接。
+import asyncio
+
+from app.core import realtime
+from app.core.realtime import InProcessBackend, MessageHub
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = []
+
+    async def send_json(self, payload):
+        await asyncio.sleep(self.delay)
+        self.received.append(payload)
+
+
+def test_slow_socket_is_dropped(monkeypatch):
+    monkeypatch.setattr(realtime, "REALTIME_SEND_TIMEOUT_SECONDS", 0.05)
+    fast, slow = FakeSocket(), FakeSocket(delay=5)
+
+    async def scenario():
+        hub = MessageHub(InProcessBackend())
+        await hub.start()
+        hub._connections[1] = {fast, slow}
+        await asyncio.wait_for(hub.publish(1, {"text": "hi"}), 1)
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert fast.received == [{"text": "hi"}]
+    assert hub._connections[1] == {fast}
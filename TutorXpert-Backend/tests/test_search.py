@@ -0,0 +1,26 @@
+# tests/test_search.py
+# 地图搜索：q 里没有可搜索的词（如 "!!!"）时返回空结果，而不是忽略 q。
+import pytest
+
+BOUNDS = {"north": -33.0, "south": -34.5, "east": 152.0, "west": 150.0}
+NEAR = {"lat": -33.8, "lng": 151.0, "radius_km": 50}
+
+
+@pytest.mark.parametrize("area", [BOUNDS, NEAR])
+def test_tutor_search_without_terms_is_empty(client, tutor_id, area):
+    assert client.get("/tutors/search", params=area).json() != []
+    response = client.get("/tutors/search", params={**area, "q": "!!!"})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("area", [BOUNDS, NEAR])
+def test_task_search_without_terms_is_empty(client, student_headers, area):
+    response = client.post("/tasks", headers=student_headers, json={
+        "title": "Algebra homework", "subject": "Math", "lat": -33.8, "lng": 151.0,
+    })
+    assert response.status_code == 201, response.text
+    assert client.get("/tasks/search", params=area).json() != []
+    response = client.get("/tasks/search", params={**area, "q": "!!!"})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
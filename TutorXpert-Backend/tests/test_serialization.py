@@ -0,0 +1,98 @@
+# tests/test_serialization.py
+# 快速序列化（Projection + json_response）的输出要和原来 response_model 的输出逐字节相同。
+import json
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models, schemas
+from app.core.serialization import (
+    TASK_PROJECTION, TUTOR_PROJECTION, json_response, serialize_tutor_rows,
+)
+from app.database import SessionLocal
+
+
+def _response_model_bytes(model, items, by_alias=True):
+    """用一个只有一个路由的 FastAPI 应用走原来的 response_model 序列化路径。"""
+    app = FastAPI()
+
+    @app.get("/", response_model=List[model], response_model_by_alias=by_alias)
+    def handler():
+        return items
+
+    return TestClient(app).get("/").content
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def profile_ids(db, tutor_id):
+    # 一个注册时带科目关联的 tutor，再加一个只有旧文本列、整数时薪、非 ASCII 姓名的资料
+    user = models.User(email="legacy-tutor@example.com", hashed_password="x", role="tutor")
+    db.add(user)
+    db.flush()
+    legacy = models.Profile(
+        user_id=user.id, first_name="Zoë", last_name="Ng", subjects="Physics, Chemistry,",
+        hourly_rate=45, rating=None, lat=-33, lng=151, bio="多语言 bio",
+    )
+    db.add(legacy)
+    db.commit()
+    ids = [p.id for p in db.query(models.Profile.id).filter(models.Profile.user_id.in_([tutor_id, user.id]))]
+    yield sorted(ids)
+    db.delete(legacy)
+    db.delete(user)
+    db.commit()
+
+
+def test_tutor_rows_match_response_model(db, profile_ids):
+    profiles = db.query(models.Profile).filter(models.Profile.id.in_(profile_ids)).order_by(models.Profile.id).all()
+    expected = _response_model_bytes(schemas.TutorOut, [schemas.TutorOut.model_validate(p) for p in profiles])
+
+    columns, _ = TUTOR_PROJECTION.compile(TUTOR_PROJECTION.keys)
+    rows = db.query(*columns).filter(models.Profile.id.in_(profile_ids)).order_by(models.Profile.id).all()
+    assert json_response(serialize_tutor_rows(db, rows)).body == expected
+
+
+def test_sparse_tutor_fields_are_a_subset(db, profile_ids):
+    profiles = db.query(models.Profile).filter(models.Profile.id.in_(profile_ids)).order_by(models.Profile.id).all()
+    full = json.loads(_response_model_bytes(schemas.TutorOut, [schemas.TutorOut.model_validate(p) for p in profiles]))
+
+    keys = TUTOR_PROJECTION.resolve("name,subjects,hourlyRate")
+    columns, _ = TUTOR_PROJECTION.compile(keys)
+    rows = db.query(*columns).filter(models.Profile.id.in_(profile_ids)).order_by(models.Profile.id).all()
+    sparse = json.loads(json_response(serialize_tutor_rows(db, rows, keys)).body)
+    assert sparse == [{key: item[key] for key in keys} for item in full]
+
+
+def test_task_rows_match_response_model(db, student_id):
+    tasks = [
+        models.Task(
+            title="Calculus", subject="Math", lat=-33.87, lng=151.21, user_id=student_id,
+            posted_date=datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc), budget="$40",
+        ),
+        models.Task(title="Essay “quotes”", lat=-33, lng=151, user_id=student_id, status=None),
+    ]
+    db.add_all(tasks)
+    db.commit()
+    ids = [task.id for task in tasks]
+    try:
+        loaded = db.query(models.Task).filter(models.Task.id.in_(ids)).order_by(models.Task.id).all()
+        expected = _response_model_bytes(
+            schemas.TaskOut, [schemas.TaskOut.model_validate(task) for task in loaded], by_alias=False,
+        )
+
+        columns, serialize = TASK_PROJECTION.compile(TASK_PROJECTION.keys)
+        rows = db.query(*columns).filter(models.Task.id.in_(ids)).order_by(models.Task.id).all()
+        assert json_response([serialize(row) for row in rows]).body == expected
+    finally:
+        for task in tasks:
+            db.delete(task)
+        db.commit()
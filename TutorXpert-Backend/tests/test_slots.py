@@ -0,0 +1,77 @@
+# tests/test_slots.py
+# 批量写入 slot：带时区的时间换算成 naive UTC 存储；与已有 slot 或同批 slot 重叠时拒绝。
+
+
+def test_offset_input_is_stored_as_utc(client, tutor_id):
+    response = client.post("/availability/", json=[{
+        "tutor_id": tutor_id, "subject": "Math",
+        "start_time": "2026-04-01T19:00:00+10:00", "end_time": "2026-04-01T19:15:00+10:00",
+    }])
+    assert response.status_code == 200, response.text
+    slot = response.json()[0]
+    assert (slot["start_time"], slot["end_time"]) == ("2026-04-01T09:00:00", "2026-04-01T09:15:00")
+
+    # 同一时刻用 Z 表示：判为重叠
+    response = client.post("/availability/", json=[{
+        "tutor_id": tutor_id, "subject": "Math",
+        "start_time": "2026-04-01T09:00:00Z", "end_time": "2026-04-01T09:15:00Z",
+    }])
+    assert response.status_code == 409
+
+
+def _post(client, path, tutor_id, *ranges):
+    return client.post(path, json=[
+        {"tutor_id": tutor_id, "subject": "Math", "start_time": start, "end_time": end} for start, end in ranges
+    ])
+
+
+def test_overlap_with_existing_slot_is_rejected(client, tutor_id):
+    response = _post(client, "/availability/", tutor_id, ("2026-05-04T10:00:00", "2026-05-04T11:00:00"))
+    assert response.status_code == 200, response.text
+    existing_id = response.json()[0]["id"]
+
+    response = _post(client, "/availability/", tutor_id, ("2026-05-04T10:30:00", "2026-05-04T10:45:00"))
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicts"][0]["conflict_with"] == existing_id
+
+    # 首尾相接不算重叠
+    assert _post(client, "/availability/", tutor_id, ("2026-05-04T11:00:00", "2026-05-04T11:15:00")).status_code == 200
+
+
+def test_slot_inside_long_slot_is_rejected(client, tutor_id):
+    # 新 slot 完全落在已有长 slot 的中间，开始时间离得很远也要查出来
+    response = _post(client, "/availability/", tutor_id, ("2026-05-05T08:00:00", "2026-05-05T18:00:00"))
+    assert response.status_code == 200, response.text
+    long_id = response.json()[0]["id"]
+
+    response = _post(client, "/availability/", tutor_id, ("2026-05-05T16:00:00", "2026-05-05T16:15:00"))
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicts"][0]["conflict_with"] == long_id
+
+
+def test_bulk_reports_overlaps_within_batch(client, tutor_id):
+    response = _post(
+        client, "/availability/bulk", tutor_id,
+        ("2026-05-06T12:00:00", "2026-05-06T13:00:00"),
+        ("2026-05-06T12:30:00", "2026-05-06T12:45:00"),
+        ("2026-05-06T13:00:00", "2026-05-06T13:15:00"),
+        ("2026-05-06T14:00:00", "2026-05-06T14:00:00"),
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["conflicts"], body["invalid"]) == (2, 1, 1)
+    statuses = [r["status"] for r in body["results"]]
+    assert statuses == ["created", "conflict", "created", "invalid"]
+    assert body["results"][1]["conflict_with_index"] == 0
+
+
+def test_intervals_find_overlap_with_nested_rows():
+    from app.core.slots import _Intervals
+
+    intervals = _Intervals([(0, 10, "long"), (1, 2, "short")])
+    assert intervals.find_overlap(5, 6) == "long"
+    assert intervals.find_overlap(10, 12) is None
+    intervals.add(12, 20, "added")
+    intervals.add(11, 13, "middle")
+    assert intervals.find_overlap(19, 21) == "added"
+    assert intervals.find_overlap(10, 11) is None
@@ -0,0 +1,77 @@
+# tests/test_spatial_index.py
+# GridIndex 的 bbox / 最近邻查询和暴力计算的结果一致。
+import random
+
+import pytest
+
+from app.core.spatial_index import GridIndex, haversine_km, take_nearest
+
+
+@pytest.fixture
+def points():
+    rng = random.Random(7)
+    return [(i, rng.uniform(-34.5, -33.0), rng.uniform(150.0, 152.0)) for i in range(500)]
+
+
+@pytest.fixture
+def index(points):
+    grid = GridIndex(cell_deg=0.1)
+    grid.load(points)
+    return grid
+
+
+@pytest.mark.parametrize("bbox", [
+    (-33.5, -34.0, 151.5, 150.5),
+    (-33.9, -33.91, 151.2, 151.19),    # 比一个格子还小
+    (0.0, -90.0, 180.0, -180.0),       # 整个世界，走遍历已占用格子的分支
+    (-34.0, -33.5, 151.5, 150.5),      # north < south
+])
+def test_query_bbox_matches_brute_force(index, points, bbox):
+    north, south, east, west = bbox
+    expected = {key for key, lat, lng in points if south <= lat <= north and west <= lng <= east}
+    result = index.query_bbox(north=north, south=south, east=east, west=west)
+    assert {key for key, _, _ in result} == expected
+
+
+def test_nearest_is_sorted_and_complete(index, points):
+    lat, lng = -33.87, 151.21
+    expected = sorted((haversine_km(lat, lng, plat, plng), key) for key, plat, plng in points)
+    result = [(distance, key) for key, _, _, distance in index.nearest(lat, lng)]
+    assert [key for _, key in result] == [key for _, key in expected]
+    assert [d for d, _ in result] == pytest.approx([d for d, _ in expected])
+
+
+def test_nearest_respects_radius(index, points):
+    lat, lng = -33.87, 151.21
+    expected = {key for key, plat, plng in points if haversine_km(lat, lng, plat, plng) <= 10}
+    result = list(index.nearest(lat, lng, radius_km=10))
+    assert {key for key, _, _, _ in result} == expected
+    assert all(distance <= 10 for *_, distance in result)
+
+
+def test_nearest_from_outside_the_data(index, points):
+    # 查询点离所有格子都很远时也要按距离返回
+    lat, lng = 10.0, 100.0
+    first = next(index.nearest(lat, lng))
+    expected = min(points, key=lambda p: haversine_km(lat, lng, p[1], p[2]))
+    assert first[0] == expected[0]
+
+
+def test_upsert_and_remove_move_points(index):
+    index.upsert(0, 10.0, 10.0)
+    assert [key for key, *_ in index.query_bbox(north=10.5, south=9.5, east=10.5, west=9.5)] == [0]
+    index.upsert(0, None, None)
+    assert index.query_bbox(north=10.5, south=9.5, east=10.5, west=9.5) == []
+    assert 0 not in {key for key, *_ in index.query_bbox(north=0.0, south=-90.0, east=180.0, west=-180.0)}
+
+
+def test_take_nearest_skips_filtered_keys(index, points):
+    lat, lng = -33.87, 151.21
+    ordered = [key for key, *_ in index.nearest(lat, lng)]
+    even = [key for key in ordered if key % 2 == 0][:5]
+
+    def load(keys):
+        return {key: key for key in keys if key % 2 == 0}
+
+    result = take_nearest(index.nearest(lat, lng), load, limit=5, batch_size=2)
+    assert [row for row, _ in result] == even
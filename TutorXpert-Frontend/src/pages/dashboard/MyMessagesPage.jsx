@@ -53,6 +53,29 @@ const MyMessagesPage = () => {
 
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState("");
+  const [hasOlder, setHasOlder] = useState(false);
+
+  // /messages/history 按 id 倒序分页（最新在前，每页 HISTORY_PAGE_SIZE 条），
+  // 显示时反转成时间正序；before_id 往前翻页
+  const HISTORY_PAGE_SIZE = 50;
+  const fetchHistoryPage = async (beforeId) => {
+    const res = await axios.get(
+      `${import.meta.env.VITE_API_BASE_URL}/messages/history/${currentUserId}/${selectedConversation.id}`,
+      { params: { limit: HISTORY_PAGE_SIZE, ...(beforeId ? { before_id: beforeId } : {}) } }
+    );
+    setHasOlder(res.data.length === HISTORY_PAGE_SIZE);
+    return [...res.data].reverse();
+  };
+
+  const loadOlderMessages = async () => {
+    if (messages.length === 0) return;
+    try {
+      const older = await fetchHistoryPage(messages[0].id);
+      setMessages((prev) => [...older, ...prev]);
+    } catch (err) {
+      console.error("Failed to load earlier messages", err);
+    }
+  };
 
   useEffect(() => {
     if (!tutorIdFromQuery || conversations.length === 0) return;
@@ -77,8 +100,7 @@ const MyMessagesPage = () => {
   
     const fetchMessages = async () => {
       try {
-        const res = await axios.get(`${import.meta.env.VITE_API_BASE_URL}/messages/history/${currentUserId}/${selectedConversation.id}`);
-        setMessages(res.data);
+        setMessages(await fetchHistoryPage());
       } catch (err) {
         console.error("Failed to load messages", err);
       }
@@ -179,6 +201,13 @@ const MyMessagesPage = () => {
                 </div>
               </CardHeader>
               <CardContent className="flex-grow overflow-y-auto p-6 space-y-4 custom-scrollbar">
+                {hasOlder && (
+                  <div className="flex justify-center">
+                    <Button variant="ghost" size="sm" onClick={loadOlderMessages} className="text-muted-foreground hover:text-primary">
+                      Load earlier messages
+                    </Button>
+                  </div>
+                )}
                 {messages.map((msg, index) => (
                   <div key={index} className={`flex ${msg.sender === "You" ? "justify-end" : "justify-start"}`}>
                     <div className={`max-w-[70%] px-4 py-2.5 rounded-xl shadow ${